@@ -11,13 +11,14 @@ import os
 from datetime import datetime, timedelta
 from pathlib import Path
 import json
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import load_workbook
 import warnings
 warnings.filterwarnings('ignore')
 
 # Configuration
 BASE_PATH = Path("/sessions/affectionate-pensive-goodall/mnt/demand planning/2025")
 OUTPUT_PATH = Path("/sessions/affectionate-pensive-goodall/mnt/demand planning/features")
-OUTPUT_PATH.mkdir(exist_ok=True)
 
 REGIONS = {
     'ACWCP': 'Cape Town',
@@ -27,6 +28,19 @@ REGIONS = {
     'ACWHW': 'Hardware'
 }
 
+LINE_ITEM_COLUMNS = ['stock_code', 'description', 'quantity', 'unit_price', 'discount', 'line_total']
+
+# Account sheets are read in parallel batches; small workbooks stay single-process
+LINE_ITEM_WORKERS = min(4, os.cpu_count() or 1)
+MIN_SHEETS_PER_WORKER = 50
+
+# Customer RFM state (running aggregates) kept for incremental refreshes
+RFM_KEYS = ['account_no', 'region_name']
+RFM_STATE_FILE = OUTPUT_PATH / 'customer_rfm_state.csv'
+
+# Reference date for recency / tenure features (None: latest invoice date)
+CUSTOMER_AS_OF_DATE = None
+
 MONTHS = ['January', 'February', 'March', 'April', 'May', 'June',
           'July', 'August', 'September', 'October', 'November', 'December']
 
@@ -78,34 +92,146 @@ def extract_transactions_from_file(filepath, region_hint):
         return pd.DataFrame()
 
 
-def extract_line_items_from_file(filepath):
-    """Extract line items from individual account sheets."""
-    try:
-        xl = pd.ExcelFile(filepath, engine='openpyxl')
-        all_items = []
-
-        # Get customer sheet names (numeric account numbers)
-        customer_sheets = [s for s in xl.sheet_names
-                         if s not in ['Debtors Masterfile', 'Summary', 'Sheet1', 'Sheet2']
-                         and s.replace('.', '').replace('-', '').isdigit()]
-
-        for sheet in customer_sheets[:100]:  # Sample first 100
-            try:
-                df = pd.read_excel(filepath, sheet_name=sheet, engine='openpyxl')
-                if len(df.columns) >= 6:
-                    # Standardize column names
-                    df.columns = ['stock_code', 'description', 'quantity', 'unit_price', 'discount', 'line_total'][:len(df.columns)]
-                    df['account_no'] = sheet
-                    df['stock_code'] = df['stock_code'].astype(str).str.strip()
-                    all_items.append(df)
-            except:
+def is_account_sheet(sheet):
+    """Account sheets are named by their (numeric) account number."""
+    return (sheet not in ['Debtors Masterfile', 'Summary', 'Sheet1', 'Sheet2']
+            and sheet.replace('.', '').replace('-', '').isdigit())
+
+
+def _stream_account_sheets(wb, sheets):
+    """Stream rows of the given account sheets from an open read-only workbook."""
+    frames = []
+    read, skipped, failed = 0, 0, 0
+
+    for sheet in sheets:
+        try:
+            rows = wb[sheet].iter_rows(values_only=True)
+            header = next(rows, None) or ()
+            # Trailing empty header cells are padding, not columns
+            n_cols = len(header)
+            while n_cols > 0 and header[n_cols - 1] is None:
+                n_cols -= 1
+
+            if n_cols < 6:
+                skipped += 1
                 continue
 
-        if all_items:
-            return pd.concat(all_items, ignore_index=True)
-        return pd.DataFrame()
-    except:
-        return pd.DataFrame()
+            data = [r[:6] for r in rows if any(v is not None for v in r[:6])]
+            df = pd.DataFrame(data, columns=LINE_ITEM_COLUMNS)
+            df['account_no'] = sheet
+            frames.append(df)
+            read += 1
+        except Exception:
+            failed += 1
+
+    return frames, read, skipped, failed
+
+
+def _read_account_sheets(filepath, sheets):
+    """Worker: open the workbook once and stream a batch of account sheets."""
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        return _stream_account_sheets(wb, sheets)
+    finally:
+        wb.close()
+
+
+def extract_line_items_from_file(filepath, max_sheets=None, max_workers=LINE_ITEM_WORKERS):
+    """
+    Extract line items from individual account sheets.
+
+    Reads every account sheet by default (max_sheets caps it for quick runs).
+    The workbook is opened once in read-only mode and rows are streamed; large
+    workbooks are split into sheet batches read in parallel processes.
+
+    Returns (line_items, coverage) where coverage records how many of the
+    file's account sheets were actually read.
+    """
+    coverage = {
+        'file': Path(filepath).name,
+        'account_sheets': 0,
+        'sheets_read': 0,
+        'sheets_skipped': 0,
+        'sheets_failed': 0,
+        'line_items': 0,
+        'coverage_pct': 0.0
+    }
+
+    try:
+        wb = load_workbook(filepath, read_only=True, data_only=True)
+    except Exception as e:
+        print(f"  Error: {e}")
+        return pd.DataFrame(), coverage
+
+    try:
+        customer_sheets = [s for s in wb.sheetnames if is_account_sheet(s)]
+        coverage['account_sheets'] = len(customer_sheets)
+        if max_sheets is not None:
+            customer_sheets = customer_sheets[:max_sheets]
+
+        workers = max(1, min(max_workers or 1, len(customer_sheets) // MIN_SHEETS_PER_WORKER))
+        if workers == 1:
+            results = [_stream_account_sheets(wb, customer_sheets)]
+        else:
+            size = -(-len(customer_sheets) // workers)
+            batches = [customer_sheets[i:i + size] for i in range(0, len(customer_sheets), size)]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_read_account_sheets, [filepath] * len(batches), batches))
+    finally:
+        wb.close()
+
+    all_items = []
+    for frames, read, skipped, failed in results:
+        all_items.extend(frames)
+        coverage['sheets_read'] += read
+        coverage['sheets_skipped'] += skipped
+        coverage['sheets_failed'] += failed
+
+    if coverage['account_sheets'] > 0:
+        coverage['coverage_pct'] = round(100 * coverage['sheets_read'] / coverage['account_sheets'], 1)
+
+    if not all_items:
+        return pd.DataFrame(), coverage
+
+    items = pd.concat(all_items, ignore_index=True)
+    items['stock_code'] = items['stock_code'].astype(str).str.strip()
+    coverage['line_items'] = len(items)
+    return items, coverage
+
+
+def select_region_files(month_path):
+    """Pick one file per region for a month, preferring corrected/V2 versions."""
+    files = list(month_path.glob("*.xlsx")) + list(month_path.glob("*.xlsm"))
+
+    region_files = {}
+    for fp in files:
+        fname = fp.name.lower()
+        if 'dub_' in fname or '_dt_' in fname:
+            continue  # Skip product/customer/verification files
+
+        # Determine region
+        region = None
+        if 'cape' in fname or 'capetown' in fname:
+            region = 'Cape Town'
+        elif 'gauteng' in fname:
+            region = 'Gauteng'
+        elif 'george' in fname:
+            region = 'George'
+        elif 'polokwane' in fname:
+            region = 'Polokwane'
+        elif 'hardware' in fname:
+            region = 'Hardware'
+
+        if region:
+            # Prefer corrected or V2 versions
+            if region not in region_files:
+                region_files[region] = fp
+            elif 'corrected' in fname:
+                region_files[region] = fp
+            elif 'v2' in fname and 'corrected' not in region_files[region].name.lower():
+                region_files[region] = fp
+
+    return region_files
 
 
 def load_all_transactions():
@@ -122,36 +248,7 @@ def load_all_transactions():
             continue
 
         print(f"\n{month} 2025:")
-        files = list(month_path.glob("*.xlsx")) + list(month_path.glob("*.xlsm"))
-
-        # Group by region, prefer corrected versions
-        region_files = {}
-        for fp in files:
-            fname = fp.name.lower()
-            if 'dub_' in fname or '_dt_' in fname:
-                continue  # Skip product/customer/verification files
-
-            # Determine region
-            region = None
-            if 'cape' in fname or 'capetown' in fname:
-                region = 'Cape Town'
-            elif 'gauteng' in fname:
-                region = 'Gauteng'
-            elif 'george' in fname:
-                region = 'George'
-            elif 'polokwane' in fname:
-                region = 'Polokwane'
-            elif 'hardware' in fname:
-                region = 'Hardware'
-
-            if region:
-                # Prefer corrected or V2 versions
-                if region not in region_files:
-                    region_files[region] = fp
-                elif 'corrected' in fname:
-                    region_files[region] = fp
-                elif 'v2' in fname and 'corrected' not in region_files[region].name.lower():
-                    region_files[region] = fp
+        region_files = select_region_files(month_path)
 
         for region, filepath in region_files.items():
             df = extract_transactions_from_file(filepath, region)
@@ -168,6 +265,47 @@ def load_all_transactions():
     return pd.DataFrame()
 
 
+def load_all_line_items(max_sheets=None):
+    """
+    Load line items from all account sheets of every month/region file.
+
+    Returns (line_items, coverage) - coverage has one row per file so any
+    shortfall in sheets read is visible instead of silently truncated.
+    """
+    print("=" * 70)
+    print("EXTRACTING LINE ITEM DATA")
+    print("=" * 70)
+
+    all_items = []
+    coverage_rows = []
+
+    for month in MONTHS:
+        month_path = BASE_PATH / f"{month} 2025"
+        if not month_path.exists():
+            continue
+
+        print(f"\n{month} 2025:")
+        for region, filepath in select_region_files(month_path).items():
+            items, coverage = extract_line_items_from_file(filepath, max_sheets=max_sheets)
+            coverage.update({'source_month': month, 'region_name': region})
+            coverage_rows.append(coverage)
+            print(f"  {region}: {coverage['sheets_read']}/{coverage['account_sheets']} sheets "
+                  f"({coverage['coverage_pct']:.1f}%), {coverage['line_items']:,} line items")
+
+            if not items.empty:
+                items['region_name'] = region
+                items['source_month'] = month
+                all_items.append(items)
+
+    coverage_df = pd.DataFrame(coverage_rows)
+    if all_items:
+        combined = pd.concat(all_items, ignore_index=True)
+        print(f"\n{'=' * 70}")
+        print(f"Total line items: {len(combined):,}")
+        return combined, coverage_df
+    return pd.DataFrame(), coverage_df
+
+
 def load_product_catalog():
     """Load product master data."""
     product_file = BASE_PATH / "January 2025" / "DUB_PROD_Products-2025-02-03-0117.xlsx"
@@ -308,34 +446,98 @@ def create_lag_features(df, group_col='region_name', value_col='weekly_revenue',
     return df
 
 
-def create_customer_features(df):
-    """Create customer-level features (RFM-style)."""
-    max_date = df['invoice_date'].max()
-
-    customer_features = df.groupby(['account_no', 'region_name']).agg({
-        # Recency
-        'invoice_date': ['max', 'min', 'count'],
-        # Monetary
-        'total_amount_incl': ['sum', 'mean', 'std', 'min', 'max'],
-        # Frequency
-        'document_no': 'nunique'
-    }).reset_index()
-
-    customer_features.columns = [
-        'account_no', 'region_name',
-        'last_purchase_date', 'first_purchase_date', 'purchase_count',
-        'lifetime_value', 'avg_order_value', 'order_value_std', 'min_order', 'max_order',
-        'total_transactions'
-    ]
+def build_rfm_state(df):
+    """
+    Per-customer running RFM aggregates, keyed on RFM_KEYS.
+
+    Every column is a count, sum, min or max, so the state of two disjoint
+    batches of transactions combines exactly (see update_rfm_state).
+    """
+    df = df.assign(amount_sq=df['total_amount_incl'] ** 2)
+    state = df.groupby(RFM_KEYS).agg(
+        first_purchase_date=('invoice_date', 'min'),
+        last_purchase_date=('invoice_date', 'max'),
+        purchase_count=('invoice_date', 'count'),
+        amount_count=('total_amount_incl', 'count'),
+        lifetime_value=('total_amount_incl', 'sum'),
+        amount_sumsq=('amount_sq', 'sum'),
+        min_order=('total_amount_incl', 'min'),
+        max_order=('total_amount_incl', 'max'),
+        total_transactions=('document_no', 'nunique')
+    )
+    return state.reset_index()
+
+
+def update_rfm_state(state, batch):
+    """
+    Fold a batch of new transactions into the RFM state.
+
+    Cost is proportional to the batch (plus one row per customer). The batch
+    must only hold transactions dated after the state's latest purchase (e.g.
+    the next month's files): document counts are added, not re-deduplicated.
+    """
+    latest = state['last_purchase_date'].max()
+    stale = batch['invoice_date'] <= latest
+    if stale.any():
+        raise ValueError(f"{stale.sum()} transactions are not after the stored {latest.date()}; "
+                         f"rebuild the state with build_rfm_state")
+
+    old = state.set_index(RFM_KEYS)
+    new = build_rfm_state(batch).set_index(RFM_KEYS)
+    merged = old.reindex(old.index.union(new.index))
+    new = new.reindex(merged.index)
+
+    additive = ['purchase_count', 'amount_count', 'lifetime_value', 'amount_sumsq', 'total_transactions']
+    merged[additive] = merged[additive].fillna(0).add(new[additive].fillna(0))
+    for col in ['first_purchase_date', 'min_order']:
+        merged[col] = pd.concat([merged[col], new[col]], axis=1).min(axis=1)
+    for col in ['last_purchase_date', 'max_order']:
+        merged[col] = pd.concat([merged[col], new[col]], axis=1).max(axis=1)
+    return merged.reset_index()
+
+
+def rfm_features(state, as_of=None):
+    """Customer RFM features from the state, relative to as_of (default: latest purchase)."""
+    as_of = pd.Timestamp(as_of) if as_of is not None else state['last_purchase_date'].max()
+    n = state['amount_count']
+
+    customer_features = state[RFM_KEYS + ['last_purchase_date', 'first_purchase_date', 'purchase_count',
+                                          'lifetime_value', 'min_order', 'max_order',
+                                          'total_transactions']].copy()
+    customer_features['purchase_count'] = customer_features['purchase_count'].astype(int)
+    customer_features['total_transactions'] = customer_features['total_transactions'].astype(int)
+    customer_features.insert(6, 'avg_order_value', state['lifetime_value'] / n.where(n > 0))
+    variance = (state['amount_sumsq'] - state['lifetime_value'] ** 2 / n) / (n - 1).where(n > 1)
+    customer_features.insert(7, 'order_value_std', np.sqrt(variance.clip(lower=0)))
 
     # Derived features
-    customer_features['days_since_last_purchase'] = (max_date - customer_features['last_purchase_date']).dt.days
-    customer_features['customer_tenure_days'] = (max_date - customer_features['first_purchase_date']).dt.days
+    customer_features['days_since_last_purchase'] = (as_of - customer_features['last_purchase_date']).dt.days
+    customer_features['customer_tenure_days'] = (as_of - customer_features['first_purchase_date']).dt.days
     customer_features['purchase_frequency'] = customer_features['total_transactions'] / (customer_features['customer_tenure_days'] / 30 + 1)
 
     return customer_features
 
 
+def create_customer_features(df, as_of=None):
+    """Create customer-level features (RFM-style)."""
+    return rfm_features(build_rfm_state(df), as_of)
+
+
+def refresh_customer_features(new_transactions, as_of=None, state_path=None):
+    """
+    Update the saved RFM state with new transactions and return the features.
+
+    Only the new transactions are aggregated; the state is written back.
+    """
+    state_path = state_path or RFM_STATE_FILE
+    state = pd.read_csv(state_path, dtype={'account_no': str},
+                        parse_dates=['first_purchase_date', 'last_purchase_date'])
+    new_transactions = new_transactions.assign(account_no=new_transactions['account_no'].astype(str))
+    state = update_rfm_state(state, new_transactions)
+    state.to_csv(state_path, index=False)
+    return rfm_features(state, as_of)
+
+
 def create_regional_features(weekly_df):
     """Create cross-regional comparison features."""
     # Total weekly revenue across all regions
@@ -360,11 +562,13 @@ if __name__ == "__main__":
     print("\n" + "=" * 70)
     print("REDAI DEMAND FORECASTING - FEATURE EXTRACTION")
     print("=" * 70)
+    OUTPUT_PATH.mkdir(exist_ok=True)
 
     # Step 1: Load raw data
     transactions = load_all_transactions()
     products = load_product_catalog()
     customers = load_customer_data()
+    line_items, line_item_coverage = load_all_line_items()
 
     if transactions.empty:
         print("ERROR: No transaction data loaded!")
@@ -397,7 +601,8 @@ if __name__ == "__main__":
 
     # Step 6: Create customer features
     print("[6] Creating customer features...")
-    customer_features = create_customer_features(transactions)
+    rfm_state = build_rfm_state(transactions)
+    customer_features = rfm_features(rfm_state, CUSTOMER_AS_OF_DATE)
     print(f"    {len(customer_features)} customer records")
 
     # Step 7: Create total (all regions) aggregates
@@ -445,6 +650,16 @@ if __name__ == "__main__":
     customer_features.to_csv(OUTPUT_PATH / 'features_customers.csv', index=False)
     print(f"  features_customers.csv: {len(customer_features):,} rows")
 
+    rfm_state.to_csv(RFM_STATE_FILE, index=False)
+    print(f"  {RFM_STATE_FILE.name}: {len(rfm_state):,} rows (for refresh_customer_features)")
+
+    if not line_items.empty:
+        line_items.to_csv(OUTPUT_PATH / 'fact_line_items.csv', index=False)
+        print(f"  fact_line_items.csv: {len(line_items):,} rows")
+
+    line_item_coverage.to_csv(OUTPUT_PATH / 'line_item_coverage.csv', index=False)
+    print(f"  line_item_coverage.csv: {len(line_item_coverage):,} files")
+
     if not products.empty:
         products.to_csv(OUTPUT_PATH / 'dim_products.csv', index=False)
         print(f"  dim_products.csv: {len(products):,} rows")
@@ -521,6 +736,17 @@ if __name__ == "__main__":
             'row_count': len(customer_features),
             'primary_key': ['account_no', 'region_name']
         },
+        'fact_line_items': {
+            'description': 'Line items from all account sheets (full coverage)',
+            'columns': list(line_items.columns),
+            'row_count': len(line_items)
+        },
+        'line_item_coverage': {
+            'description': 'Per-file account sheet coverage of the line item extraction',
+            'columns': list(line_item_coverage.columns),
+            'row_count': len(line_item_coverage),
+            'primary_key': ['source_month', 'region_name']
+        },
         'dim_products': {
             'description': 'Product master data',
             'columns': list(products.columns) if not products.empty else [],
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+ROLLING-ORIGIN BACKTEST - SKU Models over Many Forecast Origins
+===============================================================
+
+Instead of the single H1/H2 split at H1_END_WEEK:
+1. V4 featured weekly frame from the feature cache, built once
+2. Origins every ORIGIN_STEP weeks around H1_END_WEEK (backtest.py), each
+   predicting the next HORIZON weeks from the weeks up to it
+3. Models: the MODEL_EVALUATION.py baseline zoo, Croston / SBA / TSB
+   (intermittent.py) and the V4 per-SKU GBR
+   (TRAIN_V4_MODELS.backtest_model), every (model, origin) in parallel
+4. WMAPE / MAE per model, per model × origin and per model × SKU
+
+Output:
+  - backtest_summary.csv    - per model: pooled WMAPE, spread across origins
+  - backtest_by_origin.csv  - per model × origin
+  - backtest_by_entity.csv  - per model × SKU
+
+Run: python3 scripts/BACKTEST_MODELS.py
+     (--baselines-only to skip the GBR models)
+"""
+
+import numpy as np
+from functools import partial
+from datetime import datetime
+import sys
+import warnings
+warnings.filterwarnings('ignore')
+
+from backtest import HORIZON, Backtester, rolling_origins, summarise
+from feature_cache import FeatureCache
+from intermittent import intermittent_model
+from schema import Schema
+import MODEL_EVALUATION as zoo
+import TRAIN_V4_MODELS as v4
+
+LOG_FILE = v4.BASE_PATH / 'backtest_log.txt'
+
+# name -> model(train, test, id_col, value_col)
+BASELINES = {
+    'Naive_Last': zoo.model_naive_last,
+    'MA_4Week': zoo.model_moving_average,
+    'MA_8Week': partial(zoo.model_moving_average, window=8),
+    'Seasonal_Naive': zoo.model_seasonal_naive,
+    'Linear_Trend': zoo.model_linear_trend,
+    'ExpSmooth_03': zoo.model_exponential_smoothing,
+    'ExpSmooth_05': partial(zoo.model_exponential_smoothing, alpha=0.5),
+    'Intermittent': intermittent_model,
+}
+GBR_MODELS = {
+    'XGBoost': zoo.model_xgboost_features,
+    'V4_GBR': v4.backtest_model,
+    'V4_GBR_EarlyStop': partial(v4.backtest_model, early_stopping=True),
+}
+
+def log(msg):
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    line = f"[{timestamp}] {msg}"
+    print(line)
+    with open(LOG_FILE, 'a') as f:
+        f.write(line + '\n')
+
+def main():
+    log("=" * 70)
+    log("ROLLING-ORIGIN BACKTEST - SKU Models")
+    log("=" * 70)
+    v4.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    log("\n[1/3] Loading V4 features...")
+    schema = Schema.load(v4.FEATURES_DIR)
+    cache = FeatureCache(v4.FEATURES_DIR / 'cache', refresh='--no-feature-cache' in sys.argv)
+    weekly = v4.materialise_weekly(cache, schema)
+    log(f"  ✓ {cache.summary()}")
+
+    backtester = Backtester(weekly, 'sku', horizon=HORIZON)
+    origins = rolling_origins(backtester.weeks(), anchor=v4.H1_END_WEEK, horizon=HORIZON)
+    log(f"  ✓ {len(weekly)} rows, {weekly['sku'].nunique()} SKUs")
+    log(f"  ✓ Origins: {', '.join(f'W{o:02d}' for o in origins)} ({HORIZON} weeks ahead each)")
+
+    models = dict(BASELINES)
+    if '--baselines-only' not in sys.argv:
+        models.update(GBR_MODELS)
+
+    log(f"\n[2/3] Backtesting {len(models)} models × {len(origins)} origins...")
+    predictions = backtester.run(models, origins, log=log)
+
+    log("\n[3/3] Results")
+    summary, by_origin, by_entity = summarise(predictions, 'sku')
+    for row in summary.itertuples():
+        log(f"  {row.model:16} | WMAPE {row.wmape:6.1f}% | per origin {row.wmape_mean:6.1f}% "
+            f"± {0 if np.isnan(row.wmape_std) else row.wmape_std:5.1f} | MAE {row.mae:10,.1f}")
+
+    summary.to_csv(v4.OUTPUT_DIR / 'backtest_summary.csv', index=False)
+    by_origin.to_csv(v4.OUTPUT_DIR / 'backtest_by_origin.csv', index=False)
+    by_entity.to_csv(v4.OUTPUT_DIR / 'backtest_by_entity.csv', index=False)
+    log(f"\n  ✓ Saved: backtest_summary.csv, backtest_by_origin.csv, backtest_by_entity.csv")
+    log("=" * 70)
+    return summary
+
+if __name__ == '__main__':
+    main()
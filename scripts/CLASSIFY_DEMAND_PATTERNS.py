@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+DEMAND PATTERN CLASSIFICATION - ADI / CV² Lookup for All Entities
+=================================================================
+
+One pass per level over the forecast_*_weekly tables (demand_patterns.py):
+1. SKU, customer and category weekly quantities (H1 weeks by default, so
+   routing and confidence never see the validation half)
+2. ADI, CV², zero ratio, trend and seasonality strength per entity
+3. Syntetos-Boylan class per entity: smooth / erratic / intermittent / lumpy
+
+Output:
+  - demand_patterns.csv  - level, key, statistics and sb_class per entity
+                           (lookup for model routing, confidence, dashboards)
+
+Run: python3 scripts/CLASSIFY_DEMAND_PATTERNS.py
+     (--full-year to classify on all weeks instead of H1)
+"""
+
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+import sys
+import warnings
+warnings.filterwarnings('ignore')
+
+from demand_patterns import STAT_COLUMNS, pattern_stats
+
+# Configuration
+SCRIPT_DIR = Path(__file__).parent.resolve()
+BASE_PATH = SCRIPT_DIR.parent
+FEATURES_DIR = BASE_PATH / 'features_v2'
+OUTPUT_DIR = BASE_PATH / 'model_evaluation'
+LOG_FILE = BASE_PATH / 'demand_patterns_log.txt'
+OUTPUT_FILE = 'demand_patterns.csv'
+
+# level -> (key column, weekly table stem)
+LEVELS = {
+    'sku': ('sku', 'forecast_sku_weekly'),
+    'customer': ('customer_id', 'forecast_customer_weekly'),
+    'category': ('category_l1', 'forecast_category_weekly'),
+}
+
+def log(msg):
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    line = f"[{timestamp}] {msg}"
+    print(line)
+    with open(LOG_FILE, 'a') as f:
+        f.write(line + '\n')
+
+def load_weekly(stem, full_year):
+    """Weekly table (H1 rows unless full_year), from the full table or its H1 / H2 parts"""
+    full = FEATURES_DIR / f'{stem}.csv'
+    if full.exists():
+        weekly = pd.read_csv(full)
+        return weekly if full_year or 'period' not in weekly.columns else weekly[weekly['period'] == 'H1']
+    parts = [FEATURES_DIR / f'{stem}_{p}.csv' for p in (('H1', 'H2') if full_year else ('H1',))]
+    parts = [pd.read_csv(p) for p in parts if p.exists()]
+    return pd.concat(parts, ignore_index=True) if parts else None
+
+def main():
+    log("=" * 70)
+    log("DEMAND PATTERN CLASSIFICATION - ADI / CV²")
+    log("=" * 70)
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    full_year = '--full-year' in sys.argv
+    log(f"  Weeks: {'full year' if full_year else 'H1'}")
+
+    tables = []
+    for i, (level, (key, stem)) in enumerate(LEVELS.items(), 1):
+        log(f"\n[{i}/{len(LEVELS)}] {level.title()} level ({stem})...")
+        weekly = load_weekly(stem, full_year)
+        if weekly is None or len(weekly) == 0:
+            log(f"  ⚠ No weekly table for {level}, skipped")
+            continue
+
+        stats = pattern_stats(weekly, key, value_col='quantity')
+        classes = stats['sb_class'].value_counts()
+        log(f"  ✓ {len(stats)} entities over {weekly['year_week'].nunique()} weeks")
+        log(f"  ✓ Classes: {', '.join(f'{c} {n}' for c, n in classes.items())}")
+
+        stats.insert(0, 'level', level)
+        tables.append(stats.rename(columns={key: 'key'})[['level', 'key'] + STAT_COLUMNS])
+
+    if not tables:
+        log("\n  ⚠ No weekly tables found, nothing classified")
+        log("=" * 70)
+        return None
+
+    patterns = pd.concat(tables, ignore_index=True)
+    patterns['key'] = patterns['key'].astype(str)
+    patterns.round(4).to_csv(OUTPUT_DIR / OUTPUT_FILE, index=False)
+    log(f"\n  ✓ Saved: {OUTPUT_FILE} ({len(patterns)} entities)")
+    log("=" * 70)
+    return patterns
+
+if __name__ == '__main__':
+    main()
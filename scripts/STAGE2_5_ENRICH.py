@@ -12,16 +12,27 @@ Output:
 - Enriched CSV files (sku0_fact_lineitem_enriched.csv, etc.)
 - Enrichment report (stage2_5_enrichment.json)
 - Data quality flags for transparency
+
+Run with --chunked to stream price enrichment over fact tables larger than memory
+(price step only: writes sku0_fact_lineitem_price_enriched.csv and its own
+report, stage2_5_price_enrichment.json, leaving the full run's outputs alone),
+and --asof to impute from the SKU's last known price as of the line's week
+instead of its all-time average.
 """
 
 import pandas as pd
 import numpy as np
 import json
+import sys
 from pathlib import Path
 from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
+from aggregation import aggregate_levels
+from price_store import PriceStore
+from product_dim import attach_product_attrs, load_product_master
+
 # Configuration
 BASE_PATH = Path("/sessions/affectionate-pensive-goodall/mnt/demand planning")
 FEATURES_SKU_PATH = BASE_PATH / "features_sku"
@@ -29,14 +40,184 @@ FEATURES_CAT_PATH = BASE_PATH / "features_category"
 OUTPUT_PATH = BASE_PATH / "features_enriched"
 OUTPUT_PATH.mkdir(exist_ok=True)
 
+# Weekly feature tables regenerated from the enriched fact table
+FEATURE_LEVELS = {
+    'sku_week': (['year_week', 'sku'], {
+        'weekly_quantity': ('quantity', 'sum'),
+        'weekly_revenue': ('line_total', 'sum'),
+        'avg_price': ('unit_price', 'mean'),
+        'transaction_count': ('invoice_id', 'nunique'),
+        'unique_customers': ('customer_id', 'nunique'),
+        'primary_region': ('region_name', 'mode'),
+        'pct_price_inferred': ('price_inferred', 'mean'),
+        'avg_dq_score': ('dq_score', 'mean')
+    }),
+    'category_week': (['year_week', 'category'], {
+        'weekly_quantity': ('quantity', 'sum'),
+        'weekly_revenue': ('line_total', 'sum'),
+        'active_skus': ('sku', 'nunique'),
+        'transaction_count': ('invoice_id', 'nunique'),
+        'unique_customers': ('customer_id', 'nunique'),
+        'avg_dq_score': ('dq_score', 'mean')
+    })
+}
+
+# Rows per chunk for --chunked runs (fact tables larger than memory)
+CHUNK_SIZE = 500_000
+
+def load_products():
+    """Load the product master with ACP- prefixes stripped."""
+    return load_product_master(BASE_PATH / "features" / "dim_products.csv")
+
 def load_data():
     """Load extracted data."""
     df = pd.read_csv(FEATURES_SKU_PATH / "sku0_fact_lineitem.csv")
-    products = pd.read_csv(BASE_PATH / "features" / "dim_products.csv")
-    products['sku_clean'] = products['sku'].str.replace('ACP-', '')
-    return df, products
+    return df, load_products()
+
+def effective_prices(df):
+    """Effective unit price per line: line_total / quantity, else unit_price."""
+    qty = df['quantity'].to_numpy(dtype=float)
+    total = df['line_total'].to_numpy(dtype=float)
+    unit = df['unit_price'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(qty > 0, total / qty, unit)
+
+def order_weeks(df):
+    """ISO year-week label of each line's order date (each distinct date formatted once)."""
+    codes, dates = pd.factorize(pd.to_datetime(df['order_date']))
+    labels = pd.Index(dates.strftime('%Y-W%V'), dtype=object)
+    return pd.Series(labels.take(codes, allow_fill=True, fill_value=np.nan), index=df.index)
+
+def _price_partials(df):
+    """Per-SKU partial sums of effective price for one chunk of the fact table."""
+    observed = pd.DataFrame({'sku': df['sku'].to_numpy(), 'price': effective_prices(df)})
+    observed = observed[observed['price'] > 0]
+    observed['price_sq'] = observed['price'] ** 2
+
+    return observed.groupby('sku').agg(
+        price_samples=('price', 'size'),
+        price_sum=('price', 'sum'),
+        price_sq_sum=('price_sq', 'sum')
+    )
+
+def build_price_index(chunks, products):
+    """
+    Build the SKU price reference index once.
+
+    chunks is the fact table (or an iterable of chunks of it). Returns a frame
+    indexed by SKU with: avg_price, price_std, price_samples (from non-zero
+    effective prices) and master_price (product master, price > 0).
+    """
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+
+    partials = None
+    for chunk in chunks:
+        part = _price_partials(chunk)
+        if partials is None:
+            partials = part
+            continue
+        # Combine running sums
+        partials = partials.add(part, fill_value=0)
+
+    index = pd.DataFrame(index=partials.index if partials is not None else pd.Index([], name='sku'))
+    if partials is not None:
+        n = partials['price_samples']
+        index['avg_price'] = partials['price_sum'] / n
+        variance = (partials['price_sq_sum'] - partials['price_sum'] ** 2 / n) / (n - 1)
+        index['price_std'] = np.sqrt(variance.clip(lower=0)).where(n > 1)
+        index['price_samples'] = n.astype(int)
+
+    master_prices = products[products['price'] > 0].drop_duplicates('sku_clean', keep='last')
+    master_prices = master_prices.set_index('sku_clean')['price'].rename('master_price')
+    return index.join(master_prices, how='outer')
+
+def build_price_store(chunks):
+    """
+    As-of price store of mean effective price per SKU × Week.
+
+    chunks is the fact table (or an iterable of chunks of it).
+    """
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+
+    sums = []
+    for chunk in chunks:
+        observed = pd.DataFrame({'sku': chunk['sku'].to_numpy(), 'year_week': order_weeks(chunk).to_numpy(),
+                                 'price': effective_prices(chunk)})
+        observed = observed[observed['price'] > 0]
+        sums.append(observed.groupby(['sku', 'year_week'])['price'].agg(['sum', 'size']))
+
+    weekly = pd.concat(sums).groupby(level=[0, 1]).sum()
+    weekly['avg_price'] = weekly['sum'] / weekly['size']
+    return PriceStore(weekly.reset_index())
+
+def resolve_prices(df, price_index, price_store=None):
+    """
+    Resolve missing prices for a fact table (or chunk) in one vectorised pass.
+
+    Resolution order for rows where BOTH unit_price and line_total are 0:
+    same-SKU average price, then product master price. With a price_store the
+    SKU price is the last known price as of the line's week (falling back to
+    the SKU average when the SKU has no earlier price).
+    Rows with a line_total but no unit_price keep their total and get
+    unit_price backfilled.
+    Returns the enriched frame and the raw counts behind the price metrics.
+    """
+    unit = df['unit_price'].to_numpy(dtype=float)
+    total = df['line_total'].to_numpy(dtype=float)
+    qty = df['quantity'].to_numpy(dtype=float)
+
+    ref = price_index.reindex(df['sku'].to_numpy())
+    avg_price = ref['avg_price'].to_numpy(dtype=float)
+    master_price = ref['master_price'].to_numpy(dtype=float)
+    if price_store is not None:
+        asof_price = price_store.asof_join(pd.DataFrame({'sku': df['sku'].to_numpy(), 'year_week': order_weeks(df).to_numpy()}),
+                                           cols=['avg_price'])['avg_price'].to_numpy(dtype=float)
+        avg_price = np.where(np.isnan(asof_price), avg_price, asof_price)
+
+    truly_missing = (unit == 0) & (total == 0)
+    has_total_but_no_price = (unit == 0) & (total > 0)
+    from_sku = truly_missing & ~np.isnan(avg_price)
+    from_master = truly_missing & ~from_sku & ~np.isnan(master_price)
+    backfill = has_total_but_no_price & (qty > 0)
+
+    new_unit = np.select([from_sku, from_master], [avg_price, master_price], unit)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        new_unit = np.where(backfill, total / qty, new_unit)
+    new_total = np.where(from_sku | from_master, qty * new_unit, total)
+    unresolved = (new_unit == 0) & (new_total == 0)
+
+    df['price_source'] = np.select(
+        [unresolved, has_total_but_no_price, from_master, from_sku],
+        ['missing_no_reference', 'has_total_no_unit_price', 'inferred_from_master', 'inferred_from_sku_avg'],
+        'original'
+    )
+    df['price_inferred'] = from_sku | from_master | backfill
+    df['original_unit_price'] = df['unit_price']
+    df['original_line_total'] = df['line_total']
+    df['unit_price'] = new_unit
+    df['line_total'] = new_total
+
+    return df, {
+        'original_zero_price': int((unit == 0).sum()),
+        'truly_missing_revenue': int(truly_missing.sum()),
+        'had_total_but_no_price': int(has_total_but_no_price.sum()),
+        'inferred_from_sku': int(from_sku.sum()),
+        'inferred_from_master': int(from_master.sum()),
+        'remaining_zero_revenue': int(unresolved.sum())
+    }
+
+def price_stats_from_counts(counts):
+    """Price enrichment metrics (adds enrichment_rate to the raw counts)."""
+    truly_missing_count = counts['truly_missing_revenue']
+    final_zero_revenue = counts['remaining_zero_revenue']
+    return {
+        **counts,
+        'enrichment_rate': round((1 - final_zero_revenue/truly_missing_count) * 100, 2) if truly_missing_count > 0 else 100
+    }
 
-def enrich_prices(df, products):
+def enrich_prices(df, products, price_index=None, price_store=None):
     """
     Enrich missing prices using multiple strategies:
     1. Same SKU average price from other transactions
@@ -49,91 +230,66 @@ def enrich_prices(df, products):
     print("PRICE ENRICHMENT")
     print("=" * 60)
 
-    # Add enrichment tracking columns
-    df['price_source'] = 'original'
-    df['price_inferred'] = False
-    df['original_unit_price'] = df['unit_price']
-    df['original_line_total'] = df['line_total']
-
-    # Identify TRULY missing revenue (both price and total are 0 or missing)
-    truly_missing_mask = (df['unit_price'] == 0) & (df['line_total'] == 0)
-    truly_missing_count = truly_missing_mask.sum()
-
-    # Also track rows with price=0 but line_total>0 (they already have revenue)
-    has_total_but_no_price = (df['unit_price'] == 0) & (df['line_total'] > 0)
-
-    print(f"\nTotal zero-price line items: {(df['unit_price'] == 0).sum():,}")
-    print(f"  - With line_total > 0 (already have revenue): {has_total_but_no_price.sum():,}")
-    print(f"  - With line_total = 0 (truly missing): {truly_missing_count:,}")
-
-    # Strategy 1: Infer from same-SKU transactions
-    # Calculate average price per SKU from non-zero transactions
-    # Use line_total / quantity to get effective price
-    df['effective_price'] = np.where(
-        df['quantity'] > 0,
-        df['line_total'] / df['quantity'],
-        df['unit_price']
-    )
+    if price_index is None:
+        price_index = build_price_index(df, products)
+    print(f"\nPrice index: {price_index['avg_price'].notna().sum():,} SKUs with observed prices, "
+          f"{price_index['master_price'].notna().sum():,} with master prices")
 
-    sku_avg_price = df[df['effective_price'] > 0].groupby('sku')['effective_price'].agg(['mean', 'std', 'count'])
-    sku_avg_price.columns = ['avg_price', 'price_std', 'price_samples']
-    sku_avg_price = sku_avg_price.reset_index()
+    if price_store is not None:
+        print(f"As-of price store: {len(price_store):,} SKU-week prices (latest {price_store.latest_week()})")
 
-    # Merge average prices
-    df = df.merge(sku_avg_price[['sku', 'avg_price', 'price_samples']], on='sku', how='left')
+    df, counts = resolve_prices(df, price_index, price_store)
 
-    # Apply inference ONLY where truly missing
-    can_infer_mask = truly_missing_mask & df['avg_price'].notna()
-    infer_count = can_infer_mask.sum()
+    print(f"\nTotal zero-price line items: {counts['original_zero_price']:,}")
+    print(f"  - With line_total > 0 (already have revenue): {counts['had_total_but_no_price']:,}")
+    print(f"  - With line_total = 0 (truly missing): {counts['truly_missing_revenue']:,}")
+    print(f"\nInferred from SKU average: {counts['inferred_from_sku']:,}")
+    if counts['inferred_from_master'] > 0:
+        print(f"Inferred from product master: {counts['inferred_from_master']:,}")
+    print(f"Remaining with zero revenue: {counts['remaining_zero_revenue']:,}")
 
-    df.loc[can_infer_mask, 'unit_price'] = df.loc[can_infer_mask, 'avg_price']
-    df.loc[can_infer_mask, 'line_total'] = df.loc[can_infer_mask, 'quantity'] * df.loc[can_infer_mask, 'unit_price']
-    df.loc[can_infer_mask, 'price_source'] = 'inferred_from_sku_avg'
-    df.loc[can_infer_mask, 'price_inferred'] = True
+    return df, price_stats_from_counts(counts)
 
-    print(f"\nInferred from SKU average: {infer_count:,}")
-
-    # Strategy 2: Product master price for remaining truly missing
-    master_prices = products[products['price'] > 0].set_index('sku_clean')['price'].to_dict()
-
-    still_missing_mask = (df['unit_price'] == 0) & (df['line_total'] == 0)
-    can_use_master = still_missing_mask & df['sku'].isin(master_prices.keys())
-    master_count = can_use_master.sum()
+def enrich_prices_chunked(products, chunksize=CHUNK_SIZE, use_asof=False):
+    """
+    Price enrichment for fact tables larger than memory.
 
-    if master_count > 0:
-        df.loc[can_use_master, 'unit_price'] = df.loc[can_use_master, 'sku'].map(master_prices)
-        df.loc[can_use_master, 'line_total'] = df.loc[can_use_master, 'quantity'] * df.loc[can_use_master, 'unit_price']
-        df.loc[can_use_master, 'price_source'] = 'inferred_from_master'
-        df.loc[can_use_master, 'price_inferred'] = True
-        print(f"Inferred from product master: {master_count:,}")
+    Pass 1 streams the fact table to build the price index, pass 2 resolves
+    each chunk against it and appends to the enriched output. Metrics are
+    identical to the in-memory path.
+    """
+    print("\n" + "=" * 60)
+    print(f"PRICE ENRICHMENT (chunked, {chunksize:,} rows per chunk)")
+    print("=" * 60)
 
-    # Mark the ones with price=0 but line_total>0 as "has_total_only"
-    df.loc[has_total_but_no_price, 'price_source'] = 'has_total_no_unit_price'
+    source = FEATURES_SKU_PATH / "sku0_fact_lineitem.csv"
+    target = OUTPUT_PATH / "sku0_fact_lineitem_price_enriched.csv"
 
-    # Backfill unit_price from line_total for display
-    backfill_mask = has_total_but_no_price & (df['quantity'] > 0)
-    df.loc[backfill_mask, 'unit_price'] = df.loc[backfill_mask, 'line_total'] / df.loc[backfill_mask, 'quantity']
-    df.loc[backfill_mask, 'price_inferred'] = True
+    price_index = build_price_index(pd.read_csv(source, chunksize=chunksize), products)
+    print(f"\nPrice index: {price_index['avg_price'].notna().sum():,} SKUs with observed prices, "
+          f"{price_index['master_price'].notna().sum():,} with master prices")
+    price_store = build_price_store(pd.read_csv(source, chunksize=chunksize)) if use_asof else None
 
-    # Summary
-    final_zero_revenue = ((df['unit_price'] == 0) & (df['line_total'] == 0)).sum()
-    print(f"Remaining with zero revenue: {final_zero_revenue:,}")
+    totals = {}
+    revenue = {'line_items': 0, 'original_revenue': 0.0, 'enriched_revenue': 0.0}
+    for i, chunk in enumerate(pd.read_csv(source, chunksize=chunksize)):
+        chunk, counts = resolve_prices(chunk, price_index, price_store)
+        for key, value in counts.items():
+            totals[key] = totals.get(key, 0) + value
+        revenue['line_items'] += len(chunk)
+        revenue['original_revenue'] += chunk['original_line_total'].sum()
+        revenue['enriched_revenue'] += chunk['line_total'].sum()
 
-    # Mark unfixable
-    df.loc[(df['unit_price'] == 0) & (df['line_total'] == 0), 'price_source'] = 'missing_no_reference'
+        chunk.to_csv(target, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        print(f"  Chunk {i + 1}: {len(chunk):,} rows")
 
-    # Clean up temp columns
-    df = df.drop(columns=['avg_price', 'price_samples', 'effective_price'], errors='ignore')
+    price_stats = price_stats_from_counts(totals)
+    print(f"\nInferred from SKU average: {price_stats['inferred_from_sku']:,}")
+    print(f"Inferred from product master: {price_stats['inferred_from_master']:,}")
+    print(f"Remaining with zero revenue: {price_stats['remaining_zero_revenue']:,}")
+    print(f"✓ {target.name} ({revenue['line_items']:,} rows)")
 
-    return df, {
-        'original_zero_price': int((df['original_unit_price'] == 0).sum()),
-        'truly_missing_revenue': int(truly_missing_count),
-        'had_total_but_no_price': int(has_total_but_no_price.sum()),
-        'inferred_from_sku': int(infer_count),
-        'inferred_from_master': int(master_count),
-        'remaining_zero_revenue': int(final_zero_revenue),
-        'enrichment_rate': round((1 - final_zero_revenue/truly_missing_count) * 100, 2) if truly_missing_count > 0 else 100
-    }
+    return price_stats, revenue
 
 def enrich_regions(df):
     """Fix 'Unknown' regions where possible."""
@@ -215,23 +371,13 @@ def regenerate_features(df, products):
     df['order_date'] = pd.to_datetime(df['order_date'])
     df['year_week'] = df['order_date'].dt.strftime('%Y-W%V')
 
+    df['category'] = attach_product_attrs(df[['sku']], products, attrs=())['category']
+
+    # SKU and category weekly aggregates in one pass
+    tables = aggregate_levels(df, FEATURE_LEVELS)
+
     # SKU Weekly Features
-    sku_weekly = df.groupby(['year_week', 'sku']).agg({
-        'quantity': 'sum',
-        'line_total': 'sum',
-        'unit_price': 'mean',
-        'invoice_id': 'nunique',
-        'customer_id': 'nunique',
-        'region_name': lambda x: x.mode()[0] if len(x) > 0 else 'Unknown',
-        'price_inferred': 'mean',
-        'dq_score': 'mean'
-    }).reset_index()
-
-    sku_weekly.columns = [
-        'year_week', 'sku', 'weekly_quantity', 'weekly_revenue',
-        'avg_price', 'transaction_count', 'unique_customers', 'primary_region',
-        'pct_price_inferred', 'avg_dq_score'
-    ]
+    sku_weekly = tables['sku_week']
 
     # Temporal features
     sku_weekly['week_of_year'] = sku_weekly['year_week'].str.extract(r'W(\d+)').astype(int)
@@ -254,41 +400,13 @@ def regenerate_features(df, products):
     sku_weekly['quantity_diff_1w'] = sku_weekly.groupby('sku')['weekly_quantity'].diff()
     sku_weekly['price_change'] = sku_weekly.groupby('sku')['avg_price'].diff()
 
-    # Add product attributes
-    products_lookup = products.set_index('sku_clean').to_dict('index')
-
-    def get_attr(sku, attr, default='Unknown'):
-        if str(sku) in products_lookup:
-            val = products_lookup[str(sku)].get(attr, default)
-            return val if pd.notna(val) else default
-        return default
-
-    sku_weekly['brand'] = sku_weekly['sku'].apply(lambda x: get_attr(x, 'brand'))
-    sku_weekly['category'] = sku_weekly['sku'].apply(
-        lambda x: get_attr(x, 'categories', '').split('/')[-1] if get_attr(x, 'categories') else 'Unknown'
-    )
-    sku_weekly['manufacturer'] = sku_weekly['sku'].apply(lambda x: get_attr(x, 'manufacturer'))
+    # Add product attributes (brand, leaf category, manufacturer)
+    sku_weekly = attach_product_attrs(sku_weekly, products)
 
     print(f"Generated {len(sku_weekly):,} SKU-week records")
 
     # Category Weekly Features
-    df['category'] = df['sku'].apply(
-        lambda x: get_attr(x, 'categories', '').split('/')[-1] if get_attr(x, 'categories') else 'Unknown'
-    )
-
-    cat_weekly = df.groupby(['year_week', 'category']).agg({
-        'quantity': 'sum',
-        'line_total': 'sum',
-        'sku': 'nunique',
-        'invoice_id': 'nunique',
-        'customer_id': 'nunique',
-        'dq_score': 'mean'
-    }).reset_index()
-
-    cat_weekly.columns = [
-        'year_week', 'category', 'weekly_quantity', 'weekly_revenue',
-        'active_skus', 'transaction_count', 'unique_customers', 'avg_dq_score'
-    ]
+    cat_weekly = tables['category_week']
 
     cat_weekly['week_of_year'] = cat_weekly['year_week'].str.extract(r'W(\d+)').astype(int)
     cat_weekly['month'] = ((cat_weekly['week_of_year'] - 1) // 4) + 1
@@ -314,6 +432,30 @@ def main():
     print("=" * 70)
     print(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
+    use_asof = '--asof' in sys.argv
+
+    if '--chunked' in sys.argv:
+        # Price enrichment only, streamed; region/customer/DQ steps need the full table
+        price_stats, revenue = enrich_prices_chunked(load_products(), use_asof=use_asof)
+
+        report = {
+            'stage': '2.5',
+            'name': 'Data Enrichment (chunked price enrichment)',
+            'generated_at': datetime.now().isoformat(),
+            'complete': False,
+            'skipped': ['regions', 'customers', 'data_quality_flags', 'features'],
+            'before': {'line_items': revenue['line_items'], 'total_revenue': round(revenue['original_revenue'], 2)},
+            'after': {'line_items': revenue['line_items'], 'total_revenue': round(revenue['enriched_revenue'], 2)},
+            'enrichment': {'prices': price_stats}
+        }
+        # Not the full stage's report: downstream stages read stage2_5_enrichment.json
+        report_path = BASE_PATH / "stage2_5_price_enrichment.json"
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Report saved to {report_path}")
+        print("  (region, customer and DQ enrichment skipped: run without --chunked for the full stage)")
+        return
+
     # Load data
     print("\nLoading data...")
     df, products = load_data()
@@ -337,7 +479,8 @@ def main():
     }
 
     # Run enrichment
-    df, price_stats = enrich_prices(df, products)
+    price_store = build_price_store(df) if use_asof else None
+    df, price_stats = enrich_prices(df, products, price_store=price_store)
     report['enrichment']['prices'] = price_stats
 
     df, region_stats = enrich_regions(df)
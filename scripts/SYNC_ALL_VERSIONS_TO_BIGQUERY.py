@@ -20,6 +20,8 @@ from pathlib import Path
 from datetime import datetime
 import sys
 
+from schema import Schema
+
 PROJECT_ID = "mimetic-maxim-443710-s2"
 DATASET = "redai_demand_forecast"
 
@@ -67,9 +69,9 @@ def run_bq_load(csv_path, table_name, write_disposition='WRITE_TRUNCATE'):
     print(f"    ✓ Done")
     return True
 
-def load_products():
-    """Load product info for descriptions"""
-    products = pd.read_csv(FEATURES_DIR / 'v2_dim_products.csv')
+def load_products(schema):
+    """Load product info for descriptions (keyed by the schema's SKU keys)"""
+    products = schema.read_csv(FEATURES_DIR / 'v2_dim_products.csv')
     # Use category_l1 as category
     products['category'] = products['category_l1'] if 'category_l1' in products.columns else 'Unknown'
     return products[['sku', 'name', 'category']].drop_duplicates().set_index('sku').to_dict('index')
@@ -81,7 +83,9 @@ def main():
     print("=" * 70)
 
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    product_info = load_products()
+    # Keys are normalised once on load, so V1-V4 files join whatever their int/str form
+    schema = Schema.load(FEATURES_DIR)
+    product_info = load_products(schema)
 
     # =========================================================================
     # PART 1: PREPARE ALL SKU PREDICTIONS
@@ -93,7 +97,7 @@ def main():
     # V1 - Original XGBoost
     v1_file = MODEL_DIR / 'sku_predictions_XGBoost.csv'
     if v1_file.exists():
-        df = pd.read_csv(v1_file)
+        df = schema.read_csv(v1_file)
         df['model_version'] = 'V1'
         df['abs_error'] = np.abs(df['actual'] - df['predicted'])
         df['pct_error'] = 100 * df['abs_error'] / df['actual'].replace(0, np.nan)
@@ -107,7 +111,7 @@ def main():
     # V2 - With patterns
     v2_file = MODEL_DIR / 'sku_predictions_XGBoost_v2.csv'
     if v2_file.exists():
-        df = pd.read_csv(v2_file)
+        df = schema.read_csv(v2_file)
         df['model_version'] = 'V2'
         df['abs_error'] = np.abs(df['actual'] - df['predicted'])
         if 'pct_error' not in df.columns:
@@ -121,7 +125,7 @@ def main():
     # V3 - With outlier handling and W47
     v3_file = MODEL_DIR / 'sku_predictions_XGBoost_v3.csv'
     if v3_file.exists():
-        df = pd.read_csv(v3_file)
+        df = schema.read_csv(v3_file)
         df['model_version'] = 'V3'
         if 'abs_error' not in df.columns:
             df['abs_error'] = np.abs(df['actual'] - df['predicted'])
@@ -136,7 +140,7 @@ def main():
     # V4 - Per-SKU models with price features
     v4_file = MODEL_DIR / 'sku_predictions_v4.csv'
     if v4_file.exists():
-        df = pd.read_csv(v4_file)
+        df = schema.read_csv(v4_file)
         df['model_version'] = 'V4'
         df['abs_error'] = np.abs(df['actual'] - df['predicted'])
         df['pct_error'] = 100 * df['abs_error'] / df['actual'].replace(0, np.nan)
@@ -146,7 +150,7 @@ def main():
 
     if all_sku:
         sku_combined = pd.concat(all_sku, ignore_index=True)
-        sku_combined['sku'] = sku_combined['sku'].astype(str)
+        sku_combined = schema.encode(sku_combined)
         sku_combined['uploaded_at'] = timestamp
         sku_combined.to_csv(BQ_UPLOAD_DIR / 'all_predictions_sku.csv', index=False)
         print(f"  → Combined: {len(sku_combined)} total SKU predictions")
@@ -161,7 +165,7 @@ def main():
     # V1
     v1_file = MODEL_DIR / 'category_predictions_XGBoost.csv'
     if v1_file.exists():
-        df = pd.read_csv(v1_file)
+        df = schema.read_csv(v1_file)
         df['model_version'] = 'V1'
         if 'abs_error' not in df.columns:
             df['abs_error'] = np.abs(df['actual'] - df['predicted'])
@@ -174,7 +178,7 @@ def main():
     # V2
     v2_file = MODEL_DIR / 'category_predictions_XGBoost_v2.csv'
     if v2_file.exists():
-        df = pd.read_csv(v2_file)
+        df = schema.read_csv(v2_file)
         df['model_version'] = 'V2'
         df['abs_error'] = np.abs(df['actual'] - df['predicted'])
         if 'pct_error' not in df.columns:
@@ -186,7 +190,7 @@ def main():
     # V3
     v3_file = MODEL_DIR / 'category_predictions_XGBoost_v3.csv'
     if v3_file.exists():
-        df = pd.read_csv(v3_file)
+        df = schema.read_csv(v3_file)
         df['model_version'] = 'V3'
         if 'abs_error' not in df.columns:
             df['abs_error'] = np.abs(df['actual'] - df['predicted'])
@@ -199,7 +203,7 @@ def main():
     # V4
     v4_file = MODEL_DIR / 'category_predictions_v4.csv'
     if v4_file.exists():
-        df = pd.read_csv(v4_file)
+        df = schema.read_csv(v4_file)
         df['model_version'] = 'V4'
         df['abs_error'] = np.abs(df['actual'] - df['predicted'])
         df['pct_error'] = 100 * df['abs_error'] / df['actual'].replace(0, np.nan)
@@ -223,7 +227,7 @@ def main():
     # V1
     v1_file = MODEL_DIR / 'customer_predictions_XGBoost.csv'
     if v1_file.exists():
-        df = pd.read_csv(v1_file)
+        df = schema.read_csv(v1_file)
         df['model_version'] = 'V1'
         df['abs_error'] = np.abs(df['actual'] - df['predicted'])
         df['pct_error'] = 100 * df['abs_error'] / df['actual'].replace(0, np.nan)
@@ -234,7 +238,7 @@ def main():
     # V2
     v2_file = MODEL_DIR / 'customer_predictions_XGBoost_v2.csv'
     if v2_file.exists():
-        df = pd.read_csv(v2_file)
+        df = schema.read_csv(v2_file)
         df['model_version'] = 'V2'
         # Handle different column names
         if 'master_customer_id' in df.columns:
@@ -249,7 +253,7 @@ def main():
     # V3
     v3_file = MODEL_DIR / 'customer_predictions_XGBoost_v3.csv'
     if v3_file.exists():
-        df = pd.read_csv(v3_file)
+        df = schema.read_csv(v3_file)
         df['model_version'] = 'V3'
         if 'abs_error' not in df.columns:
             df['abs_error'] = np.abs(df['actual'] - df['predicted'])
@@ -262,7 +266,7 @@ def main():
     # V4
     v4_file = MODEL_DIR / 'customer_predictions_v4.csv'
     if v4_file.exists():
-        df = pd.read_csv(v4_file)
+        df = schema.read_csv(v4_file)
         df['model_version'] = 'V4'
         df['abs_error'] = np.abs(df['actual'] - df['predicted'])
         df['pct_error'] = 100 * df['abs_error'] / df['actual'].replace(0, np.nan)
@@ -272,7 +276,7 @@ def main():
 
     if all_cust:
         cust_combined = pd.concat(all_cust, ignore_index=True)
-        cust_combined['customer_id'] = cust_combined['customer_id'].astype(str)
+        cust_combined = schema.encode(cust_combined)
         cust_combined['uploaded_at'] = timestamp
         cust_combined.to_csv(BQ_UPLOAD_DIR / 'all_predictions_customer.csv', index=False)
         print(f"  → Combined: {len(cust_combined)} total Customer predictions")
@@ -5,6 +5,8 @@ ACA Demand Planning - Model Training Script
 This script trains XGBoost models for SKU, Category, and Customer levels.
 
 RUN THIS SCRIPT: python3 scripts/TRAIN_ALL_MODELS.py
+                 (--completeness-weights to down-weight partial weeks in training,
+                  --resume to skip the entities checkpointed by the last run)
 
 The output will be logged to: model_training_log.txt
 """
@@ -18,6 +20,11 @@ import sys
 from datetime import datetime
 from pathlib import Path
 
+from checkpoint import Checkpoint
+from completeness import sample_weights, week_scores_from_argv
+from feature_cache import FeatureCache
+from schema import Schema, at_or_before
+
 warnings.filterwarnings('ignore')
 
 # Setup paths
@@ -29,6 +36,7 @@ OUTPUT_DIR.mkdir(exist_ok=True)
 
 # Logging
 LOG_FILE = BASE_PATH / 'model_training_log.txt'
+CHECKPOINT_DIR = BASE_PATH / 'checkpoints' / 'all_models'
 
 def log(msg):
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -41,7 +49,7 @@ def calculate_wmape(actual, predicted):
     """Weighted Mean Absolute Percentage Error"""
     return 100 * np.sum(np.abs(actual - predicted)) / np.sum(actual)
 
-def train_xgboost_model(X_train, y_train, X_test):
+def train_xgboost_model(X_train, y_train, X_test, sample_weight=None):
     """Train XGBoost (GradientBoosting) model"""
     model = GradientBoostingRegressor(
         n_estimators=100,
@@ -51,9 +59,9 @@ def train_xgboost_model(X_train, y_train, X_test):
         min_samples_leaf=2,
         random_state=42
     )
-    model.fit(X_train, y_train)
+    model.fit(X_train, y_train, sample_weight=sample_weight)
     predictions = model.predict(X_test)
-    return np.clip(predictions, 0, None)  # No negative predictions
+    return np.clip(predictions, 0, None), model  # No negative predictions
 
 def main():
     log("=" * 60)
@@ -62,8 +70,13 @@ def main():
     
     # Load features
     log("\n[1/4] Loading feature data...")
+    cache = FeatureCache(FEATURES_DIR / 'cache', refresh='--no-feature-cache' in sys.argv)
+    week_scores = week_scores_from_argv(FEATURES_DIR)
+    # Completed entities are checkpointed; --resume skips those of the last run
+    checkpoint = Checkpoint(CHECKPOINT_DIR, resume='--resume' in sys.argv)
     try:
-        weekly = pd.read_csv(FEATURES_DIR / 'v2_features_weekly.csv')
+        schema = Schema.load(FEATURES_DIR)
+        weekly = cache.read_csv(FEATURES_DIR / 'v2_features_weekly.csv', schema=schema)
         log(f"  ✓ Loaded weekly features: {len(weekly)} rows, {weekly['sku'].nunique()} SKUs")
         log(f"  ✓ Week range: {weekly['year_week'].min()} to {weekly['year_week'].max()}")
     except Exception as e:
@@ -72,7 +85,7 @@ def main():
     
     # Define H1 (training) and H2 (validation) periods
     H1_END = '2025-W26'
-    weekly['is_h1'] = weekly['year_week'] <= H1_END
+    weekly['is_h1'] = at_or_before(weekly['year_week'], H1_END)
     
     h1_data = weekly[weekly['is_h1']]
     h2_data = weekly[~weekly['is_h1']]
@@ -100,7 +113,15 @@ def main():
     trained_count = 0
     skipped_count = 0
     
+    done = checkpoint.done('sku')
     for sku in eligible_skus:
+        if sku in done:
+            sku_results.extend(done[sku]['predictions'])
+            sku_h1_actuals.extend(done[sku]['h1_actuals'])
+            trained_count += 1
+            continue
+        results_start, h1_start = len(sku_results), len(sku_h1_actuals)
+
         sku_h1 = h1_data[h1_data['sku'] == sku].copy()
         sku_h2 = h2_data[h2_data['sku'] == sku].copy()
         
@@ -129,7 +150,8 @@ def main():
         
         # Train and predict
         try:
-            predictions = train_xgboost_model(X_train, y_train, X_test)
+            predictions, model = train_xgboost_model(X_train, y_train, X_test,
+                                                     sample_weight=sample_weights(sku_h1_clean, week_scores))
             
             for i, (_, row) in enumerate(sku_h2_clean.iterrows()):
                 sku_results.append({
@@ -154,11 +176,15 @@ def main():
                 'actual': row['weekly_quantity'],
                 'description': row.get('description', '')
             })
+        checkpoint.add('sku', sku, {'predictions': sku_results[results_start:],
+                                    'h1_actuals': sku_h1_actuals[h1_start:], 'model': model})
+    checkpoint.flush()
     
     log(f"  ✓ Trained models: {trained_count}")
     log(f"  ✓ Skipped (insufficient data): {skipped_count}")
     
     # Save SKU results
+    overall_wmape = None
     if sku_results:
         sku_df = pd.DataFrame(sku_results)
         sku_df.to_csv(OUTPUT_DIR / 'sku_predictions_XGBoost_v3.csv', index=False)
@@ -181,7 +207,7 @@ def main():
     # Aggregate by category
     # First, get category mapping from products
     try:
-        products = pd.read_csv(FEATURES_DIR / 'v2_dim_products.csv')
+        products = schema.read_csv(FEATURES_DIR / 'v2_dim_products.csv')
         sku_to_cat = products[['sku', 'category']].drop_duplicates().set_index('sku')['category'].to_dict()
         weekly['category'] = weekly['sku'].map(sku_to_cat)
     except:
@@ -210,9 +236,15 @@ def main():
     cat_results = []
     cat_h1_actuals = []
     
+    done = checkpoint.done('category')
     for cat in cat_weekly['category'].unique():
         if pd.isna(cat):
             continue
+        if cat in done:
+            cat_results.extend(done[cat]['predictions'])
+            cat_h1_actuals.extend(done[cat]['h1_actuals'])
+            continue
+        results_start, h1_start = len(cat_results), len(cat_h1_actuals)
             
         cat_train = cat_h1[cat_h1['category'] == cat].dropna(subset=cat_feature_cols)
         cat_test = cat_h2[cat_h2['category'] == cat].dropna(subset=cat_feature_cols)
@@ -225,7 +257,8 @@ def main():
         X_test = cat_test[cat_feature_cols].values
         
         try:
-            predictions = train_xgboost_model(X_train, y_train, X_test)
+            predictions, model = train_xgboost_model(X_train, y_train, X_test,
+                                                     sample_weight=sample_weights(cat_train, week_scores))
             
             for i, (_, row) in enumerate(cat_test.iterrows()):
                 cat_results.append({
@@ -246,7 +279,11 @@ def main():
                 'year_week': row['year_week'],
                 'actual': row['weekly_quantity']
             })
+        checkpoint.add('category', cat, {'predictions': cat_results[results_start:],
+                                         'h1_actuals': cat_h1_actuals[h1_start:], 'model': model})
+    checkpoint.flush()
     
+    cat_wmape = None
     if cat_results:
         cat_df = pd.DataFrame(cat_results)
         cat_df.to_csv(OUTPUT_DIR / 'category_predictions_XGBoost_v3.csv', index=False)
@@ -266,21 +303,22 @@ def main():
     
     # Load customer features
     try:
-        cust_sku = pd.read_csv(FEATURES_DIR / 'v2_features_sku_customer.csv')
-        customers = pd.read_csv(FEATURES_DIR / 'v2_dim_customers.csv')
+        cust_sku = cache.read_csv(FEATURES_DIR / 'v2_features_sku_customer.csv', schema=schema)
+        customers = schema.read_csv(FEATURES_DIR / 'v2_dim_customers.csv')
         cust_names = customers.set_index('customer_id')['customer_name'].to_dict()
         log(f"  ✓ Loaded customer data: {cust_sku['customer_id'].nunique()} customers")
     except Exception as e:
         log(f"  ! Could not load customer features: {e}")
         cust_sku = None
     
+    cust_wmape = None
     if cust_sku is not None:
         # Aggregate by customer and week
         cust_weekly = cust_sku.groupby(['customer_id', 'year_week']).agg({
             'weekly_quantity': 'sum'
         }).reset_index()
         
-        cust_weekly['is_h1'] = cust_weekly['year_week'] <= H1_END
+        cust_weekly['is_h1'] = at_or_before(cust_weekly['year_week'], H1_END)
         
         # Add lag features
         cust_weekly = cust_weekly.sort_values(['customer_id', 'year_week'])
@@ -304,7 +342,15 @@ def main():
         log(f"  ✓ Eligible customers (≥4 H1 weeks): {len(eligible_custs)}")
         
         trained_cust = 0
+        done = checkpoint.done('customer')
         for cust in eligible_custs:
+            if cust in done:
+                cust_results.extend(done[cust]['predictions'])
+                cust_h1_actuals.extend(done[cust]['h1_actuals'])
+                trained_cust += 1
+                continue
+            results_start, h1_start = len(cust_results), len(cust_h1_actuals)
+
             cust_train = cust_h1[cust_h1['customer_id'] == cust].dropna(subset=cust_feature_cols)
             cust_test = cust_h2[cust_h2['customer_id'] == cust].dropna(subset=cust_feature_cols)
             
@@ -316,7 +362,8 @@ def main():
             X_test = cust_test[cust_feature_cols].values
             
             try:
-                predictions = train_xgboost_model(X_train, y_train, X_test)
+                predictions, model = train_xgboost_model(X_train, y_train, X_test,
+                                                         sample_weight=sample_weights(cust_train, week_scores))
                 
                 for i, (_, row) in enumerate(cust_test.iterrows()):
                     cust_results.append({
@@ -340,6 +387,9 @@ def main():
                     'year_week': row['year_week'],
                     'actual': row['weekly_quantity']
                 })
+            checkpoint.add('customer', cust, {'predictions': cust_results[results_start:],
+                                              'h1_actuals': cust_h1_actuals[h1_start:], 'model': model})
+        checkpoint.flush()
         
         log(f"  ✓ Trained customer models: {trained_cust}")
         
@@ -362,8 +412,15 @@ def main():
     log("TRAINING COMPLETE")
     log("=" * 60)
     log(f"Output files saved to: {OUTPUT_DIR}")
+    log(checkpoint.summary())
     log(f"Log file: {LOG_FILE}")
     log("\nNext step: Run the dashboard data generator")
 
+    return {
+        'sku_wmape': overall_wmape,
+        'cat_wmape': cat_wmape,
+        'cust_wmape': cust_wmape
+    }
+
 if __name__ == '__main__':
     main()
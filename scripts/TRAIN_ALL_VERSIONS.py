@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+TRAIN ALL VERSIONS - Every Model Version in One Run
+===================================================
+
+Runs the existing TRAIN_* scripts in one harness instead of seven separate
+processes. It calls each script's main() with its flags (sys.argv is swapped
+per version) and does not replace the scripts. Each version keeps its own
+training code and still builds its own SKU groups and feature matrices; only
+the loaded inputs and featured frames are shared:
+1. Shared inputs and each version's featured weekly frame are loaded once,
+   through the feature cache kept in memory (feature_cache.share_in_memory)
+2. Versions run in lanes: a lane runs its versions in order in one process
+   (TRAIN_V3_MODELS rewrites TRAIN_ALL_MODELS' SKU *_v3 files and V3.1
+   compares against them), lanes run in parallel forked processes that
+   inherit the loaded frames - as many as VERSION_WORKERS and the available
+   memory allow (LANE_MEMORY_FACTOR × the shared frames per lane)
+3. Each version writes its usual prediction / H1 actuals files and log; a
+   version that fails is reported and does not stop the others
+
+V1 / V2 (TRAIN_V1_MODELS.sh, TRAIN_V2_MODELS.sh) are BigQuery ML jobs and
+stay outside the harness; TRAIN_V3_3_GLOBAL reproduces the V2 global model.
+
+Output:
+  - the prediction files of every version (model_evaluation/)
+  - training_versions_summary.csv - per version: status, seconds, SKU WMAPE
+
+Run: python3 scripts/TRAIN_ALL_VERSIONS.py
+     (--versions=v3_1,v4 to run only some versions, --serial to run every
+      lane in this process; other flags, e.g. --completeness-weights,
+      --no-feature-cache or --resume, are passed on to every version)
+"""
+
+import pandas as pd
+import numpy as np
+import contextlib
+import importlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from datetime import datetime
+import sys
+import warnings
+warnings.filterwarnings('ignore')
+
+import feature_cache
+from feature_cache import FeatureCache
+from schema import Schema
+
+# Configuration
+SCRIPT_DIR = Path(__file__).parent.resolve()
+BASE_PATH = SCRIPT_DIR.parent
+FEATURES_DIR = BASE_PATH / 'features_v2'
+OUTPUT_DIR = BASE_PATH / 'model_evaluation'
+LOG_FILE = BASE_PATH / 'all_versions_training_log.txt'
+SUMMARY_FILE = 'training_versions_summary.csv'
+
+# Lanes of (version, training script, extra flags); versions of a lane run in order
+LANES = [
+    [('all_models', 'TRAIN_ALL_MODELS', []),
+     ('v3', 'TRAIN_V3_MODELS', []),
+     ('v3_1', 'TRAIN_V3_1_MODELS', [])],
+    [('v3_2', 'TRAIN_V3_2_MODELS', [])],
+    [('v3_3', 'TRAIN_V3_3_GLOBAL', [])],
+    [('v3_hybrid', 'TRAIN_V3_HYBRID', [])],
+    [('v4', 'TRAIN_V4_MODELS', [])],
+]
+
+# Raw inputs the scripts read through FeatureCache.read_csv (keys encoded by the Schema)
+SHARED_INPUTS = ['v2_features_weekly.csv', 'v2_features_sku_customer.csv']
+
+# Lanes run in parallel processes; each is budgeted this many times the shared frames' memory
+VERSION_WORKERS = min(4, os.cpu_count() or 1)
+LANE_MEMORY_FACTOR = 4
+
+HARNESS_FLAGS = ('--versions', '--serial')
+
+def log(msg):
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    line = f"[{timestamp}] {msg}"
+    print(line)
+    with open(LOG_FILE, 'a') as f:
+        f.write(line + '\n')
+
+def available_memory():
+    """Bytes of memory available to new processes (None where unknown)"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def selected_lanes(argv):
+    """LANES restricted to --versions=a,b (all versions by default), empty lanes dropped"""
+    arg = next((a for a in argv if a.startswith('--versions=')), None)
+    if arg is None:
+        return LANES
+    wanted = set(arg.split('=', 1)[1].split(','))
+    lanes = [[config for config in lane if config[0] in wanted] for lane in LANES]
+    return [lane for lane in lanes if lane]
+
+def warm(lanes, refresh):
+    """Load the shared inputs and each selected version's featured frame into the shared cache"""
+    cache = FeatureCache(FEATURES_DIR / 'cache', refresh=refresh)
+    schema = Schema.load(FEATURES_DIR)
+    for name in SHARED_INPUTS:
+        if (FEATURES_DIR / name).exists():
+            cache.read_csv(FEATURES_DIR / name, schema=schema)
+    for lane in lanes:
+        for version, script, _ in lane:
+            module = importlib.import_module(script)
+            if hasattr(module, 'materialise_weekly'):
+                try:
+                    module.materialise_weekly(cache)
+                except Exception as e:
+                    log(f"  ⚠ {version}: frame not preloaded ({e})")
+    return cache
+
+def run_version(version, script, flags, quiet=False):
+    """Run one training script's main() with its flags (as its sys.argv); a summary row"""
+    argv = sys.argv
+    sys.argv = [str(SCRIPT_DIR / f'{script}.py')] + flags
+    start = time.time()
+    row = {'version': version, 'script': script, 'status': 'ok', 'seconds': np.nan,
+           'sku_wmape': np.nan, 'error': ''}
+    try:
+        module = importlib.import_module(script)
+        with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null if quiet else sys.stdout):
+            result = module.main()
+        result = result.get('sku_wmape') if isinstance(result, dict) else result
+        if isinstance(result, (int, float, np.floating)):
+            row['sku_wmape'] = float(result)
+    except Exception as e:
+        row['status'] = 'failed'
+        row['error'] = f"{type(e).__name__}: {e}"
+    finally:
+        sys.argv = argv
+        row['seconds'] = round(time.time() - start, 1)
+    return row
+
+def run_lane(lane, flags, quiet=False):
+    """Versions of one lane in order (worker entry point)"""
+    return [run_version(version, script, extra + flags, quiet) for version, script, extra in lane]
+
+def main():
+    log("=" * 70)
+    log("TRAIN ALL VERSIONS - Shared Data, One Run")
+    log("=" * 70)
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    lanes = selected_lanes(sys.argv)
+    flags = [a for a in sys.argv[1:] if not a.startswith(HARNESS_FLAGS)]
+    versions = [version for lane in lanes for version, _, _ in lane]
+    log(f"  Versions: {', '.join(versions)} ({len(lanes)} lanes)")
+
+    # Load once: shared inputs and featured frames stay in memory for every version
+    log("\n[1/3] Loading shared data and features...")
+    start = time.time()
+    feature_cache.share_in_memory()
+    cache = warm(lanes, refresh='--no-feature-cache' in sys.argv)
+    shared_bytes = feature_cache.memory_bytes()
+    log(f"  ✓ {cache.summary()}")
+    log(f"  ✓ {shared_bytes / 1e6:.1f} MB shared in memory ({time.time() - start:.1f}s)")
+
+    # Parallel lanes only with fork (children inherit the shared frames) and memory for each
+    workers = min(VERSION_WORKERS, len(lanes))
+    memory = available_memory()
+    if memory is not None and shared_bytes > 0:
+        workers = min(workers, max(1, int(memory // (LANE_MEMORY_FACTOR * shared_bytes))))
+    if '--serial' in sys.argv or 'fork' not in multiprocessing.get_all_start_methods():
+        workers = 1
+
+    log(f"\n[2/3] Training {len(versions)} versions ({workers} parallel lanes)...")
+    start = time.time()
+    if workers == 1:
+        rows = [row for lane in lanes for row in run_lane(lane, flags)]
+    else:
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            results = pool.map(run_lane, lanes, [flags] * len(lanes), [True] * len(lanes))
+            rows = [row for lane_rows in results for row in lane_rows]
+    log(f"  ✓ Trained in {time.time() - start:.1f}s")
+
+    log("\n[3/3] Results")
+    summary = pd.DataFrame(rows)
+    for row in summary.itertuples():
+        wmape = f"{row.sku_wmape:6.1f}%" if not np.isnan(row.sku_wmape) else '      -'
+        detail = f" | {row.error}" if row.status != 'ok' else ''
+        log(f"  {row.version:10} | {row.status:6} | {row.seconds:7.1f}s | SKU WMAPE {wmape}{detail}")
+
+    summary.to_csv(OUTPUT_DIR / SUMMARY_FILE, index=False)
+    log(f"\n  ✓ Saved: {SUMMARY_FILE}")
+    log("=" * 70)
+    return summary
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+DAILY MODEL TRAINING - Day-Level Forecasts for Delivery Scheduling
+==================================================================
+
+Trains on the forecast_*_daily tables (category, customer, SKU):
+1. Densify each level to a Series × Day panel (float32, see daily_grain.py)
+2. Day-of-week profiles from H1 (per series, shrunk to the level profile)
+3. Daily features in series chunks: same-weekday lags, trailing means,
+   days since last order, weekday share, week number
+4. One global gradient-boosted model per level, HORIZON_DAYS ahead
+5. Evaluation on H2 at daily grain and resampled to weekly grain, plus the
+   profile disaggregation of actual weekly totals (the weekday split error)
+
+Levels without H2 daily rows (forecast_sku_daily_H1.csv only) hold out the
+last HOLDOUT_WEEKS weeks instead. If V4 weekly predictions exist they are
+disaggregated to days with the same profiles.
+
+Output:
+  - {level}_daily_predictions.csv  - actual vs predicted per series × day
+  - {level}_dow_profiles.csv       - weekday shares per series
+  - {level}_daily_from_v4.csv      - V4 weekly predictions split to days
+
+Run: python3 scripts/TRAIN_DAILY_MODELS.py
+     (--completeness-weights to down-weight days of partial weeks in training)
+"""
+
+import pandas as pd
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor
+from pathlib import Path
+from datetime import datetime
+import warnings
+warnings.filterwarnings('ignore')
+
+from completeness import sample_weights, week_scores_from_argv
+from daily_grain import DailyPanel, DAILY_FEATURES, daily_features, disaggregate, week_start, year_week
+
+# Configuration
+SCRIPT_DIR = Path(__file__).parent.resolve()
+BASE_PATH = SCRIPT_DIR.parent
+FEATURES_DIR = BASE_PATH / 'features_v2'
+OUTPUT_DIR = BASE_PATH / 'model_evaluation'
+LOG_FILE = BASE_PATH / 'daily_training_log.txt'
+
+H1_END_WEEK = 26
+HORIZON_DAYS = 7        # forecasts use data at least a week old
+HOLDOUT_WEEKS = 8       # validation window when a level has no H2 daily rows
+CHUNK_SERIES = 500      # series per feature batch
+
+# level -> (key column, daily table stem, V4 prediction file, V4 key column)
+LEVELS = {
+    'category': ('category_l1', 'forecast_category_daily', 'category_predictions_v4.csv', 'category'),
+    'customer': ('customer_id', 'forecast_customer_daily', 'customer_predictions_v4.csv', 'customer_id'),
+    'sku': ('sku', 'forecast_sku_daily', 'sku_predictions_v4.csv', 'sku'),
+}
+
+def log(msg):
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    line = f"[{timestamp}] {msg}"
+    print(line)
+    with open(LOG_FILE, 'a') as f:
+        f.write(line + '\n')
+
+def calculate_wmape(actual, predicted):
+    actual = np.array(actual)
+    predicted = np.array(predicted)
+    return 100 * np.sum(np.abs(actual - predicted)) / np.sum(actual) if np.sum(actual) > 0 else 999
+
+def load_daily(stem):
+    """Full daily table, or its H1 / H2 parts when only those exist"""
+    full = FEATURES_DIR / f'{stem}.csv'
+    if full.exists():
+        return pd.read_csv(full)
+    parts = [FEATURES_DIR / f'{stem}_{p}.csv' for p in ('H1', 'H2')]
+    parts = [pd.read_csv(p) for p in parts if p.exists()]
+    return pd.concat(parts, ignore_index=True) if parts else None
+
+def split_day(panel, daily):
+    """First validation day: Monday of week H1_END_WEEK + 1, or the last HOLDOUT_WEEKS"""
+    year = pd.to_datetime(daily['date']).min().isocalendar().year
+    h2_start = week_start([f'{year}-W{H1_END_WEEK + 1:02d}'])[0]
+    if pd.to_datetime(daily['date']).max() >= h2_start:
+        return h2_start, 'H2'
+    return panel.dates[-7 * HOLDOUT_WEEKS], f'last {HOLDOUT_WEEKS} weeks'
+
+def build_matrices(panel, profile, split):
+    """Train / test feature matrices built one chunk of series at a time"""
+    split_idx = panel.day_index(split)
+    train_X, train_rows, test_X, test_rows = [], [], [], []
+    offset = 0
+    for chunk in panel.chunks(CHUNK_SERIES):
+        X, rows = daily_features(chunk, horizon=HORIZON_DAYS, profile=profile, end=split)
+        rows['series'] += offset
+        is_test = (rows['day'] >= split_idx).to_numpy()
+        train_X.append(X[~is_test])
+        train_rows.append(rows[~is_test])
+        test_X.append(X[is_test])
+        test_rows.append(rows[is_test])
+        offset += len(chunk.keys)
+    return (np.concatenate(train_X), pd.concat(train_rows, ignore_index=True),
+            np.concatenate(test_X), pd.concat(test_rows, ignore_index=True))
+
+def train_model(X_train, y_train, sample_weight=None):
+    """Global daily model (histogram GBM: fast on ~7x weekly rows, float32 input)"""
+    model = HistGradientBoostingRegressor(
+        loss='poisson',
+        max_iter=200,
+        learning_rate=0.05,
+        max_depth=6,
+        min_samples_leaf=20,
+        random_state=42
+    )
+    model.fit(X_train, y_train, sample_weight=sample_weight)
+    return model
+
+def train_level(level, key, stem, v4_file, v4_key, week_scores=None):
+    daily = load_daily(stem)
+    if daily is None or len(daily) == 0:
+        log(f"  ⚠ No daily table for {level} ({stem}*.csv), skipped")
+        return None
+
+    panel = DailyPanel.from_frame(daily, key, 'quantity')
+    split, holdout = split_day(panel, daily)
+    log(f"  ✓ {len(daily)} order-days -> panel {panel.values.shape[0]} series × {panel.values.shape[1]} days "
+        f"({panel.values.nbytes / 1e6:.1f} MB float32)")
+    log(f"  ✓ Validation: {holdout} (from {split.date()})")
+
+    # Weekday profiles from the training days only
+    profile = panel.dow_profile(end=split)
+    profile.to_csv(OUTPUT_DIR / f'{level}_dow_profiles.csv', index=False)
+
+    X_train, train_rows, X_test, test_rows = build_matrices(panel, profile, split)
+    log(f"  ✓ Features: {len(DAILY_FEATURES)}, train {len(X_train)} rows, test {len(X_test)} rows")
+
+    # Week scores per calendar day, picked per training row
+    day_weights = sample_weights(pd.DataFrame({'year_week': year_week(panel.dates)}), week_scores)
+    weights = day_weights[train_rows['day'].to_numpy()] if day_weights is not None else None
+    model = train_model(X_train, train_rows['target'].to_numpy(), weights)
+    preds = np.clip(model.predict(X_test), 0, None).astype(np.float32)
+
+    # Daily results
+    result = panel.keys.iloc[test_rows['series']].reset_index(drop=True)
+    result['date'] = panel.dates[test_rows['day']].strftime('%Y-%m-%d')
+    result['actual'] = test_rows['target'].to_numpy()
+    result['predicted'] = preds.round(1)
+    result.to_csv(OUTPUT_DIR / f'{level}_daily_predictions.csv', index=False)
+
+    daily_wmape = calculate_wmape(result['actual'], result['predicted'])
+
+    # Resampled to weeks (whole validation weeks only)
+    predicted = np.zeros_like(panel.values)
+    predicted[test_rows['series'], test_rows['day']] = preds
+    first_week = panel.day_index(split) // 7
+    weekly_actual = panel.weekly(long=False)[:, first_week:]
+    weekly_pred = DailyPanel(panel.keys, panel.dates, predicted).weekly(long=False)[:, first_week:]
+    weekly_wmape = calculate_wmape(weekly_actual.ravel(), weekly_pred.ravel())
+
+    # Weekday split error alone: actual weekly totals disaggregated by the profiles
+    weeks = panel.weekly()
+    weeks = weeks[weeks['year_week'].isin(panel.week_labels()[first_week:])]
+    split_daily = disaggregate(weeks, profile, key, 'quantity')
+    actual_daily = panel.to_frame(start=split)
+    merged = actual_daily.merge(split_daily[[key, 'date', 'quantity']], on=[key, 'date'], suffixes=('', '_split'))
+    profile_wmape = calculate_wmape(merged['quantity'], merged['quantity_split'])
+
+    log(f"\n  ★ {level.title()} daily WMAPE: {daily_wmape:.1f}%")
+    log(f"    Weekly (daily predictions summed): {weekly_wmape:.1f}%")
+    log(f"    Profile split of actual weekly totals: {profile_wmape:.1f}%")
+    log(f"  ✓ Saved: {level}_daily_predictions.csv ({len(result)} predictions)")
+
+    # V4 weekly predictions -> days
+    v4_path = OUTPUT_DIR / v4_file
+    if v4_path.exists():
+        v4 = pd.read_csv(v4_path)
+        v4 = v4.rename(columns={v4_key: key})
+        # Keys are matched as text (V4 writes customer ids as strings)
+        v4[key] = v4[key].astype(str)
+        v4_daily = disaggregate(v4[[key, 'year_week', 'predicted']], profile.astype({key: str}), key, 'predicted')
+        v4_daily['predicted'] = v4_daily['predicted'].round(1)
+        v4_daily.to_csv(OUTPUT_DIR / f'{level}_daily_from_v4.csv', index=False)
+        log(f"  ✓ Saved: {level}_daily_from_v4.csv ({len(v4_daily)} days from {v4_file})")
+
+    return {'daily_wmape': daily_wmape, 'weekly_wmape': weekly_wmape, 'profile_wmape': profile_wmape,
+            'series': len(panel.keys), 'predictions': len(result)}
+
+def main():
+    log("=" * 70)
+    log("DAILY MODEL TRAINING - Day-Level Forecasts")
+    log("=" * 70)
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    week_scores = week_scores_from_argv(FEATURES_DIR)
+
+    results = {}
+    for i, (level, (key, stem, v4_file, v4_key)) in enumerate(LEVELS.items(), 1):
+        log(f"\n[{i}/{len(LEVELS) + 1}] {level.title()} level ({stem})...")
+        results[level] = train_level(level, key, stem, v4_file, v4_key, week_scores)
+
+    log(f"\n[{len(LEVELS) + 1}/{len(LEVELS) + 1}] Summary")
+    log("\n" + "=" * 70)
+    log("DAILY MODEL TRAINING COMPLETE")
+    log("=" * 70)
+    for level, res in results.items():
+        if res is None:
+            continue
+        log(f"\n  {level.title()} Level:")
+        log(f"    Daily WMAPE: {res['daily_wmape']:.1f}%")
+        log(f"    Weekly WMAPE: {res['weekly_wmape']:.1f}%")
+        log(f"    Series: {res['series']}, Predictions: {res['predictions']}")
+
+    log(f"\n  Files saved to: {OUTPUT_DIR}")
+    log("=" * 70)
+    return results
+
+if __name__ == '__main__':
+    main()
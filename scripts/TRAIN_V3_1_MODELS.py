@@ -10,6 +10,11 @@ Fixes issues from V3:
 5. Separate models for high/low volatility SKUs
 
 Run: python3 scripts/TRAIN_V3_1_MODELS.py
+     (--no-feature-cache to rebuild the cached V3.1 feature frame,
+      --completeness-weights to down-weight partial weeks in training,
+      --resume to skip the SKUs checkpointed by the last run,
+      --intermittent to forecast sparse SKUs with Croston / SBA / TSB, fitted
+      to all of them at once, instead of a model per SKU, see intermittent.py)
 """
 
 import pandas as pd
@@ -18,15 +23,27 @@ from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
 from sklearn.linear_model import Ridge
 from pathlib import Path
 from datetime import datetime
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+from checkpoint import Checkpoint
+from completeness import sample_weights, week_scores_from_argv
+from demand_patterns import legacy_patterns
+from feature_cache import FeatureCache
+from feature_graph import FeatureGraph, clip_finite
+from group_training import group_jobs
+from intermittent import fit_intermittent, predict_intermittent
+from robust_stats import flag_outliers
+from schema import DICTIONARY_FILE, Schema, at_or_before
+
 # Configuration
 SCRIPT_DIR = Path(__file__).parent.resolve()
 BASE_PATH = SCRIPT_DIR.parent
 FEATURES_DIR = BASE_PATH / 'features_v2'
 OUTPUT_DIR = BASE_PATH / 'model_evaluation'
 LOG_FILE = BASE_PATH / 'v3_1_training_log.txt'
+CHECKPOINT_DIR = BASE_PATH / 'checkpoints' / 'v3_1'
 
 H1_END = '2025-W26'
 
@@ -59,79 +76,46 @@ V3_1_FEATURES = [
     'is_outlier'
 ]
 
-def add_v3_1_features(df):
-    """Add V3.1 optimized features"""
-    df = df.copy()
-    df = df.sort_values(['sku', 'year_week'])
-
-    # Extract week number
-    df['week_num'] = df['year_week'].str.extract(r'W(\d+)').astype(int)
-
-    # Key seasonality features
-    df['is_w47'] = (df['week_num'] == 47).astype(int)
-
-    # Cyclical encoding
-    df['week_sin'] = np.sin(2 * np.pi * df['week_num'] / 52)
-    df['week_cos'] = np.cos(2 * np.pi * df['week_num'] / 52)
-
-    # Core lags
-    for lag in [1, 2, 4]:
-        df[f'lag{lag}'] = df.groupby('sku')['weekly_quantity'].shift(lag)
-
-    # Rolling stats (4w window only - most predictive)
-    df['rolling_mean_4w'] = df.groupby('sku')['weekly_quantity'].transform(
-        lambda x: x.shift(1).rolling(4, min_periods=1).mean()
-    )
-    df['rolling_std_4w'] = df.groupby('sku')['weekly_quantity'].transform(
-        lambda x: x.shift(1).rolling(4, min_periods=1).std()
-    )
-
-    # Trend & momentum
-    df['trend_4w'] = (df['lag1'] - df['lag4']) / df['lag4'].replace(0, np.nan)
-    df['momentum'] = df['lag1'] - df['lag2']
-
-    # Coefficient of variation (volatility indicator)
-    df['cv_4w'] = df['rolling_std_4w'] / df['rolling_mean_4w'].replace(0, np.nan)
-
-    # Outlier detection (IQR method, used as feature)
-    df['is_outlier'] = 0
-    for sku in df['sku'].unique():
-        mask = df['sku'] == sku
-        values = df.loc[mask, 'weekly_quantity']
-        if len(values) >= 5:
-            Q1, Q3 = values.quantile([0.25, 0.75])
-            IQR = Q3 - Q1
-            lower = Q1 - 2.0 * IQR
-            upper = Q3 + 2.0 * IQR
-            outlier_mask = (values < lower) | (values > upper)
-            df.loc[mask, 'is_outlier'] = outlier_mask.astype(int).values
-
-    # Fill NaN
-    df = df.fillna(0)
-    df['trend_4w'] = df['trend_4w'].replace([np.inf, -np.inf], 0).clip(-10, 10)
-    df['cv_4w'] = df['cv_4w'].replace([np.inf, -np.inf], 0).clip(0, 10)
-
-    return df
-
-def classify_sku_pattern(sku_data):
-    """Classify SKU into pattern type for model selection"""
-    # Calculate metrics
-    mean_qty = sku_data['weekly_quantity'].mean()
-    std_qty = sku_data['weekly_quantity'].std()
-    zeros = (sku_data['weekly_quantity'] == 0).sum()
-    total = len(sku_data)
-
-    cv = std_qty / mean_qty if mean_qty > 0 else 10
-    zero_pct = zeros / total
-
-    if zero_pct > 0.5:
-        return 'sparse'  # Mostly zeros - use simple model
-    elif cv > 1.5:
-        return 'volatile'  # High variability - use robust model
-    else:
-        return 'stable'  # Regular pattern - use standard model
+# V3.1 feature definitions; a model computes only the subgraph it requests
+V3_1_GRAPH = FeatureGraph(sort_by=['sku', 'year_week'])
+
+# Extract week number
+V3_1_GRAPH.add('week_num', ['year_week'], lambda df: df['year_week'].str.extract(r'W(\d+)')[0].astype(int))
+
+# Key seasonality features
+V3_1_GRAPH.add('is_w47', ['week_num'], lambda df: (df['week_num'] == 47).astype(int))
+
+# Cyclical encoding
+V3_1_GRAPH.add('week_sin', ['week_num'], lambda df: np.sin(2 * np.pi * df['week_num'] / 52))
+V3_1_GRAPH.add('week_cos', ['week_num'], lambda df: np.cos(2 * np.pi * df['week_num'] / 52))
+
+# Core lags
+for lag in [1, 2, 4]:
+    V3_1_GRAPH.lag(f'lag{lag}', 'weekly_quantity', lag)
+
+# Rolling stats (4w window only - most predictive)
+V3_1_GRAPH.rolling('rolling_mean_4w', 'weekly_quantity', 4, 'mean')
+V3_1_GRAPH.rolling('rolling_std_4w', 'weekly_quantity', 4, 'std')
+
+# Trend & momentum
+V3_1_GRAPH.add('trend_4w', ['lag1', 'lag4'], lambda df: (df['lag1'] - df['lag4']) / df['lag4'].replace(0, np.nan),
+               finish=clip_finite(-10, 10))
+V3_1_GRAPH.add('momentum', ['lag1', 'lag2'], lambda df: df['lag1'] - df['lag2'])
+
+# Coefficient of variation (volatility indicator)
+V3_1_GRAPH.add('cv_4w', ['rolling_std_4w', 'rolling_mean_4w'],
+               lambda df: df['rolling_std_4w'] / df['rolling_mean_4w'].replace(0, np.nan),
+               finish=clip_finite(0, 10))
+
+# Outlier detection (IQR method, used as feature)
+V3_1_GRAPH.add('is_outlier', ['sku', 'weekly_quantity'],
+               lambda df: flag_outliers(df, 'sku', 'weekly_quantity', threshold=2.0).astype(int))
 
-def train_v3_1_model(X_train, y_train, X_test, pattern='stable'):
+def add_v3_1_features(df, features=None):
+    """Add V3.1 optimized features: the requested ones (default: V3_1_FEATURES), NaN filled with 0"""
+    return V3_1_GRAPH.compute(df, features or V3_1_FEATURES)
+
+def train_v3_1_model(X_train, y_train, X_test, pattern='stable', sample_weight=None):
     """Train model based on SKU pattern"""
 
     if pattern == 'sparse':
@@ -159,11 +143,19 @@ def train_v3_1_model(X_train, y_train, X_test, pattern='stable'):
             random_state=42
         )
 
-    model.fit(X_train, y_train)
+    model.fit(X_train, y_train, sample_weight=sample_weight)
     predictions = model.predict(X_test)
 
     return np.clip(predictions, 0, None), model
 
+def materialise_weekly(cache, schema=None):
+    """V3.1 featured weekly frame through the feature cache (shared with TRAIN_ALL_VERSIONS.py)"""
+    weekly_path = FEATURES_DIR / 'v2_features_weekly.csv'
+    schema = schema or Schema.load(FEATURES_DIR)
+    inputs = [weekly_path, FEATURES_DIR / DICTIONARY_FILE]
+    return cache.materialise('v3_1_weekly', inputs, load=lambda: schema.read_csv(weekly_path),
+                             groups=[('v3_1', add_v3_1_features)])
+
 def main():
     log("=" * 60)
     log("V3.1 MODEL TRAINING - OPTIMIZED VERSION")
@@ -176,16 +168,18 @@ def main():
 
     # Load data
     log("\n[1/5] Loading data...")
-    weekly = pd.read_csv(FEATURES_DIR / 'v2_features_weekly.csv')
+    cache = FeatureCache(FEATURES_DIR / 'cache', refresh='--no-feature-cache' in sys.argv)
+    week_scores = week_scores_from_argv(FEATURES_DIR)
+    weekly = materialise_weekly(cache)
     log(f"  ✓ Loaded {len(weekly)} rows, {weekly['sku'].nunique()} SKUs")
 
     # Add V3.1 features
     log("\n[2/5] Adding V3.1 features (12 core features)...")
-    weekly = add_v3_1_features(weekly)
+    log(f"  ✓ {cache.summary()}")
     log(f"  ✓ Features: {V3_1_FEATURES}")
 
     # H1/H2 split
-    weekly['is_h1'] = weekly['year_week'] <= H1_END
+    weekly['is_h1'] = at_or_before(weekly['year_week'], H1_END)
     h1_data = weekly[weekly['is_h1']]
     h2_data = weekly[~weekly['is_h1']]
 
@@ -194,11 +188,9 @@ def main():
 
     # Classify SKUs by pattern
     log("\n[3/5] Classifying SKU patterns...")
-    sku_patterns = {}
-    for sku in weekly['sku'].unique():
-        sku_h1 = h1_data[h1_data['sku'] == sku]
-        if len(sku_h1) >= 4:
-            sku_patterns[sku] = classify_sku_pattern(sku_h1)
+    labels = legacy_patterns(h1_data)
+    h1_rows = h1_data.groupby('sku').size()
+    sku_patterns = {sku: labels[sku] for sku in weekly['sku'].unique() if h1_rows.get(sku, 0) >= 4}
 
     pattern_counts = pd.Series(sku_patterns).value_counts()
     log(f"  ✓ Stable: {pattern_counts.get('stable', 0)}")
@@ -208,45 +200,86 @@ def main():
     # Train models
     log("\n[4/5] Training SKU-level V3.1 models...")
 
+    # Completed SKUs are checkpointed; --resume skips those of the last run
+    checkpoint = Checkpoint(CHECKPOINT_DIR, resume='--resume' in sys.argv)
+    done = checkpoint.done('sku')
+
     sku_results = []
     sku_h1_actuals = []
     trained_by_pattern = {'stable': 0, 'volatile': 0, 'sparse': 0}
     skipped = 0
 
-    for sku, pattern in sku_patterns.items():
-        sku_h1 = h1_data[h1_data['sku'] == sku].copy()
-        sku_h2 = h2_data[h2_data['sku'] == sku].copy()
+    # --intermittent: sparse SKUs forecast together by the intermittent-demand methods
+    intermittent = '--intermittent' in sys.argv
+    sparse_df = pd.DataFrame()
+    if intermittent:
+        sparse_skus = [sku for sku, pattern in sku_patterns.items() if pattern == 'sparse']
+        sparse_h1 = h1_data[h1_data['sku'].isin(sparse_skus)]
+        fits = fit_intermittent(sparse_h1, 'sku')
+        rows = predict_intermittent(h2_data.dropna(subset=V3_1_FEATURES), fits, 'sku')
+        sparse_df = pd.DataFrame({
+            'sku': rows['sku'].to_numpy(),
+            'year_week': rows['year_week'].to_numpy(),
+            'actual': rows['weekly_quantity'].to_numpy(),
+            'predicted': rows['predicted'].to_numpy(),
+            'pattern': 'sparse',
+            'is_w47': rows['is_w47'].to_numpy()
+        })
+        predicted_skus = set(rows['sku'])
+        sparse_h1 = sparse_h1[sparse_h1['sku'].isin(predicted_skus)]
+        sku_h1_actuals.extend(sparse_h1[['sku', 'year_week', 'weekly_quantity']]
+                              .rename(columns={'weekly_quantity': 'actual'}).to_dict('records'))
+        trained_by_pattern['sparse'] = len(predicted_skus)
+        skipped += len(sparse_skus) - len(predicted_skus)
+        methods = fits[fits['sku'].isin(predicted_skus)]['method'].value_counts()
+        if len(methods):
+            log(f"  ✓ Sparse SKUs (intermittent): {', '.join(f'{m} {n}' for m, n in methods.items())}")
+
+    # Each SKU's complete H1 / H2 rows are slices of one matrix per period
+    # (float64, as the models were fitted on) instead of a frame copy per SKU
+    h1_clean = h1_data.dropna(subset=V3_1_FEATURES)
+    h2_clean = h2_data.dropna(subset=V3_1_FEATURES)
+    train_jobs = {sku: job for sku, *job in group_jobs(
+        h1_clean, 'sku', V3_1_FEATURES, 'weekly_quantity', 3,
+        lambda frame: sample_weights(frame, week_scores), dtype=np.float64)}
+    test_jobs = {sku: job for sku, *job in group_jobs(
+        h2_clean, 'sku', V3_1_FEATURES, 'weekly_quantity', 1, dtype=np.float64)}
+    h1_rows = h1_data.groupby('sku', sort=False, observed=True).indices
+    h2_rows = h2_clean.groupby('sku', sort=False, observed=True).indices
+    h1_cols = {col: h1_data[col].to_numpy() for col in ['year_week', 'weekly_quantity']}
+    h2_cols = {col: h2_clean[col].to_numpy() for col in ['year_week', 'weekly_quantity', 'is_w47']}
 
-        if len(sku_h2) == 0:
-            skipped += 1
+    for sku, pattern in sku_patterns.items():
+        if intermittent and pattern == 'sparse':
             continue
+        if sku in done:
+            sku_results.extend(done[sku]['predictions'])
+            sku_h1_actuals.extend(done[sku]['h1_actuals'])
+            trained_by_pattern[pattern] += 1
+            continue
+        results_start, h1_start = len(sku_results), len(sku_h1_actuals)
 
-        # Filter rows with valid features
-        sku_h1_clean = sku_h1.dropna(subset=V3_1_FEATURES)
-        sku_h2_clean = sku_h2.dropna(subset=V3_1_FEATURES)
-
-        if len(sku_h1_clean) < 3 or len(sku_h2_clean) == 0:
+        # Needs ≥3 complete H1 rows and complete H2 rows
+        if sku not in train_jobs or sku not in test_jobs:
             skipped += 1
             continue
 
-        # Prepare data - use ORIGINAL values (not winsorized)
-        X_train = sku_h1_clean[V3_1_FEATURES].values
-        y_train = sku_h1_clean['weekly_quantity'].values  # Original, not winsorized!
-
-        X_test = sku_h2_clean[V3_1_FEATURES].values
-        y_test = sku_h2_clean['weekly_quantity'].values
+        # ORIGINAL values (not winsorized) for training and evaluation
+        X_train, y_train, weight = train_jobs[sku]
+        X_test, y_test, _ = test_jobs[sku]
 
         try:
-            predictions, model = train_v3_1_model(X_train, y_train, X_test, pattern)
+            predictions, model = train_v3_1_model(X_train.to_numpy(), y_train, X_test.to_numpy(), pattern,
+                                                  sample_weight=weight)
 
-            for i, (_, row) in enumerate(sku_h2_clean.iterrows()):
+            for i, row in enumerate(h2_rows[sku]):
                 sku_results.append({
                     'sku': sku,
-                    'year_week': row['year_week'],
-                    'actual': row['weekly_quantity'],
+                    'year_week': h2_cols['year_week'][row],
+                    'actual': h2_cols['weekly_quantity'][row],
                     'predicted': predictions[i],
                     'pattern': pattern,
-                    'is_w47': row['is_w47']
+                    'is_w47': h2_cols['is_w47'][row]
                 })
 
             trained_by_pattern[pattern] += 1
@@ -255,20 +288,24 @@ def main():
             continue
 
         # Store H1 actuals
-        for _, row in sku_h1.iterrows():
+        for row in h1_rows[sku]:
             sku_h1_actuals.append({
                 'sku': sku,
-                'year_week': row['year_week'],
-                'actual': row['weekly_quantity']
+                'year_week': h1_cols['year_week'][row],
+                'actual': h1_cols['weekly_quantity'][row]
             })
+        checkpoint.add('sku', sku, {'predictions': sku_results[results_start:],
+                                    'h1_actuals': sku_h1_actuals[h1_start:], 'model': model})
+    checkpoint.flush()
 
     total_trained = sum(trained_by_pattern.values())
     log(f"  ✓ Trained: {total_trained} (stable: {trained_by_pattern['stable']}, volatile: {trained_by_pattern['volatile']}, sparse: {trained_by_pattern['sparse']})")
     log(f"  ✓ Skipped: {skipped}")
+    log(f"  ✓ {checkpoint.summary()}")
 
     # Calculate metrics
-    if sku_results:
-        sku_df = pd.DataFrame(sku_results)
+    if sku_results or len(sparse_df):
+        sku_df = pd.concat([pd.DataFrame(sku_results), sparse_df], ignore_index=True)
         sku_df['abs_error'] = np.abs(sku_df['predicted'] - sku_df['actual'])
 
         # Overall WMAPE
@@ -11,6 +11,8 @@ but add only minimal, targeted improvements:
 V2 WMAPE: 57.2% - this is our baseline to beat
 
 Run: python3 scripts/TRAIN_V3_2_MODELS.py
+     (--completeness-weights to down-weight partial weeks in training,
+      --resume to skip the SKUs checkpointed by the last run)
 """
 
 import pandas as pd
@@ -18,15 +20,22 @@ import numpy as np
 from sklearn.ensemble import GradientBoostingRegressor
 from pathlib import Path
 from datetime import datetime
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+from checkpoint import Checkpoint
+from completeness import sample_weights, week_scores_from_argv
+from feature_cache import FeatureCache
+from schema import Schema, at_or_before
+
 # Configuration
 SCRIPT_DIR = Path(__file__).parent.resolve()
 BASE_PATH = SCRIPT_DIR.parent
 FEATURES_DIR = BASE_PATH / 'features_v2'
 OUTPUT_DIR = BASE_PATH / 'model_evaluation'
 LOG_FILE = BASE_PATH / 'v3_2_training_log.txt'
+CHECKPOINT_DIR = BASE_PATH / 'checkpoints' / 'v3_2'
 
 H1_END = '2025-W26'
 
@@ -43,7 +52,7 @@ def log(msg):
 def calculate_wmape(actual, predicted):
     return 100 * np.sum(np.abs(actual - predicted)) / np.sum(actual) if np.sum(actual) > 0 else 999
 
-def train_standard_model(X_train, y_train, X_test):
+def train_standard_model(X_train, y_train, X_test, sample_weight=None):
     """Standard XGBoost model - same as V2"""
     model = GradientBoostingRegressor(
         n_estimators=100,
@@ -53,7 +62,7 @@ def train_standard_model(X_train, y_train, X_test):
         min_samples_leaf=2,
         random_state=42
     )
-    model.fit(X_train, y_train)
+    model.fit(X_train, y_train, sample_weight=sample_weight)
     predictions = model.predict(X_test)
     return np.clip(predictions, 0, None), model
 
@@ -100,7 +109,9 @@ def main():
 
     # Load data
     log("\n[1/5] Loading data...")
-    weekly = pd.read_csv(FEATURES_DIR / 'v2_features_weekly.csv')
+    cache = FeatureCache(FEATURES_DIR / 'cache', refresh='--no-feature-cache' in sys.argv)
+    week_scores = week_scores_from_argv(FEATURES_DIR)
+    weekly = cache.read_csv(FEATURES_DIR / 'v2_features_weekly.csv', schema=Schema.load(FEATURES_DIR))
     log(f"  ✓ Loaded {len(weekly)} rows, {weekly['sku'].nunique()} SKUs")
 
     # Extract week number for W47 identification
@@ -109,7 +120,7 @@ def main():
     weekly['is_holiday_season'] = (weekly['week_num'] >= 45).astype(int)
 
     # H1/H2 split
-    weekly['is_h1'] = weekly['year_week'] <= H1_END
+    weekly['is_h1'] = at_or_before(weekly['year_week'], H1_END)
     h1_data = weekly[weekly['is_h1']]
     h2_data = weekly[~weekly['is_h1']]
 
@@ -129,6 +140,10 @@ def main():
     # Train models
     log("\n[3/5] Training SKU-level V3.2 models...")
 
+    # Completed SKUs are checkpointed; --resume skips those of the last run
+    checkpoint = Checkpoint(CHECKPOINT_DIR, resume='--resume' in sys.argv)
+    done = checkpoint.done('sku')
+
     sku_results = []
     sku_h1_actuals = []
     trained = 0
@@ -136,6 +151,15 @@ def main():
     w47_adjustments_applied = 0
 
     for sku in eligible_skus:
+        if sku in done:
+            sku_results.extend(done[sku]['predictions'])
+            sku_h1_actuals.extend(done[sku]['h1_actuals'])
+            w47_adjustments_applied += sum(r['is_w47'] == 1 and r['w47_factor'] != 1.0
+                                           for r in done[sku]['predictions'])
+            trained += 1
+            continue
+        results_start, h1_start = len(sku_results), len(sku_h1_actuals)
+
         sku_h1 = h1_data[h1_data['sku'] == sku].copy()
         sku_h2 = h2_data[h2_data['sku'] == sku].copy()
 
@@ -163,7 +187,8 @@ def main():
 
         try:
             # Train standard model (same as V2)
-            predictions, model = train_standard_model(X_train, y_train, X_test)
+            predictions, model = train_standard_model(X_train, y_train, X_test,
+                                                      sample_weight=sample_weights(sku_h1_clean, week_scores))
 
             # Calculate W47 adjustment factor
             w47_factor = get_w47_adjustment(sku_h1)
@@ -199,8 +224,12 @@ def main():
                 'actual': row['weekly_quantity'],
                 'description': row.get('description', '')
             })
+        checkpoint.add('sku', sku, {'predictions': sku_results[results_start:],
+                                    'h1_actuals': sku_h1_actuals[h1_start:], 'model': model})
+    checkpoint.flush()
 
     log(f"  ✓ Trained: {trained}")
+    log(f"  ✓ {checkpoint.summary()}")
     log(f"  ✓ Skipped: {skipped}")
     log(f"  ✓ W47 adjustments applied: {w47_adjustments_applied}")
 
@@ -11,6 +11,7 @@ This script replicates that approach and adds:
 3. Week number as feature (already in original)
 
 Run: python3 scripts/TRAIN_V3_3_GLOBAL.py
+     (--completeness-weights to down-weight partial weeks in training)
 """
 
 import pandas as pd
@@ -18,9 +19,14 @@ import numpy as np
 from sklearn.ensemble import GradientBoostingRegressor
 from pathlib import Path
 from datetime import datetime
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+from completeness import sample_weights, week_scores_from_argv
+from feature_cache import FeatureCache
+from schema import Schema
+
 # Configuration
 SCRIPT_DIR = Path(__file__).parent.resolve()
 BASE_PATH = SCRIPT_DIR.parent
@@ -51,7 +57,9 @@ def main():
 
     # Load data
     log("\n[1/5] Loading data...")
-    weekly = pd.read_csv(FEATURES_DIR / 'v2_features_weekly.csv')
+    cache = FeatureCache(FEATURES_DIR / 'cache', refresh='--no-feature-cache' in sys.argv)
+    week_scores = week_scores_from_argv(FEATURES_DIR)
+    weekly = cache.read_csv(FEATURES_DIR / 'v2_features_weekly.csv', schema=Schema.load(FEATURES_DIR))
     log(f"  ✓ Loaded {len(weekly)} rows, {weekly['sku'].nunique()} SKUs")
 
     # Extract week number
@@ -94,7 +102,7 @@ def main():
         max_depth=5,
         random_state=42
     )
-    model.fit(X_train, y_train)
+    model.fit(X_train, y_train, sample_weight=sample_weights(train_valid, week_scores))
     log("  ✓ Model trained on ALL SKUs combined")
 
     # Feature importance
@@ -11,12 +11,16 @@ Solution: HYBRID approach
 2. Use SKU-level features (lags, rolling avg)
 3. Fall back to global model for sparse categories
 
+Category models are fitted in parallel (group_training.py).
+
 This gives us:
 - Category-specific patterns (seasonality, price sensitivity)
 - SKU-level historical features
 - Sufficient training data
 
 Run: python3 scripts/TRAIN_V3_HYBRID.py
+     (--completeness-weights to down-weight partial weeks in training,
+      --resume to reuse the category models checkpointed by the last run)
 """
 
 import pandas as pd
@@ -24,14 +28,22 @@ import numpy as np
 from sklearn.ensemble import GradientBoostingRegressor
 from pathlib import Path
 from datetime import datetime
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+from checkpoint import Checkpoint
+from completeness import sample_weights, week_scores_from_argv
+from feature_cache import FeatureCache
+from group_training import train_per_group
+from schema import Schema
+
 SCRIPT_DIR = Path(__file__).parent.resolve()
 BASE_PATH = SCRIPT_DIR.parent
 FEATURES_DIR = BASE_PATH / 'features_v2'
 OUTPUT_DIR = BASE_PATH / 'model_evaluation'
 LOG_FILE = BASE_PATH / 'v3_hybrid_training_log.txt'
+CHECKPOINT_DIR = BASE_PATH / 'checkpoints' / 'v3_hybrid'
 
 def log(msg):
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -43,6 +55,12 @@ def log(msg):
 def calculate_wmape(actual, predicted):
     return 100 * np.sum(np.abs(actual - predicted)) / np.sum(actual) if np.sum(actual) > 0 else 999
 
+def train_model(X_train, y_train, sample_weight=None):
+    """Category / global GBR (module level: fitted in worker processes)"""
+    model = GradientBoostingRegressor(n_estimators=100, max_depth=5, random_state=42)
+    model.fit(X_train, y_train, sample_weight=sample_weight)
+    return model
+
 def main():
     log("=" * 60)
     log("V3 HYBRID MODEL - Per-Category + SKU Features")
@@ -50,12 +68,16 @@ def main():
 
     # Load data
     log("\n[1/5] Loading data...")
-    weekly = pd.read_csv(FEATURES_DIR / 'v2_features_weekly.csv')
-    products = pd.read_csv(FEATURES_DIR / 'v2_dim_products.csv')
+    cache = FeatureCache(FEATURES_DIR / 'cache', refresh='--no-feature-cache' in sys.argv)
+    week_scores = week_scores_from_argv(FEATURES_DIR)
+    schema = Schema.load(FEATURES_DIR)
+    weekly = cache.read_csv(FEATURES_DIR / 'v2_features_weekly.csv', schema=schema)
+    products = schema.read_csv(FEATURES_DIR / 'v2_dim_products.csv').drop_duplicates('sku', keep='last')
 
-    # Add category to weekly data
-    sku_cat = products[['sku', 'category_l1']].drop_duplicates().set_index('sku')['category_l1'].to_dict()
-    weekly['category'] = weekly['sku'].map(sku_cat).fillna('Unknown')
+    # Add category to weekly data (joined on the shared SKU codes)
+    sku_cat = products[['sku', 'category_l1']].rename(columns={'category_l1': 'category'})
+    weekly = schema.merge(weekly.drop(columns=['category'], errors='ignore'), sku_cat, on='sku', how='left')
+    weekly = schema.fillna(weekly, 'category', 'Unknown')
 
     # Extract week number
     weekly['week_num'] = weekly['year_week'].str.extract(r'W(\d+)').astype(int)
@@ -80,67 +102,36 @@ def main():
     X_train_global = train_valid[feature_cols].fillna(0)
     y_train_global = train_valid['weekly_quantity']
 
-    global_model = GradientBoostingRegressor(n_estimators=100, max_depth=5, random_state=42)
-    global_model.fit(X_train_global, y_train_global)
+    global_model = train_model(X_train_global, y_train_global, sample_weights(train_valid, week_scores))
     log("  ✓ Global model trained")
 
-    # Train per-category models
+    # Train per-category models (categories under 50 rows use the global model)
     log("\n[3/5] Training per-CATEGORY models...")
-    category_models = {}
-    category_stats = []
-
+    # Category models are checkpointed; --resume skips those of the last run
+    checkpoint = Checkpoint(CHECKPOINT_DIR, resume='--resume' in sys.argv)
+    rows, category_models = train_per_group(
+        train, test, 'category', feature_cols, 'weekly_quantity', train_model,
+        min_rows=50, fallback=global_model,
+        weights=lambda frame: sample_weights(frame, week_scores), checkpoint=checkpoint)
+    log(f"  ✓ {checkpoint.summary()}")
+
+    train_rows = train_valid.groupby('category').size()
     for cat in weekly['category'].unique():
-        cat_train = train[train['category'] == cat].dropna(subset=feature_cols)
-
-        if len(cat_train) < 50:  # Not enough data, use global
-            log(f"  ⚠ {cat}: Only {len(cat_train)} rows - using GLOBAL model")
-            category_models[cat] = None  # Will use global fallback
-            category_stats.append({'category': cat, 'model': 'global', 'train_rows': len(cat_train)})
-            continue
-
-        X_train = cat_train[feature_cols].fillna(0)
-        y_train = cat_train['weekly_quantity']
-
-        model = GradientBoostingRegressor(n_estimators=100, max_depth=5, random_state=42)
-        model.fit(X_train, y_train)
-        category_models[cat] = model
-
-        log(f"  ✓ {cat}: Trained on {len(cat_train)} rows")
-        category_stats.append({'category': cat, 'model': 'category', 'train_rows': len(cat_train)})
+        if cat in category_models:
+            log(f"  ✓ {cat}: Trained on {train_rows.get(cat, 0)} rows")
+        else:
+            log(f"  ⚠ {cat}: Only {train_rows.get(cat, 0)} rows - using GLOBAL model")
 
     # Predict
     log("\n[4/5] Predicting for H2...")
-    predictions = []
-
-    for cat in test['category'].unique():
-        cat_test = test[test['category'] == cat].dropna(subset=feature_cols)
-
-        if len(cat_test) == 0:
-            continue
-
-        X_test = cat_test[feature_cols].fillna(0)
-
-        # Use category model if available, else global
-        if cat in category_models and category_models[cat] is not None:
-            model = category_models[cat]
-            model_type = 'category'
-        else:
-            model = global_model
-            model_type = 'global'
-
-        preds = np.clip(model.predict(X_test), 0, None)
-
-        for i, (_, row) in enumerate(cat_test.iterrows()):
-            predictions.append({
-                'sku': row['sku'],
-                'category': cat,
-                'year_week': row['year_week'],
-                'actual': row['weekly_quantity'],
-                'predicted': preds[i],
-                'model_type': model_type
-            })
-
-    results_df = pd.DataFrame(predictions)
+    results_df = pd.DataFrame({
+        'sku': rows['sku'].to_numpy(),
+        'category': rows['category'].to_numpy(),
+        'year_week': rows['year_week'].to_numpy(),
+        'actual': rows['weekly_quantity'].to_numpy(),
+        'predicted': np.clip(rows['predicted'].to_numpy(), 0, None),
+        'model_type': rows['model_type'].map({'group': 'category', 'fallback': 'global'}).to_numpy()
+    })
     log(f"  ✓ Generated {len(results_df)} predictions")
 
     # Calculate metrics
@@ -5,6 +5,9 @@ V3 Model Training - Killer Version
 Implements all V3 strategies for improved WMAPE.
 
 Run: python3 scripts/TRAIN_V3_MODELS.py
+     (--no-feature-cache to rebuild the cached V3 feature frame,
+      --completeness-weights to down-weight partial weeks in training,
+      --resume to skip the SKUs checkpointed by the last run)
 """
 
 import pandas as pd
@@ -12,9 +15,18 @@ import numpy as np
 from sklearn.ensemble import GradientBoostingRegressor
 from pathlib import Path
 from datetime import datetime
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+from checkpoint import Checkpoint
+from completeness import sample_weights, week_scores_from_argv
+from feature_cache import FeatureCache
+from feature_graph import FeatureGraph
+from group_training import group_jobs
+from robust_stats import flag_outliers, winsorize
+from schema import DICTIONARY_FILE, Schema, at_or_before
+
 # Try to import LightGBM (optional but recommended)
 try:
     from lightgbm import LGBMRegressor
@@ -29,6 +41,7 @@ BASE_PATH = SCRIPT_DIR.parent
 FEATURES_DIR = BASE_PATH / 'features_v2'
 OUTPUT_DIR = BASE_PATH / 'model_evaluation'
 LOG_FILE = BASE_PATH / 'v3_training_log.txt'
+CHECKPOINT_DIR = BASE_PATH / 'checkpoints' / 'v3'
 
 H1_END = '2025-W26'
 
@@ -48,104 +61,78 @@ def calculate_wmape(actual, predicted):
 def detect_outliers(df, group_col, value_col, method='iqr', threshold=1.5):
     """Mark outliers within each group"""
     df = df.copy()
-    df['is_outlier'] = False
-    
-    for group in df[group_col].unique():
-        mask = df[group_col] == group
-        values = df.loc[mask, value_col]
-        
-        if len(values) < 5:
-            continue
-            
-        if method == 'iqr':
-            Q1, Q3 = values.quantile([0.25, 0.75])
-            IQR = Q3 - Q1
-            lower = Q1 - threshold * IQR
-            upper = Q3 + threshold * IQR
-            outlier_mask = (values < lower) | (values > upper)
-        else:  # z-score
-            z = (values - values.mean()) / values.std()
-            outlier_mask = abs(z) > threshold
-            
-        df.loc[mask, 'is_outlier'] = outlier_mask.values
-    
+    df['is_outlier'] = flag_outliers(df, group_col, value_col, method=method, threshold=threshold)
     return df
 
 def winsorize_outliers(df, group_col, value_col, lower_pct=0.05, upper_pct=0.95):
     """Cap outliers at percentile bounds"""
     df = df.copy()
-    df[f'{value_col}_winsorized'] = df[value_col]
-    
-    for group in df[group_col].unique():
-        mask = df[group_col] == group
-        values = df.loc[mask, value_col]
-        
-        lower = values.quantile(lower_pct)
-        upper = values.quantile(upper_pct)
-        
-        df.loc[mask, f'{value_col}_winsorized'] = values.clip(lower, upper)
-    
+    df[f'{value_col}_winsorized'] = winsorize(df, group_col, value_col, lower_pct, upper_pct)
     return df
 
 # ============================================
 # STRATEGY 2: ENHANCED FEATURES
 # ============================================
-def add_v3_features(df):
-    """Add all V3 features to the dataframe"""
-    df = df.copy()
-    df = df.sort_values(['sku', 'year_week'])
-    
-    # Extract week number for seasonality
-    df['week_num'] = df['year_week'].str.extract(r'W(\d+)').astype(int)
-    
-    # Seasonality features
-    df['is_w47'] = (df['week_num'] == 47).astype(int)
-    df['is_holiday_season'] = (df['week_num'] >= 47).astype(int)
-    df['is_month_start'] = (df['week_num'] % 4 == 1).astype(int)
-    df['is_month_end'] = (df['week_num'] % 4 == 0).astype(int)
-    
-    # Cyclical encoding of week
-    df['week_sin'] = np.sin(2 * np.pi * df['week_num'] / 52)
-    df['week_cos'] = np.cos(2 * np.pi * df['week_num'] / 52)
-    
-    # Group operations per SKU
-    for lag in [1, 2, 3, 4, 8, 12]:
-        df[f'lag{lag}'] = df.groupby('sku')['weekly_quantity'].shift(lag)
-    
-    # Rolling statistics (multiple windows)
-    for window in [4, 8, 12]:
-        df[f'rolling_mean_{window}w'] = df.groupby('sku')['weekly_quantity'].transform(
-            lambda x: x.shift(1).rolling(window, min_periods=1).mean()
-        )
-        df[f'rolling_std_{window}w'] = df.groupby('sku')['weekly_quantity'].transform(
-            lambda x: x.shift(1).rolling(window, min_periods=1).std()
-        )
-    
-    # Rolling min/max
-    df['rolling_min_4w'] = df.groupby('sku')['weekly_quantity'].transform(
-        lambda x: x.shift(1).rolling(4, min_periods=1).min()
-    )
-    df['rolling_max_4w'] = df.groupby('sku')['weekly_quantity'].transform(
-        lambda x: x.shift(1).rolling(4, min_periods=1).max()
-    )
-    
-    # Trend features
-    df['trend_4w'] = (df['lag1'] - df['lag4']) / df['lag4'].replace(0, np.nan)
-    df['momentum'] = df['lag1'] - df['lag2']
-    
-    # Volatility
-    df['cv_4w'] = df['rolling_std_4w'] / df['rolling_mean_4w'].replace(0, np.nan)
-    df['range_ratio'] = (df['rolling_max_4w'] - df['rolling_min_4w']) / df['rolling_mean_4w'].replace(0, np.nan)
-    
-    # Fill NaN values
-    df = df.fillna(0)
-    
-    return df
+# V3 feature definitions; a model computes only the subgraph it requests
+V3_GRAPH = FeatureGraph(sort_by=['sku', 'year_week'])
+
+# Extract week number for seasonality
+V3_GRAPH.add('week_num', ['year_week'], lambda df: df['year_week'].str.extract(r'W(\d+)')[0].astype(int))
+
+# Seasonality features
+V3_GRAPH.add('is_w47', ['week_num'], lambda df: (df['week_num'] == 47).astype(int))
+V3_GRAPH.add('is_holiday_season', ['week_num'], lambda df: (df['week_num'] >= 47).astype(int))
+V3_GRAPH.add('is_month_start', ['week_num'], lambda df: (df['week_num'] % 4 == 1).astype(int))
+V3_GRAPH.add('is_month_end', ['week_num'], lambda df: (df['week_num'] % 4 == 0).astype(int))
+
+# Cyclical encoding of week
+V3_GRAPH.add('week_sin', ['week_num'], lambda df: np.sin(2 * np.pi * df['week_num'] / 52))
+V3_GRAPH.add('week_cos', ['week_num'], lambda df: np.cos(2 * np.pi * df['week_num'] / 52))
+
+# Lags per SKU
+for lag in [1, 2, 3, 4, 8, 12]:
+    V3_GRAPH.lag(f'lag{lag}', 'weekly_quantity', lag)
+
+# Rolling statistics (multiple windows)
+for window in [4, 8, 12]:
+    V3_GRAPH.rolling(f'rolling_mean_{window}w', 'weekly_quantity', window, 'mean')
+    V3_GRAPH.rolling(f'rolling_std_{window}w', 'weekly_quantity', window, 'std')
+
+# Rolling min/max
+V3_GRAPH.rolling('rolling_min_4w', 'weekly_quantity', 4, 'min')
+V3_GRAPH.rolling('rolling_max_4w', 'weekly_quantity', 4, 'max')
+
+# Trend features
+V3_GRAPH.add('trend_4w', ['lag1', 'lag4'], lambda df: (df['lag1'] - df['lag4']) / df['lag4'].replace(0, np.nan))
+V3_GRAPH.add('momentum', ['lag1', 'lag2'], lambda df: df['lag1'] - df['lag2'])
+
+# Volatility
+V3_GRAPH.add('cv_4w', ['rolling_std_4w', 'rolling_mean_4w'],
+             lambda df: df['rolling_std_4w'] / df['rolling_mean_4w'].replace(0, np.nan))
+V3_GRAPH.add('range_ratio', ['rolling_max_4w', 'rolling_min_4w', 'rolling_mean_4w'],
+             lambda df: (df['rolling_max_4w'] - df['rolling_min_4w']) / df['rolling_mean_4w'].replace(0, np.nan))
+
+# V3 feature columns
+V3_FEATURES = [
+    'lag1', 'lag2', 'lag3', 'lag4', 'lag8', 'lag12',
+    'rolling_mean_4w', 'rolling_mean_8w', 'rolling_mean_12w',
+    'rolling_std_4w', 'rolling_std_8w',
+    'rolling_min_4w', 'rolling_max_4w',
+    'trend_4w', 'momentum',
+    'cv_4w', 'range_ratio',
+    'week_sin', 'week_cos',
+    'is_w47', 'is_holiday_season',
+    'is_outlier'
+]
+
+def add_v3_features(df, features=None):
+    """Add V3 features: the requested ones (default: all), NaN filled with 0"""
+    return V3_GRAPH.compute(df, features or V3_GRAPH.public())
 
 # ============================================
 # STRATEGY 3: MODEL TRAINING
 # ============================================
-def train_v3_model(X_train, y_train, X_test, use_lgbm=True):
+def train_v3_model(X_train, y_train, X_test, use_lgbm=True, sample_weight=None):
     """Train V3 model (XGBoost or LightGBM)"""
     
     if HAS_LGBM and use_lgbm:
@@ -171,7 +158,7 @@ def train_v3_model(X_train, y_train, X_test, use_lgbm=True):
             random_state=42
         )
     
-    model.fit(X_train, y_train)
+    model.fit(X_train, y_train, sample_weight=sample_weight)
     predictions = model.predict(X_test)
     
     return np.clip(predictions, 0, None), model
@@ -179,6 +166,17 @@ def train_v3_model(X_train, y_train, X_test, use_lgbm=True):
 # ============================================
 # MAIN TRAINING PIPELINE
 # ============================================
+def materialise_weekly(cache, schema=None):
+    """V3 featured weekly frame through the feature cache (shared with TRAIN_ALL_VERSIONS.py)"""
+    weekly_path = FEATURES_DIR / 'v2_features_weekly.csv'
+    schema = schema or Schema.load(FEATURES_DIR)
+    inputs = [weekly_path, FEATURES_DIR / DICTIONARY_FILE]
+    return cache.materialise('v3_weekly', inputs, load=lambda: schema.read_csv(weekly_path), groups=[
+        ('outliers', lambda df: detect_outliers(df, 'sku', 'weekly_quantity', method='iqr', threshold=2.0)),
+        ('winsorized', lambda df: winsorize_outliers(df, 'sku', 'weekly_quantity')),
+        ('v3', lambda df: add_v3_features(df, V3_FEATURES))
+    ])
+
 def main():
     log("=" * 60)
     log("V3 MODEL TRAINING - KILLER VERSION")
@@ -186,27 +184,28 @@ def main():
     
     # Load data
     log("\n[1/6] Loading data...")
-    weekly = pd.read_csv(FEATURES_DIR / 'v2_features_weekly.csv')
+    # Strategies 1-2 (outliers, winsorization, V3 features) are cached per group
+    cache = FeatureCache(FEATURES_DIR / 'cache', refresh='--no-feature-cache' in sys.argv)
+    week_scores = week_scores_from_argv(FEATURES_DIR)
+    weekly = materialise_weekly(cache)
     log(f"  ✓ Loaded {len(weekly)} rows, {weekly['sku'].nunique()} SKUs")
+    log(f"  ✓ {cache.summary()}")
     
     # Strategy 1: Outlier detection
     log("\n[2/6] Detecting outliers...")
-    weekly = detect_outliers(weekly, 'sku', 'weekly_quantity', method='iqr', threshold=2.0)
-    weekly = winsorize_outliers(weekly, 'sku', 'weekly_quantity')
     outlier_count = weekly['is_outlier'].sum()
     log(f"  ✓ Found {outlier_count} outlier weeks ({100*outlier_count/len(weekly):.1f}%)")
     log(f"  ✓ Applied winsorization to cap extreme values")
     
     # Strategy 2: Add V3 features
     log("\n[3/6] Adding V3 features...")
-    weekly = add_v3_features(weekly)
     log(f"  ✓ Added seasonality features (W47, holidays, cyclical encoding)")
     log(f"  ✓ Added extended lag features (1,2,3,4,8,12 weeks)")
     log(f"  ✓ Added rolling statistics (4w, 8w, 12w windows)")
     log(f"  ✓ Added trend and volatility features")
     
     # Define H1/H2 split
-    weekly['is_h1'] = weekly['year_week'] <= H1_END
+    weekly['is_h1'] = at_or_before(weekly['year_week'], H1_END)
     h1_data = weekly[weekly['is_h1']]
     h2_data = weekly[~weekly['is_h1']]
     
@@ -214,17 +213,7 @@ def main():
     log(f"  ✓ H2 validation: {len(h2_data)} rows")
     
     # V3 feature columns
-    v3_feature_cols = [
-        'lag1', 'lag2', 'lag3', 'lag4', 'lag8', 'lag12',
-        'rolling_mean_4w', 'rolling_mean_8w', 'rolling_mean_12w',
-        'rolling_std_4w', 'rolling_std_8w',
-        'rolling_min_4w', 'rolling_max_4w',
-        'trend_4w', 'momentum',
-        'cv_4w', 'range_ratio',
-        'week_sin', 'week_cos',
-        'is_w47', 'is_holiday_season',
-        'is_outlier'
-    ]
+    v3_feature_cols = V3_FEATURES
     
     # Train SKU models
     log("\n[4/6] Training SKU-level V3 models...")
@@ -234,48 +223,63 @@ def main():
     eligible_skus = h1_weeks_per_sku[h1_weeks_per_sku >= 4].index.tolist()
     log(f"  ✓ Eligible SKUs (≥4 H1 weeks): {len(eligible_skus)}")
     
+    # Completed SKUs are checkpointed; --resume skips those of the last run
+    checkpoint = Checkpoint(CHECKPOINT_DIR, resume='--resume' in sys.argv)
+    done = checkpoint.done('sku')
+
+    # Each SKU's complete H1 / H2 rows are slices of one matrix per period
+    # (float64, as the models were fitted on) instead of a frame copy per SKU
+    h1_clean = h1_data.dropna(subset=v3_feature_cols)
+    h2_clean = h2_data.dropna(subset=v3_feature_cols)
+    train_jobs = {sku: job for sku, *job in group_jobs(
+        h1_clean, 'sku', v3_feature_cols, 'weekly_quantity_winsorized', 3,
+        lambda frame: sample_weights(frame, week_scores), dtype=np.float64)}
+    test_jobs = {sku: job for sku, *job in group_jobs(
+        h2_clean, 'sku', v3_feature_cols, 'weekly_quantity', 1, dtype=np.float64)}
+    h1_rows = h1_data.groupby('sku', sort=False, observed=True).indices
+    h1_clean_rows = h1_clean.groupby('sku', sort=False, observed=True).indices
+    h2_rows = h2_clean.groupby('sku', sort=False, observed=True).indices
+    h1_cols = {col: h1_data[col].to_numpy() for col in ['year_week', 'weekly_quantity']}
+    h1_cols['description'] = (h1_data['description'].to_numpy() if 'description' in h1_data.columns
+                              else np.full(len(h1_data), '', dtype=object))
+    h2_cols = {col: h2_clean[col].to_numpy() for col in ['year_week', 'weekly_quantity', 'is_w47']}
+    h1_outlier = h1_clean['is_outlier'].to_numpy()
+
     sku_results = []
     sku_h1_actuals = []
     trained = 0
     skipped = 0
     
     for sku in eligible_skus:
-        sku_h1 = h1_data[h1_data['sku'] == sku].copy()
-        sku_h2 = h2_data[h2_data['sku'] == sku].copy()
-        
-        if len(sku_h2) == 0:
-            skipped += 1
-            continue
-        
-        # Prepare training data (use winsorized values for training)
-        sku_h1_clean = sku_h1.dropna(subset=v3_feature_cols)
-        if len(sku_h1_clean) < 3:
-            skipped += 1
+        if sku in done:
+            sku_results.extend(done[sku]['predictions'])
+            sku_h1_actuals.extend(done[sku]['h1_actuals'])
+            trained += 1
             continue
-        
-        X_train = sku_h1_clean[v3_feature_cols].values
-        y_train = sku_h1_clean['weekly_quantity_winsorized'].values
-        
-        # Prepare test data
-        sku_h2_clean = sku_h2.dropna(subset=v3_feature_cols)
-        if len(sku_h2_clean) == 0:
+        results_start, h1_start = len(sku_results), len(sku_h1_actuals)
+
+        # Needs ≥3 complete H1 rows (winsorized target for training) and complete H2 rows
+        if sku not in train_jobs or sku not in test_jobs:
             skipped += 1
             continue
         
-        X_test = sku_h2_clean[v3_feature_cols].values
-        y_test = sku_h2_clean['weekly_quantity'].values  # Use original for evaluation
+        X_train, y_train, weight = train_jobs[sku]
+        X_test, y_test, _ = test_jobs[sku]  # Original values for evaluation
         
         try:
-            predictions, _ = train_v3_model(X_train, y_train, X_test, use_lgbm=HAS_LGBM)
+            predictions, model = train_v3_model(X_train.to_numpy(), y_train, X_test.to_numpy(),
+                                                use_lgbm=HAS_LGBM, sample_weight=weight)
             
-            for i, (_, row) in enumerate(sku_h2_clean.iterrows()):
+            pos = h2_rows[sku]
+            was_outlier = h1_outlier[h1_clean_rows[sku]].any()
+            for i, row in enumerate(pos):
                 sku_results.append({
                     'sku': sku,
-                    'year_week': row['year_week'],
-                    'actual': row['weekly_quantity'],
+                    'year_week': h2_cols['year_week'][row],
+                    'actual': h2_cols['weekly_quantity'][row],
                     'predicted': predictions[i],
-                    'is_w47': row['is_w47'],
-                    'was_outlier_train': sku_h1_clean['is_outlier'].any()
+                    'is_w47': h2_cols['is_w47'][row],
+                    'was_outlier_train': was_outlier
                 })
             
             trained += 1
@@ -284,15 +288,19 @@ def main():
             continue
         
         # H1 actuals
-        for _, row in sku_h1.iterrows():
+        for row in h1_rows[sku]:
             sku_h1_actuals.append({
                 'sku': sku,
-                'year_week': row['year_week'],
-                'actual': row['weekly_quantity'],
-                'description': row.get('description', '')
+                'year_week': h1_cols['year_week'][row],
+                'actual': h1_cols['weekly_quantity'][row],
+                'description': h1_cols['description'][row]
             })
+        checkpoint.add('sku', sku, {'predictions': sku_results[results_start:],
+                                    'h1_actuals': sku_h1_actuals[h1_start:], 'model': model})
+    checkpoint.flush()
     
     log(f"  ✓ Trained: {trained}")
+    log(f"  ✓ {checkpoint.summary()}")
     log(f"  ✓ Skipped: {skipped}")
     
     # Save results
@@ -15,29 +15,84 @@ Features:
 - Rolling statistics (mean, std, min, max)
 - Seasonality (week number, W47 flag)
 
+Per-SKU, category and customer models are fitted in parallel (group_training.py).
+
 Output: Predictions for H2 (W27-W52) with confidence scores
 
 Run: python3 scripts/TRAIN_V4_MODELS.py
+     (--no-feature-cache to rebuild the cached V4 feature frame,
+      --completeness-weights to down-weight partial weeks in training,
+      --incremental to add trees for new training weeks to the models kept in
+      model_state/v4 instead of refitting them, see warm_start.py,
+      --resume to reuse the per-entity models checkpointed by the last run,
+      --float32-bundles to store the model bundles' thresholds / leaves as float32,
+      --tuned-params to train with the hyperparameters in v4_tuned_params.json,
+      --early-stopping to pick each SKU / category / customer model's tree count
+      on its latest H1 weeks, see early_stopping.py,
+      --time-budget[=MINUTES] to train the SKU and customer models in order of
+      H1 revenue / volume within a wall-clock budget (default
+      TIME_BUDGET_MINUTES): full models for the head, lighter ones for the
+      middle, the global model for the tail and whatever the budget does not
+      reach, see scheduler.py; not with --incremental)
+
+The fitted SKU, category and customer models (with their global fallbacks) are
+saved as one model bundle per level, see model_bundle.py.
 """
 
 import pandas as pd
 import numpy as np
+from functools import partial
 from sklearn.ensemble import GradientBoostingRegressor
 from pathlib import Path
 from datetime import datetime
+import sys
 import warnings
 import json
 warnings.filterwarnings('ignore')
 
+from checkpoint import Checkpoint
+from completeness import sample_weights, week_scores_from_argv
+from early_stopping import fit_early_stopped, tree_summary
+from feature_cache import FeatureCache
+from feature_graph import FeatureGraph, clip_finite
+from group_training import feature_frame, feature_matrix, train_per_group
+from model_bundle import FALLBACK_KEY, write_bundle
+from price_store import PriceStore
+from scheduler import TrainingScheduler, budget_minutes
+from schema import DICTIONARY_FILE, Schema
+from warm_start import ModelStore
+
 # Configuration
 SCRIPT_DIR = Path(__file__).parent.resolve()
 BASE_PATH = SCRIPT_DIR.parent
 FEATURES_DIR = BASE_PATH / 'features_v2'
 OUTPUT_DIR = BASE_PATH / 'model_evaluation'
 LOG_FILE = BASE_PATH / 'v4_training_log.txt'
+MODEL_STATE_DIR = BASE_PATH / 'model_state' / 'v4'
+CHECKPOINT_DIR = BASE_PATH / 'checkpoints' / 'v4'
 
 H1_END_WEEK = 26
 
+# Per-entity model hyperparameters (--tuned-params: overrides from TUNE_V4_HYPERPARAMETERS.py)
+GBR_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': 5,
+    'learning_rate': 0.1,
+    'min_samples_split': 5,
+    'min_samples_leaf': 2,
+    'random_state': 42,
+}
+TUNED_PARAMS_FILE = 'v4_tuned_params.json'
+
+# --time-budget: wall-clock budget for the per-SKU / customer models, and the
+# model tiers by cumulative H1 revenue share (GBR_PARAMS overrides; the rest
+# of the SKUs / customers use the global model)
+TIME_BUDGET_MINUTES = 60
+SCHEDULE_TIERS = [
+    ('full', 0.80, {}),
+    ('light', 0.95, {'n_estimators': 30, 'max_depth': 3}),
+]
+
 def log(msg):
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     line = f"[{timestamp}] {msg}"
@@ -59,63 +114,119 @@ def get_confidence(wmape, h1_weeks):
     else:
         return 'Low'
 
-def add_v4_features(df):
-    """Add V4 enhanced features including price changes"""
-    df = df.copy()
-    df = df.sort_values(['sku', 'year_week'])
-
-    # Extract week number
-    df['week_num'] = df['year_week'].str.extract(r'W(\d+)').astype(int)
-
-    # Seasonality features
-    df['is_w47'] = (df['week_num'] == 47).astype(int)
-    df['is_holiday_season'] = ((df['week_num'] >= 45) | (df['week_num'] <= 2)).astype(int)
-    df['week_sin'] = np.sin(2 * np.pi * df['week_num'] / 52)
-    df['week_cos'] = np.cos(2 * np.pi * df['week_num'] / 52)
-
-    # Price change features
-    if 'avg_unit_price' in df.columns:
-        df['price_lag1'] = df.groupby('sku')['avg_unit_price'].shift(1)
-        df['price_change'] = df['avg_unit_price'] - df['price_lag1']
-        df['price_change_pct'] = df['price_change'] / df['price_lag1'].replace(0, np.nan) * 100
-        df['price_trend_4w'] = df.groupby('sku')['avg_unit_price'].transform(
-            lambda x: x.rolling(4, min_periods=1).mean()
-        ) - df['avg_unit_price']
-
-    # Additional rolling features
-    df['rolling_std_4w'] = df.groupby('sku')['weekly_quantity'].transform(
-        lambda x: x.shift(1).rolling(4, min_periods=1).std()
-    )
-    df['rolling_min_4w'] = df.groupby('sku')['weekly_quantity'].transform(
-        lambda x: x.shift(1).rolling(4, min_periods=1).min()
-    )
-    df['rolling_max_4w'] = df.groupby('sku')['weekly_quantity'].transform(
-        lambda x: x.shift(1).rolling(4, min_periods=1).max()
+def _price_lag1(df, price_store=None):
+    """
+    Last known price strictly before each row's week (as-of lookup, see
+    price_store.py: unlike shift(1) it skips missing prices and repeated weeks)
+    """
+    if price_store is None:
+        price_store = PriceStore.from_frame(df, 'avg_unit_price')
+    price_col = price_store.value_cols[0]
+    return price_store.asof_join(df, cols=[price_col], strict=True)[price_col]
+
+# V4 feature definitions; a model computes only the subgraph it requests
+V4_GRAPH = FeatureGraph(sort_by=['sku', 'year_week'])
+
+# Seasonality features
+V4_GRAPH.add('week_num', ['year_week'], lambda df: df['year_week'].str.extract(r'W(\d+)')[0].astype(int))
+V4_GRAPH.add('is_w47', ['week_num'], lambda df: (df['week_num'] == 47).astype(int))
+V4_GRAPH.add('is_holiday_season', ['week_num'], lambda df: ((df['week_num'] >= 45) | (df['week_num'] <= 2)).astype(int))
+V4_GRAPH.add('week_sin', ['week_num'], lambda df: np.sin(2 * np.pi * df['week_num'] / 52))
+V4_GRAPH.add('week_cos', ['week_num'], lambda df: np.cos(2 * np.pi * df['week_num'] / 52))
+
+# Price change features (price lags come from the price store)
+V4_GRAPH.add('price_lag1', ['sku', 'year_week', 'avg_unit_price'], _price_lag1, context=['price_store'])
+V4_GRAPH.add('price_change', ['avg_unit_price', 'price_lag1'], lambda df: df['avg_unit_price'] - df['price_lag1'])
+V4_GRAPH.add('price_change_pct', ['price_change', 'price_lag1'],
+             lambda df: df['price_change'] / df['price_lag1'].replace(0, np.nan) * 100,
+             finish=clip_finite(-100, 100))
+V4_GRAPH.rolling('_price_rolling_4w', 'avg_unit_price', 4, 'mean', shift=0)
+V4_GRAPH.add('price_trend_4w', ['_price_rolling_4w', 'avg_unit_price'],
+             lambda df: df['_price_rolling_4w'] - df['avg_unit_price'])
+
+# Additional rolling features
+V4_GRAPH.rolling('rolling_std_4w', 'weekly_quantity', 4, 'std')
+V4_GRAPH.rolling('rolling_min_4w', 'weekly_quantity', 4, 'min')
+V4_GRAPH.rolling('rolling_max_4w', 'weekly_quantity', 4, 'max')
+
+# Coefficient of variation (demand volatility)
+V4_GRAPH.add('cv_4w', ['rolling_std_4w', 'rolling_avg_4w'],
+             lambda df: df['rolling_std_4w'] / df['rolling_avg_4w'].replace(0, np.nan),
+             finish=clip_finite(0, 10))
+
+# V4 Feature set
+V4_FEATURES = [
+    # Core lag features
+    'lag1_quantity', 'lag2_quantity', 'lag4_quantity', 'rolling_avg_4w',
+    # Price features
+    'avg_unit_price', 'price_change_pct', 'price_trend_4w',
+    # Rolling stats
+    'rolling_std_4w', 'rolling_min_4w', 'rolling_max_4w', 'cv_4w',
+    # Seasonality
+    'week_num', 'week_sin', 'week_cos', 'is_w47', 'is_holiday_season'
+]
+
+def add_v4_features(df, price_store=None, features=None):
+    """Add V4 enhanced features: the requested ones (default: all) that df has inputs for"""
+    features = V4_GRAPH.available(df.columns, features or V4_GRAPH.public())
+    return V4_GRAPH.compute(df, features, price_store=price_store)
+
+def load_weekly(schema):
+    """SKU × Week features with the product category attached"""
+    weekly = schema.read_csv(FEATURES_DIR / 'v2_features_weekly.csv')
+    products = schema.read_csv(FEATURES_DIR / 'v2_dim_products.csv').drop_duplicates('sku', keep='last')
+
+    # Add category (joined on the shared SKU codes)
+    sku_cat = products[['sku', 'category_l1']].rename(columns={'category_l1': 'category'})
+    weekly = schema.merge(weekly.drop(columns=['category'], errors='ignore'), sku_cat, on='sku', how='left')
+    return schema.fillna(weekly, 'category', 'Unknown')
+
+def materialise_weekly(cache, schema=None, price_store=None):
+    """
+    V4 featured weekly frame through the feature cache (shared with the tuner
+    and TRAIN_ALL_VERSIONS.py); price lags from price_store when given (part
+    of the cache key), else from a store built on the frame's prices
+    """
+    schema = schema or Schema.load(FEATURES_DIR)
+    return cache.materialise(
+        'v4_weekly',
+        [FEATURES_DIR / 'v2_features_weekly.csv', FEATURES_DIR / 'v2_dim_products.csv', FEATURES_DIR / DICTIONARY_FILE],
+        load=lambda: load_weekly(schema),
+        groups=[('v4', lambda df: add_v4_features(df, price_store, features=V4_FEATURES))]
     )
 
-    # Coefficient of variation (demand volatility)
-    df['cv_4w'] = df['rolling_std_4w'] / df['rolling_avg_4w'].replace(0, np.nan)
-
-    # Fill NaN
-    df = df.fillna(0)
-    df['price_change_pct'] = df['price_change_pct'].replace([np.inf, -np.inf], 0).clip(-100, 100)
-    df['cv_4w'] = df['cv_4w'].replace([np.inf, -np.inf], 0).clip(0, 10)
-
-    return df
-
-def train_model(X_train, y_train):
-    """Train XGBoost model"""
-    model = GradientBoostingRegressor(
-        n_estimators=100,
-        max_depth=5,
-        learning_rate=0.1,
-        min_samples_split=5,
-        min_samples_leaf=2,
-        random_state=42
-    )
-    model.fit(X_train, y_train)
+def train_model(X_train, y_train, sample_weight=None, params=None, early_stopping=False):
+    """Train XGBoost model (GBR_PARAMS, overridden by params; early_stopping: see early_stopping.py)"""
+    model = GradientBoostingRegressor(**{**GBR_PARAMS, **(params or {})})
+    if early_stopping:
+        return fit_early_stopped(model, X_train, y_train, sample_weight)
+    model.fit(X_train, y_train, sample_weight=sample_weight)
     return model
 
+def backtest_model(train, test, id_col='sku', value_col='weekly_quantity', params=None, early_stopping=False):
+    """Per-SKU models + global fallback at one backtest origin (backtest.py model signature)"""
+    features = [f for f in V4_FEATURES if f in train.columns]
+    fit = partial(train_model, params=params)
+    group_fit = partial(train_model, params=params, early_stopping=early_stopping)
+    train_sku = train[train['category'] != 'Unknown']
+    train_valid = train_sku.dropna(subset=features[:4])
+    global_model = fit(feature_frame(feature_matrix(train_valid, features), features), train_valid[value_col])
+    rows, _ = train_per_group(train_sku, test, id_col, features, value_col, group_fit, min_rows=4,
+                              fallback=global_model, required=features[:4], workers=1)
+    return pd.DataFrame({
+        id_col: rows[id_col].to_numpy(),
+        'year_week': rows['year_week'].to_numpy(),
+        'predicted': np.clip(rows['predicted'].to_numpy(), 0, None),
+        'actual': rows[value_col].to_numpy()
+    })
+
+def save_bundle(filename, models, features):
+    """Models of one level in a single lazily-loaded bundle file"""
+    n = write_bundle(OUTPUT_DIR / filename, models, float32='--float32-bundles' in sys.argv,
+                     meta={'features': list(features)})
+    size = (OUTPUT_DIR / filename).stat().st_size
+    log(f"  ✓ Saved: {filename} ({n} models, {size / 1e6:.1f} MB)")
+
 def main():
     log("=" * 70)
     log("V4 MODEL TRAINING - Comprehensive Multi-Level Forecasting")
@@ -123,35 +234,57 @@ def main():
 
     # Load data
     log("\n[1/7] Loading data...")
-    weekly = pd.read_csv(FEATURES_DIR / 'v2_features_weekly.csv')
-    products = pd.read_csv(FEATURES_DIR / 'v2_dim_products.csv')
-
-    # Add category
-    sku_cat = products[['sku', 'category_l1']].drop_duplicates().set_index('sku')['category_l1'].to_dict()
-    sku_name = products[['sku', 'name']].drop_duplicates().set_index('sku')['name'].to_dict()
-    weekly['category'] = weekly['sku'].map(sku_cat).fillna('Unknown')
+    schema = Schema.load(FEATURES_DIR)
+    products = schema.read_csv(FEATURES_DIR / 'v2_dim_products.csv').drop_duplicates('sku', keep='last')
+    sku_name = products.set_index('sku')['name'].to_dict()
+
+    week_scores = week_scores_from_argv(FEATURES_DIR)
+
+    # --tuned-params: hyperparameters chosen by TUNE_V4_HYPERPARAMETERS.py
+    tuned = None
+    if '--tuned-params' in sys.argv:
+        tuned = json.loads((OUTPUT_DIR / TUNED_PARAMS_FILE).read_text())['params']
+        log(f"  ✓ Tuned hyperparameters: {tuned}")
+    fit = partial(train_model, params=tuned)
+
+    # --early-stopping: per-entity tree counts picked on each entity's latest H1 weeks
+    early_stopping = '--early-stopping' in sys.argv
+    group_fit = partial(train_model, params=tuned, early_stopping=early_stopping)
+
+    # --time-budget[=MINUTES]: revenue-ranked, tiered SKU / customer models within the budget
+    # (the clock starts with the SKU models, not here)
+    minutes = budget_minutes(sys.argv, default=TIME_BUDGET_MINUTES)
+    scheduler = None
+    if minutes is not None:
+        if '--incremental' in sys.argv:
+            raise ValueError("--time-budget and --incremental cannot be combined: "
+                             "the scheduler refits its entity models every run")
+        tiers = [(name, share, partial(train_model, params={**(tuned or {}), **overrides},
+                                       early_stopping=early_stopping))
+                 for name, share, overrides in SCHEDULE_TIERS]
+        scheduler = TrainingScheduler(minutes * 60, tiers)
+        log(f"  ✓ Time budget: {minutes:g} min, tiers: "
+            f"{', '.join(f'{name} to {share:.0%}' for name, share, _ in SCHEDULE_TIERS)}")
+
+    # Loaded + V4 featured frame, reused while the inputs and feature code are unchanged
+    cache = FeatureCache(FEATURES_DIR / 'cache', refresh='--no-feature-cache' in sys.argv)
+    weekly = materialise_weekly(cache, schema)
 
     log(f"  ✓ Loaded {len(weekly)} rows, {weekly['sku'].nunique()} SKUs")
     log(f"  ✓ Categories: {weekly['category'].nunique()}")
-
-    # Add V4 features
     log("\n[2/7] Adding V4 features...")
-    weekly = add_v4_features(weekly)
-
-    # V4 Feature set
-    v4_features = [
-        # Core lag features
-        'lag1_quantity', 'lag2_quantity', 'lag4_quantity', 'rolling_avg_4w',
-        # Price features
-        'avg_unit_price', 'price_change_pct', 'price_trend_4w',
-        # Rolling stats
-        'rolling_std_4w', 'rolling_min_4w', 'rolling_max_4w', 'cv_4w',
-        # Seasonality
-        'week_num', 'week_sin', 'week_cos', 'is_w47', 'is_holiday_season'
-    ]
+    log(f"  ✓ {cache.summary()}")
+
+    # --incremental: per-model state kept between runs, new weeks add trees
+    store = ModelStore(MODEL_STATE_DIR) if '--incremental' in sys.argv else None
+    train_groups = store.train_per_group if store is not None else train_per_group
+    weights = lambda frame: sample_weights(frame, week_scores)
+
+    # Per-entity models are checkpointed; --resume skips those of the last run
+    checkpoint = Checkpoint(CHECKPOINT_DIR, resume='--resume' in sys.argv)
 
     # Filter to available features
-    v4_features = [f for f in v4_features if f in weekly.columns]
+    v4_features = [f for f in V4_FEATURES if f in weekly.columns]
     log(f"  ✓ Features: {len(v4_features)}")
 
     # Split H1/H2
@@ -174,68 +307,44 @@ def main():
     # Count H1 weeks per SKU
     h1_weeks_per_sku = train_all.groupby('sku').size().to_dict()
 
-    sku_results = []
-    sku_models = {}
-    trained_count = 0
-
-    # Train individual SKU models for SKUs with enough data
-    for sku in train_sku['sku'].unique():
-        sku_train = train_sku[train_sku['sku'] == sku].dropna(subset=v4_features[:4])  # Core features
-
-        if len(sku_train) < 4:
-            continue
-
-        X_train = sku_train[v4_features].fillna(0)
-        y_train = sku_train['weekly_quantity']
-
-        try:
-            model = train_model(X_train, y_train)
-            sku_models[sku] = model
-            trained_count += 1
-        except:
-            continue
-
-    log(f"  ✓ Trained {trained_count} individual SKU models")
-
     # Train global fallback model (on non-Unknown)
     train_valid = train_sku.dropna(subset=v4_features[:4])
-    X_global = train_valid[v4_features].fillna(0)
-    y_global = train_valid['weekly_quantity']
-    global_model = train_model(X_global, y_global)
+    if store is not None:
+        global_model = store.retrain('sku_global', train_valid, v4_features, 'weekly_quantity', fit, weights)
+    else:
+        X_global = feature_frame(feature_matrix(train_valid, v4_features), v4_features)
+        y_global = train_valid['weekly_quantity']
+        global_model = fit(X_global, y_global, sample_weights(train_valid, week_scores))
+
+    # Individual SKU models for SKUs with enough data (core features present);
+    # predict for ALL SKUs (including Unknown), global model where there is none
+    if scheduler is not None:
+        rows, sku_models = scheduler.train(
+            train_sku, test_all, 'sku', v4_features, 'weekly_quantity', global_model,
+            min_rows=4, required=v4_features[:4], weights=weights, checkpoint=checkpoint)
+    else:
+        rows, sku_models = train_groups(
+            train_sku, test_all, 'sku', v4_features, 'weekly_quantity', group_fit,
+            min_rows=4, fallback=global_model, required=v4_features[:4], weights=weights,
+            checkpoint=checkpoint)
+    log(f"  ✓ Trained {len(sku_models)} individual SKU models")
+    if early_stopping:
+        log(f"  ✓ {tree_summary(sku_models.values())}")
     log("  ✓ Trained global fallback model")
-
-    # Predict for ALL SKUs (including Unknown)
-    for sku in test_all['sku'].unique():
-        sku_test = test_all[test_all['sku'] == sku].dropna(subset=v4_features[:4])
-
-        if len(sku_test) == 0:
-            continue
-
-        X_test = sku_test[v4_features].fillna(0)
-
-        # Use SKU-specific model if available, else global
-        if sku in sku_models:
-            model = sku_models[sku]
-            model_type = 'sku'
-        else:
-            model = global_model
-            model_type = 'global'
-
-        preds = np.clip(model.predict(X_test), 0, None)
-
-        for i, (_, row) in enumerate(sku_test.iterrows()):
-            sku_results.append({
-                'sku': int(sku),
-                'description': sku_name.get(sku, f'SKU {sku}'),
-                'category': row['category'],
-                'year_week': row['year_week'],
-                'actual': row['weekly_quantity'],
-                'predicted': round(preds[i], 1),
-                'model_type': model_type,
-                'h1_weeks': h1_weeks_per_sku.get(sku, 0)
-            })
-
-    sku_df = pd.DataFrame(sku_results)
+    save_bundle('sku_models_v4.bundle', {**{int(sku): m for sku, m in sku_models.items()},
+                                         FALLBACK_KEY: global_model}, v4_features)
+
+    skus = rows['sku'].to_numpy()
+    sku_df = pd.DataFrame({
+        'sku': skus.astype(int),
+        'description': [sku_name.get(sku, f'SKU {sku}') for sku in skus],
+        'category': rows['category'].to_numpy(),
+        'year_week': rows['year_week'].to_numpy(),
+        'actual': rows['weekly_quantity'].to_numpy(),
+        'predicted': np.clip(rows['predicted'].to_numpy(), 0, None).round(1),
+        'model_type': rows['model_type'].map({'group': 'sku', 'fallback': 'global'}).to_numpy(),
+        'h1_weeks': [h1_weeks_per_sku.get(sku, 0) for sku in skus]
+    })
 
     # Calculate per-SKU WMAPE and confidence
     sku_wmape = sku_df.groupby('sku').apply(
@@ -271,7 +380,7 @@ def main():
     log("\n[4/7] Training per-Category models...")
 
     # Aggregate by category
-    cat_weekly = weekly.groupby(['category', 'year_week', 'week_num']).agg({
+    cat_weekly = weekly.groupby(['category', 'year_week', 'week_num'], observed=True).agg({
         'weekly_quantity': 'sum',
         'avg_unit_price': 'mean'
     }).reset_index()
@@ -290,33 +399,21 @@ def main():
     cat_train = cat_weekly[cat_weekly['week_num'] <= H1_END_WEEK]
     cat_test = cat_weekly[cat_weekly['week_num'] > H1_END_WEEK]
 
-    cat_results = []
     h1_weeks_per_cat = cat_train.groupby('category').size().to_dict()
 
-    for cat in cat_weekly['category'].unique():
-        cat_tr = cat_train[cat_train['category'] == cat].dropna(subset=cat_features[:4])
-        cat_te = cat_test[cat_test['category'] == cat].dropna(subset=cat_features[:4])
-
-        if len(cat_tr) < 4 or len(cat_te) == 0:
-            continue
+    # One model per category (no fallback: categories under 4 rows are skipped)
+    rows, cat_models = train_groups(
+        cat_train, cat_test, 'category', cat_features, 'weekly_quantity', group_fit,
+        min_rows=4, required=cat_features[:4], weights=weights, checkpoint=checkpoint)
+    save_bundle('category_models_v4.bundle', cat_models, cat_features)
 
-        X_train = cat_tr[cat_features].fillna(0)
-        y_train = cat_tr['weekly_quantity']
-        X_test = cat_te[cat_features].fillna(0)
-
-        model = train_model(X_train, y_train)
-        preds = np.clip(model.predict(X_test), 0, None)
-
-        for i, (_, row) in enumerate(cat_te.iterrows()):
-            cat_results.append({
-                'category': cat,
-                'year_week': row['year_week'],
-                'actual': row['weekly_quantity'],
-                'predicted': round(preds[i], 1),
-                'h1_weeks': h1_weeks_per_cat.get(cat, 0)
-            })
-
-    cat_df = pd.DataFrame(cat_results)
+    cat_df = pd.DataFrame({
+        'category': rows['category'].to_numpy(),
+        'year_week': rows['year_week'].to_numpy(),
+        'actual': rows['weekly_quantity'].to_numpy(),
+        'predicted': np.clip(rows['predicted'].to_numpy(), 0, None).round(1),
+        'h1_weeks': rows['category'].map(h1_weeks_per_cat).fillna(0).astype(int).to_numpy()
+    })
 
     # Calculate per-category WMAPE
     cat_wmape_dict = cat_df.groupby('category').apply(
@@ -344,12 +441,12 @@ def main():
     log("\n[5/7] Training per-Customer models...")
 
     try:
-        cust_sku = pd.read_csv(FEATURES_DIR / 'v2_features_sku_customer.csv')
-        customers = pd.read_csv(FEATURES_DIR / 'v2_dim_customers.csv')
+        cust_sku = schema.read_csv(FEATURES_DIR / 'v2_features_sku_customer.csv')
+        customers = schema.read_csv(FEATURES_DIR / 'v2_dim_customers.csv')
         cust_names = customers.set_index('customer_id')['customer_name'].to_dict()
 
         # Aggregate by customer and week
-        cust_weekly = cust_sku.groupby(['customer_id', 'year_week']).agg({
+        cust_weekly = cust_sku.groupby(['customer_id', 'year_week'], observed=True).agg({
             'weekly_quantity': 'sum'
         }).reset_index()
 
@@ -373,57 +470,40 @@ def main():
 
         # Train global customer model
         cust_train_valid = cust_train.dropna(subset=cust_features[:4])
-        X_global_cust = cust_train_valid[cust_features].fillna(0)
-        y_global_cust = cust_train_valid['weekly_quantity']
-        global_cust_model = train_model(X_global_cust, y_global_cust)
-
-        cust_results = []
-        cust_models = {}
-
-        # Train per-customer models for customers with enough data
-        for cust in cust_train['customer_id'].unique():
-            cust_tr = cust_train[cust_train['customer_id'] == cust].dropna(subset=cust_features[:4])
-
-            if len(cust_tr) >= 8:  # Need sufficient data
-                X_train = cust_tr[cust_features].fillna(0)
-                y_train = cust_tr['weekly_quantity']
-                try:
-                    cust_models[cust] = train_model(X_train, y_train)
-                except:
-                    pass
-
+        if store is not None:
+            global_cust_model = store.retrain('customer_global', cust_train_valid, cust_features,
+                                              'weekly_quantity', fit, weights)
+        else:
+            X_global_cust = feature_frame(feature_matrix(cust_train_valid, cust_features), cust_features)
+            y_global_cust = cust_train_valid['weekly_quantity']
+            global_cust_model = fit(X_global_cust, y_global_cust, sample_weights(cust_train_valid, week_scores))
+
+        # Per-customer models for customers with enough data (>= 8 rows),
+        # global customer model for the rest
+        if scheduler is not None:
+            rows, cust_models = scheduler.train(
+                cust_train, cust_test, 'customer_id', cust_features, 'weekly_quantity', global_cust_model,
+                min_rows=8, required=cust_features[:4], weights=weights, checkpoint=checkpoint)
+        else:
+            rows, cust_models = train_groups(
+                cust_train, cust_test, 'customer_id', cust_features, 'weekly_quantity', group_fit,
+                min_rows=8, fallback=global_cust_model, required=cust_features[:4], weights=weights,
+                checkpoint=checkpoint)
         log(f"  ✓ Trained {len(cust_models)} individual customer models")
-
-        # Predict for all customers
-        for cust in cust_test['customer_id'].unique():
-            cust_te = cust_test[cust_test['customer_id'] == cust].dropna(subset=cust_features[:4])
-
-            if len(cust_te) == 0:
-                continue
-
-            X_test = cust_te[cust_features].fillna(0)
-
-            if cust in cust_models:
-                model = cust_models[cust]
-                model_type = 'customer'
-            else:
-                model = global_cust_model
-                model_type = 'global'
-
-            preds = np.clip(model.predict(X_test), 0, None)
-
-            for i, (_, row) in enumerate(cust_te.iterrows()):
-                cust_results.append({
-                    'customer_id': str(cust),
-                    'customer_name': cust_names.get(cust, str(cust)),
-                    'year_week': row['year_week'],
-                    'actual': row['weekly_quantity'],
-                    'predicted': round(preds[i], 1),
-                    'model_type': model_type,
-                    'h1_weeks': h1_weeks_per_cust.get(cust, 0)
-                })
-
-        cust_df = pd.DataFrame(cust_results)
+        if early_stopping:
+            log(f"  ✓ {tree_summary(cust_models.values())}")
+        save_bundle('customer_models_v4.bundle', {**cust_models, FALLBACK_KEY: global_cust_model}, cust_features)
+
+        custs = rows['customer_id'].to_numpy()
+        cust_df = pd.DataFrame({
+            'customer_id': [str(cust) for cust in custs],
+            'customer_name': [cust_names.get(cust, str(cust)) for cust in custs],
+            'year_week': rows['year_week'].to_numpy(),
+            'actual': rows['weekly_quantity'].to_numpy(),
+            'predicted': np.clip(rows['predicted'].to_numpy(), 0, None).round(1),
+            'model_type': rows['model_type'].map({'group': 'customer', 'fallback': 'global'}).to_numpy(),
+            'h1_weeks': [h1_weeks_per_cust.get(cust, 0) for cust in custs]
+        })
 
         # Calculate per-customer WMAPE
         cust_wmape_dict = cust_df.groupby('customer_id').apply(
@@ -495,6 +575,16 @@ def main():
         log(f"    Customers: {cust_df['customer_id'].nunique()}")
         log(f"    Predictions: {len(cust_df)}")
 
+    if scheduler is not None:
+        log(f"\n  {scheduler.summary()}")
+        for row in scheduler.report().itertuples():
+            log(f"    {row.level:12} {row.tier:8} | planned {row.planned:5} ({row.planned_share:6.1%}) "
+                f"| trained {row.trained:5} ({row.trained_share:6.1%}) | {row.seconds:7.1f}s")
+        scheduler.schedule().to_csv(OUTPUT_DIR / 'training_schedule_v4.csv', index=False)
+        log(f"  ✓ Saved: training_schedule_v4.csv")
+    if store is not None:
+        log(f"\n  {store.summary()} ({MODEL_STATE_DIR})")
+    log(f"  {checkpoint.summary()}")
     log(f"\n  Files saved to: {OUTPUT_DIR}")
     log("=" * 70)
 
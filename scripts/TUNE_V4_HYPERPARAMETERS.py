@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+V4 HYPERPARAMETER TUNING - Successive Halving on a Held-Out H1 Tail
+===================================================================
+
+Tunes the per-SKU GradientBoosting hyperparameters of TRAIN_V4_MODELS.py:
+1. V4 feature frame from the feature cache (the frame V4 itself trains on)
+2. Candidates: V4's current GBR_PARAMS plus configs sampled from SEARCH_SPACE
+3. Successive halving (tuning.py): every candidate is scored on a small
+   subset of SKUs (fit on H1 up to the last VALIDATION_WEEKS weeks, WMAPE on
+   those weeks), the best 1/ETA move on to 3x more SKUs, until the last few
+   are scored on all SKUs with their own model
+4. Candidates of a rung run in parallel worker processes; each worker gets
+   the training frames once
+5. The current GBR_PARAMS are always scored on all SKUs, so they compare
+   with the best candidate on the same SKUs
+
+H2 is never used for selection: it stays the test period TRAIN_V4_MODELS.py
+reports, with or without --tuned-params.
+
+Output:
+  - tuning_v4_results.csv  - every evaluation (rung, SKUs, params, WMAPE, seconds)
+  - v4_tuned_params.json   - best config (TRAIN_V4_MODELS.py --tuned-params)
+Results and timings are also logged through ExperimentTracker
+(notebooks/shared) when it can be imported.
+
+Run: python3 scripts/TUNE_V4_HYPERPARAMETERS.py
+"""
+
+import numpy as np
+from functools import partial
+from datetime import datetime
+import json
+import sys
+import time
+import warnings
+warnings.filterwarnings('ignore')
+
+from feature_cache import FeatureCache
+from group_training import train_per_group
+from schema import Schema
+from tuning import ETA, TUNE_WORKERS, rung_budgets, sample_configs, successive_halving
+import TRAIN_V4_MODELS as v4
+
+LOG_FILE = v4.BASE_PATH / 'tuning_log.txt'
+RESULTS_FILE = 'tuning_v4_results.csv'
+
+# Search space around the current V4 settings
+SEARCH_SPACE = {
+    'n_estimators': [50, 100, 200, 300],
+    'max_depth': [2, 3, 4, 5, 6],
+    'learning_rate': [0.02, 0.05, 0.1, 0.2],
+    'min_samples_split': [2, 5, 10],
+    'min_samples_leaf': [1, 2, 4, 8],
+    'subsample': [0.7, 0.85, 1.0],
+}
+N_CANDIDATES = 27       # including the current GBR_PARAMS
+N_RUNGS = 3             # SKU budgets: all / ETA^2, all / ETA, all
+MIN_SKUS = 10           # smallest SKU subset a candidate is scored on
+MIN_ROWS = 4            # SKUs need this many complete fit rows (as in V4)
+VALIDATION_WEEKS = 4    # last H1 weeks the candidates are scored on
+
+# Per-worker training data (set once by init_worker)
+_TRAIN = _TEST = _FEATURES = _SKUS = None
+
+def log(msg):
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    line = f"[{timestamp}] {msg}"
+    print(line)
+    with open(LOG_FILE, 'a') as f:
+        f.write(line + '\n')
+
+def init_worker(train, test, features, skus):
+    global _TRAIN, _TEST, _FEATURES, _SKUS
+    _TRAIN, _TEST, _FEATURES, _SKUS = train, test, features, skus
+
+def evaluate_on_skus(params, n_skus):
+    """Validation-weeks WMAPE of per-SKU models with params, on the first n_skus SKUs"""
+    skus = _SKUS[:n_skus]
+    train = _TRAIN[_TRAIN['sku'].isin(skus)]
+    test = _TEST[_TEST['sku'].isin(skus)]
+    rows, _ = train_per_group(
+        train, test, 'sku', _FEATURES, 'weekly_quantity', partial(v4.train_model, params=params),
+        min_rows=MIN_ROWS, required=_FEATURES[:4], workers=1)
+    return v4.calculate_wmape(rows['weekly_quantity'], np.clip(rows['predicted'], 0, None))
+
+def start_tracking():
+    """ExperimentTracker run for this search (None when it cannot be imported)"""
+    sys.path.insert(0, str(v4.BASE_PATH / 'notebooks' / 'shared'))
+    try:
+        from experiment_tracker import ExperimentTracker
+    except Exception as e:
+        log(f"  ⚠ Experiment tracking unavailable: {e}")
+        return None
+    tracker = ExperimentTracker(experiment_name='v4_hyperparameter_tuning')
+    tracker.start_run(run_name=f"sh_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    return tracker
+
+def main():
+    log("=" * 70)
+    log("V4 HYPERPARAMETER TUNING - Successive Halving")
+    log("=" * 70)
+    v4.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    log("\n[1/4] Loading V4 features...")
+    schema = Schema.load(v4.FEATURES_DIR)
+    cache = FeatureCache(v4.FEATURES_DIR / 'cache', refresh='--no-feature-cache' in sys.argv)
+    weekly = v4.materialise_weekly(cache, schema)
+    log(f"  ✓ {cache.summary()}")
+
+    # H1 only: fit on its first weeks, score on its last VALIDATION_WEEKS (H2 stays untouched)
+    features = [f for f in v4.V4_FEATURES if f in weekly.columns]
+    fit_end = v4.H1_END_WEEK - VALIDATION_WEEKS
+    h1 = weekly[weekly['week_num'] <= v4.H1_END_WEEK]
+    train = h1[(h1['week_num'] <= fit_end) & (h1['category'] != 'Unknown')]
+    test = h1[h1['week_num'] > fit_end]
+    train = train.dropna(subset=features[:4])
+
+    # SKUs with their own V4 model, in a fixed random order: each rung's
+    # subset contains the previous one
+    counts = train.groupby('sku').size()
+    skus = counts[counts >= MIN_ROWS].index.to_numpy()
+    skus = skus[np.random.default_rng(42).permutation(len(skus))]
+    train = train[train['sku'].isin(skus)]
+    test = test[test['sku'].isin(skus)]
+    log(f"  ✓ {len(skus)} SKUs, {len(train)} fit rows (W1-W{fit_end}), "
+        f"{len(test)} validation rows (W{fit_end + 1}-W{v4.H1_END_WEEK}), {len(features)} features")
+
+    log("\n[2/4] Candidates...")
+    candidates = [dict(v4.GBR_PARAMS)]
+    for config in sample_configs(SEARCH_SPACE, N_CANDIDATES):
+        candidate = {**v4.GBR_PARAMS, **config}
+        if candidate not in candidates and len(candidates) < N_CANDIDATES:
+            candidates.append(candidate)
+    budgets = rung_budgets(len(skus), N_RUNGS, minimum=min(MIN_SKUS, len(skus)))
+    log(f"  ✓ {len(candidates)} candidates, SKU budgets {budgets}, eta {ETA}, {TUNE_WORKERS} workers")
+
+    tracker = start_tracking()
+    if tracker is not None:
+        tracker.log_params({'model': 'GradientBoostingRegressor', 'candidates': len(candidates),
+                            'budgets': json.dumps(budgets), 'eta': ETA, 'workers': TUNE_WORKERS,
+                            'search_space': json.dumps(SEARCH_SPACE)})
+
+    log("\n[3/4] Successive halving...")
+    start = time.time()
+    results = successive_halving(candidates, evaluate_on_skus, budgets,
+                                 initializer=init_worker, initargs=(train, test, features, skus), log=log)
+    total_seconds = time.time() - start
+
+    log("\n[4/4] Results")
+    best = results.iloc[0]
+    default = results[results['candidate'] == 0].sort_values('rung').iloc[-1]
+    if default['budget'] != budgets[-1]:
+        # Discarded early: score the current GBR_PARAMS on the best candidate's SKUs too
+        init_worker(train, test, features, skus)
+        default = default.copy()
+        default['error'] = evaluate_on_skus(candidates[0], budgets[-1])
+        default['budget'] = budgets[-1]
+    log(f"  ★ Best validation WMAPE on {best['budget']} SKUs: {best['error']:.1f}% (#{best['candidate']})")
+    log(f"    {best['params']}")
+    log(f"  Current GBR_PARAMS: {default['error']:.1f}% on {default['budget']} SKUs "
+        f"({'kept' if default['kept'] else 'discarded'} in rung {default['rung'] + 1})")
+    log(f"  Search time: {total_seconds:.1f}s ({results['seconds'].sum():.1f}s of model fits)")
+
+    saved = results.assign(params=results['params'].map(json.dumps))
+    saved.to_csv(v4.OUTPUT_DIR / RESULTS_FILE, index=False)
+    tuned = {'params': best['params'], 'wmape': float(best['error']), 'skus': int(best['budget']),
+             'default_wmape': float(default['error']), 'default_skus': int(default['budget']),
+             'validation_weeks': f"W{fit_end + 1}-W{v4.H1_END_WEEK}",
+             'tuned_at': datetime.now().isoformat(timespec='seconds')}
+    (v4.OUTPUT_DIR / v4.TUNED_PARAMS_FILE).write_text(json.dumps(tuned, indent=2))
+    log(f"  ✓ Saved: {RESULTS_FILE}, {v4.TUNED_PARAMS_FILE}")
+
+    if tracker is not None:
+        metrics = {'best_wmape': float(best['error']), 'default_wmape': float(default['error']),
+                   'search_seconds': round(total_seconds, 1), 'fit_seconds': round(float(results['seconds'].sum()), 1)}
+        for rung, seconds in results.groupby('rung')['seconds'].sum().items():
+            metrics[f'rung{rung + 1}_fit_seconds'] = round(float(seconds), 1)
+        tracker.log_params({f'best_{k}': v for k, v in best['params'].items()})
+        tracker.log_metrics(metrics)
+        tracker.log_artifact(saved, RESULTS_FILE)
+        tracker.end_run()
+
+    log("=" * 70)
+    return tuned
+
+if __name__ == '__main__':
+    main()
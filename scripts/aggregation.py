@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Hierarchical Aggregation Engine
+===============================
+Aggregate one fact table to many grouping levels in a single pass.
+
+Levels are declared as name -> (keys, measures), where measures map an
+output column to (source column, func):
+
+    LEVELS = {
+        'sku_customer_week': (['sku', 'customer_id', 'year_week'], {...}),
+        'sku_week': (['sku', 'year_week'], {
+            'weekly_quantity': ('quantity', 'sum'),
+            'avg_unit_price': ('unit_price', 'mean'),
+            'unique_customers': ('customer_id', 'nunique'),
+        }),
+        'week': (['year_week'], {...}),
+    }
+    tables = aggregate_levels(df, LEVELS)
+    tables['sku_week']
+
+How it works:
+  - every key column is factorised once to integer codes (shared by all levels)
+  - levels are computed finest first; decomposable measures (sum, mean, min,
+    max, count, size, first, and nunique of a finer level's one extra key)
+    are rolled up from the partial aggregates of an already computed finer
+    level instead of rescanning the line items
+  - the remaining funcs ('nunique', 'std', 'last', 'mode' or a callable) are
+    computed from the base rows, grouped on the integer codes
+
+Output matches df.groupby(keys).agg(...).reset_index() (NaN keys dropped,
+rows sorted by key).
+"""
+
+import pandas as pd
+import numpy as np
+
+# Funcs that can be rebuilt from partial aggregates of a finer level
+ROLLUP_FUNCS = {'sum', 'mean', 'min', 'max', 'count', 'size', 'first'}
+
+
+def _partials(measures):
+    """Partial aggregates (name -> (col, func)) needed for the decomposable measures."""
+    parts = {'__size': (None, 'size')}
+    for col, func in measures.values():
+        if func == 'sum':
+            parts[f'{col}__sum'] = (col, 'sum')
+        elif func == 'mean':
+            parts[f'{col}__sum'] = (col, 'sum')
+            parts[f'{col}__count'] = (col, 'count')
+        elif func == 'count':
+            parts[f'{col}__count'] = (col, 'count')
+        elif func in ('min', 'max'):
+            parts[f'{col}__{func}'] = (col, func)
+        elif func == 'first':
+            # Row position of the first non-null value, so roll-ups keep row order
+            parts[f'{col}__first'] = (col, 'first')
+            parts[f'{col}__firstpos'] = (col, 'firstpos')
+    return parts
+
+
+def _finish(parts, measures):
+    """Turn partial aggregates into the declared measure columns."""
+    out = {}
+    for name, (col, func) in measures.items():
+        if func == 'size':
+            out[name] = parts['__size']
+        elif func == 'mean':
+            out[name] = parts[f'{col}__sum'] / parts[f'{col}__count'].replace(0, np.nan)
+        else:
+            out[name] = parts[f'{col}__{func}']
+    return out
+
+
+def _first_per_group(inv, n_groups, order=None):
+    """(groups, row index) of the row with the lowest order (default: row position) per group."""
+    order = np.arange(len(inv), dtype=float) if order is None else order
+    best = np.full(n_groups, np.inf)
+    np.minimum.at(best, inv, order)
+    rows = np.flatnonzero(order == best[inv])
+    return inv[rows], rows
+
+
+class AggregationEngine:
+    """Shared key encoding for one fact table, reused across grouping levels."""
+
+    def __init__(self, df, key_cols):
+        self.df = df
+        self.codes = {}
+        self.labels = {}
+        for col in dict.fromkeys(key_cols):
+            self._encode(col)
+        self.tables = {}
+        # keys -> (group key codes, partial aggregates) of each computed level
+        self._levels = {}
+        self._present = {}
+
+    def _encode(self, col):
+        """Sorted integer codes of a column (-1 for missing), computed once."""
+        if col not in self.codes:
+            codes, uniques = pd.factorize(self.df[col], sort=True)
+            self.codes[col] = codes
+            self.labels[col] = uniques
+        return self.codes[col]
+
+    def _notna(self, col):
+        """Non-missing mask of a column, computed once."""
+        if col not in self._present:
+            self._present[col] = self.codes[col] >= 0 if col in self.codes else self.df[col].notna().to_numpy()
+        return self._present[col]
+
+    def _group(self, keys, codes):
+        """
+        Combine per-key codes into one sorted group id.
+
+        Returns (group id per row, -1 where a key is missing) and the key codes
+        of each group, in key order.
+        """
+        valid = np.ones(len(codes[keys[0]]), dtype=bool)
+        gid = np.zeros(len(valid), dtype=np.int64)
+        for k in keys:
+            valid &= codes[k] >= 0
+            gid = gid * len(self.labels[k]) + codes[k]
+
+        uniq, inv = np.unique(gid[valid], return_inverse=True)
+        groups = np.full(len(valid), -1, dtype=np.int64)
+        groups[valid] = inv
+
+        group_codes = {}
+        for k in reversed(keys):
+            group_codes[k] = uniq % len(self.labels[k])
+            uniq = uniq // len(self.labels[k])
+        return groups, {k: group_codes[k] for k in keys}
+
+    def _value_pairs(self, col, inv, valid):
+        """Unique (group, value code) pairs with their row counts."""
+        codes = self._encode(col)[valid]
+        present = codes >= 0
+        n_values = max(len(self.labels[col]), 1)
+        pairs, counts = np.unique(inv[present] * n_values + codes[present], return_counts=True)
+        return pairs // n_values, pairs % n_values, counts
+
+    def _scan(self, groups, n_groups, specs):
+        """Aggregate specs (name -> (col, func)) from the base rows by group id."""
+        valid = groups >= 0
+        inv = groups[valid]
+        index = pd.RangeIndex(n_groups)
+        result = pd.DataFrame(index=index)
+
+        # Plain reductions share one groupby over the group ids
+        plain = {n: (c, f) for n, (c, f) in specs.items()
+                 if f not in ('size', 'count', 'first', 'firstpos', 'nunique', 'mode')}
+        if plain:
+            cols = list(dict.fromkeys(c for c, _ in plain.values()))
+            grouped = pd.DataFrame({c: self.df[c].to_numpy()[valid] for c in cols}).groupby(inv, sort=True)
+
+        for name, (col, func) in specs.items():
+            if func == 'size':
+                result[name] = np.bincount(inv, minlength=n_groups)
+            elif func == 'count':
+                present = self._notna(col)[valid]
+                result[name] = np.bincount(inv[present], minlength=n_groups)
+            elif func in ('first', 'firstpos'):
+                values = self.df[col].to_numpy()[valid]
+                present = np.flatnonzero(self._notna(col)[valid])
+                first_groups, first = _first_per_group(inv[present], n_groups)
+                if func == 'first':
+                    result[name] = pd.Series(values[present[first]], index=first_groups).reindex(index)
+                else:
+                    positions = np.flatnonzero(valid)[present[first]].astype(float)
+                    result[name] = pd.Series(positions, index=first_groups).reindex(index)
+            elif func == 'nunique':
+                pair_groups, _, _ = self._value_pairs(col, inv, valid)
+                result[name] = np.bincount(pair_groups, minlength=n_groups)
+            elif func == 'mode':
+                # Highest count first, smallest value on ties (codes are sorted)
+                pair_groups, pair_codes, counts = self._value_pairs(col, inv, valid)
+                rank = np.empty(len(pair_groups), dtype=float)
+                rank[np.lexsort((pair_codes, -counts, pair_groups))] = np.arange(len(pair_groups))
+                mode_groups, first = _first_per_group(pair_groups, n_groups, rank)
+                values = self.labels[col].take(pair_codes[first])
+                result[name] = pd.Series(values, index=mode_groups).reindex(index)
+            else:
+                result[name] = grouped[col].agg(func)
+        return result
+
+    def _rollup_source(self, keys, measures):
+        """A computed finer level holding every partial this level needs (None if there is none)."""
+        needed = _partials({n: m for n, m in measures.items() if m[1] in ROLLUP_FUNCS})
+        for fine_keys, (fine_codes, fine) in self._levels.items():
+            if not set(keys) < set(fine_keys):
+                continue
+            extra = [k for k in fine_keys if k not in keys]
+            # Rows dropped for a missing extra key would be lost in the roll-up
+            if any((self.codes[k] < 0).any() for k in extra):
+                continue
+            if all(part in fine.columns for part in needed):
+                return extra, fine_codes, fine
+        return None
+
+    def _rollup(self, inv, n_groups, fine, parts_spec):
+        """Combine a finer level's partial aggregates into the coarser groups inv."""
+        index = pd.RangeIndex(n_groups)
+        aggs = {part: {'size': 'sum', 'count': 'sum', 'firstpos': 'min'}.get(func, func)
+                for part, (_, func) in parts_spec.items() if func != 'first'}
+        parts = fine[list(aggs)].groupby(inv, sort=True).agg(aggs).reindex(index)
+
+        for part, (col, func) in parts_spec.items():
+            if func == 'first':
+                # Value from the finer group whose first non-null row comes first
+                firstpos = fine[f'{col}__firstpos'].to_numpy()
+                present = np.flatnonzero(~np.isnan(firstpos))
+                first_groups, first = _first_per_group(inv[present], n_groups, firstpos[present])
+                parts[part] = pd.Series(fine[part].to_numpy()[present[first]], index=first_groups).reindex(index)
+        return parts[list(parts_spec)]
+
+    def aggregate(self, name, keys, measures):
+        """Aggregate one level, rolling up from a finer level what can be rolled up."""
+        keys = list(keys)
+        rollable = {n: m for n, m in measures.items() if m[1] in ROLLUP_FUNCS}
+        parts_spec = _partials(rollable)
+        source = self._rollup_source(keys, measures)
+
+        if source is not None:
+            extra, fine_codes, fine = source
+            inv, group_codes = self._group(keys, fine_codes)
+            n_groups = len(group_codes[keys[0]])
+            parts = self._rollup(inv, n_groups, fine, parts_spec)
+            out = _finish(parts, rollable)
+            # nunique of the one extra key = number of finer groups
+            for out_name, (col, func) in measures.items():
+                if func == 'nunique' and extra == [col]:
+                    out[out_name] = pd.Series(np.bincount(inv, minlength=n_groups))
+            rest = {n: m for n, m in measures.items() if n not in out}
+            groups = None
+        else:
+            groups, group_codes = self._group(keys, self.codes)
+            n_groups = len(group_codes[keys[0]])
+            rest = {n: m for n, m in measures.items() if n not in rollable}
+            parts = self._scan(groups, n_groups, parts_spec)
+            out = _finish(parts, rollable)
+
+        if rest:
+            if groups is None:
+                groups, _ = self._group(keys, self.codes)
+            scanned = self._scan(groups, n_groups, rest)
+            for out_name in rest:
+                out[out_name] = scanned[out_name]
+
+        self._levels[tuple(keys)] = (group_codes, parts)
+
+        # Integer codes -> original labels
+        table = pd.DataFrame({k: self.labels[k].take(group_codes[k]) for k in keys})
+        for out_name in measures:
+            table[out_name] = out[out_name].to_numpy()
+        self.tables[name] = table
+        return table
+
+
+def aggregate_levels(df, levels):
+    """
+    Aggregate df to every level in one shared pass.
+
+    levels: name -> (keys, measures); measures: out_col -> (source_col, func).
+    Returns name -> DataFrame (keys first, then measures in declared order).
+    """
+    key_cols = [k for keys, _ in levels.values() for k in keys]
+    engine = AggregationEngine(df, key_cols)
+
+    # Finest levels first so coarser ones can roll up from them
+    for name in sorted(levels, key=lambda n: -len(levels[n][0])):
+        keys, measures = levels[name]
+        engine.aggregate(name, keys, measures)
+    return {name: engine.tables[name] for name in levels}
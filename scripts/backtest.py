@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Rolling-Origin Backtesting
+==========================
+Model comparisons over many forecast origins instead of the single H1/H2 split.
+
+The featured frame is built once and sorted by week; each origin's train
+(weeks <= origin) and test (the following `horizon` weeks) frames are
+contiguous row ranges of it, so no feature is recomputed per origin. The
+features are backward-looking (lags / rolling windows of earlier weeks), so
+training rows never see test weeks; test rows get the same one-week-ahead lag
+inputs as in the trainers' H1/H2 evaluation.
+
+A model is model(train, test, id_col, value_col) -> predictions frame with
+id_col, 'year_week', 'predicted', 'actual': the signature of the
+MODEL_EVALUATION.py baselines. Trainers plug in through a module-level
+adapter with that signature. Every (model, origin) pair is one task; tasks run in
+parallel worker processes that receive the frame once.
+
+Usage:
+    backtester = Backtester(weekly, 'sku', horizon=12)
+    predictions = backtester.run({'MA_4Week': model_moving_average, 'V4_GBR': backtest_model},
+                                 origins=rolling_origins(backtester.weeks(), anchor=26))
+    summary, by_origin, by_entity = summarise(predictions, 'sku')
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# (model, origin) tasks run in parallel worker processes
+BACKTEST_WORKERS = min(4, os.cpu_count() or 1)
+
+# Weeks predicted after each origin
+HORIZON = 12
+
+# Origins every ORIGIN_STEP weeks, each with at least MIN_TRAIN_WEEKS of history
+ORIGIN_STEP = 4
+MIN_TRAIN_WEEKS = 13
+
+# Per-worker backtester (set once by _init_worker)
+_BACKTESTER = None
+
+
+def _init_worker(backtester):
+    global _BACKTESTER
+    _BACKTESTER = backtester
+
+
+def _run_task(name, model, origin):
+    """Worker: (name, origin, predictions, seconds, error) of one model at one origin."""
+    start = time.time()
+    try:
+        preds = _BACKTESTER.evaluate(model, origin)
+        error = None
+    except Exception as e:
+        preds, error = None, f"{type(e).__name__}: {e}"
+    return name, origin, preds, time.time() - start, error
+
+
+def rolling_origins(weeks, anchor, step=ORIGIN_STEP, min_train=MIN_TRAIN_WEEKS, horizon=HORIZON):
+    """
+    Origin weeks anchor ± k·step (the H1/H2 split stays one of them) with
+    min_train weeks before and a full horizon after.
+    """
+    weeks = np.unique(weeks)
+    first, last = weeks.min() + min_train - 1, weeks.max() - horizon
+    return [int(w) for w in range(anchor - step * ((anchor - first) // step), last + 1, step) if w >= first]
+
+
+def _wmape(abs_error, actual):
+    return np.where(actual > 0, 100 * abs_error / np.where(actual > 0, actual, 1), np.nan)
+
+
+class Backtester:
+    """One featured frame, sliced into train / test row ranges per origin week."""
+
+    def __init__(self, frame, id_col, week_col='week_num', value_col='weekly_quantity', horizon=HORIZON):
+        self.id_col = id_col
+        self.week_col = week_col
+        self.value_col = value_col
+        self.horizon = horizon
+        self.frame = frame.sort_values([week_col, id_col], kind='stable').reset_index(drop=True)
+        self._weeks = self.frame[week_col].to_numpy()
+
+    def weeks(self):
+        return np.unique(self._weeks)
+
+    def split(self, origin):
+        """(train, test): rows up to origin, rows of the next horizon weeks."""
+        cut = np.searchsorted(self._weeks, origin, side='right')
+        end = np.searchsorted(self._weeks, origin + self.horizon, side='right')
+        return self.frame.iloc[:cut], self.frame.iloc[cut:end]
+
+    def evaluate(self, model, origin):
+        train, test = self.split(origin)
+        preds = model(train, test, self.id_col, self.value_col)
+        if preds is None or len(preds) == 0:
+            return pd.DataFrame(columns=[self.id_col, 'year_week', 'predicted', 'actual'])
+        return preds[[self.id_col, 'year_week', 'predicted', 'actual']]
+
+    def run(self, models, origins, workers=BACKTEST_WORKERS, log=print):
+        """
+        Predictions of name -> model at every origin, with 'model', 'origin'
+        and 'horizon_week' (1 = the week after the origin) columns.
+        """
+        tasks = [(name, model, origin) for origin in origins for name, model in models.items()]
+        workers = max(1, min(workers or 1, len(tasks)))
+        if workers == 1:
+            _init_worker(self)
+            results = [_run_task(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as pool:
+                results = list(pool.map(_run_task, *zip(*tasks)))
+
+        frames = []
+        seconds = dict.fromkeys(models, 0.0)
+        for name, origin, preds, spent, error in results:
+            seconds[name] += spent
+            if error is not None:
+                log(f"  ⚠ {name} failed at origin W{origin:02d}: {error}")
+                continue
+            frames.append(preds.assign(model=name, origin=origin))
+        for name, spent in seconds.items():
+            log(f"  ✓ {name}: {len(origins)} origins, {spent:.1f}s")
+
+        if not frames:
+            return pd.DataFrame(columns=[self.id_col, 'year_week', 'predicted', 'actual', 'model', 'origin'])
+        predictions = pd.concat(frames, ignore_index=True)
+        week_num = predictions['year_week'].astype(str).str.extract(r'W(\d+)')[0].astype(int)
+        predictions['horizon_week'] = week_num - predictions['origin']
+        return predictions
+
+
+def summarise(predictions, id_col):
+    """
+    WMAPE / MAE tables from backtest predictions:
+      - per model: pooled over all origins, plus mean / median / std of the
+        per-origin WMAPE (how much the origin choice moves the result)
+      - per model × origin
+      - per model × entity (pooled over origins)
+    """
+    df = predictions.assign(abs_error=(predictions['actual'] - predictions['predicted']).abs())
+
+    def table(keys):
+        t = df.groupby(keys, sort=True).agg(abs_error=('abs_error', 'sum'), actual=('actual', 'sum'),
+                                            mae=('abs_error', 'mean'), count=('abs_error', 'size'))
+        t['wmape'] = _wmape(t['abs_error'].to_numpy(), t['actual'].to_numpy())
+        return t.reset_index()
+
+    by_origin = table(['model', 'origin'])
+    by_entity = table(['model', id_col])
+    pooled = table(['model'])
+    spread = by_origin.groupby('model')['wmape'].agg(wmape_mean='mean', wmape_median='median',
+                                                     wmape_std='std', origins='count').reset_index()
+    summary = pooled.merge(spread, on='model').sort_values('wmape').reset_index(drop=True)
+
+    drop = ['abs_error', 'actual']
+    return summary.drop(columns=drop), by_origin.drop(columns=drop), by_entity.drop(columns=drop)
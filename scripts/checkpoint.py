@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Training Checkpoints
+====================
+Completed entities of the per-entity training loops, kept on disk so a run
+that dies part-way can resume instead of starting over.
+
+A run writes to checkpoints/<script>/<run id>/, one file per loop. Each entity's
+record (its predictions / H1 actual rows and its model) is buffered and
+appended to the loop's file every CHECKPOINT_EVERY entities as one pickled
+batch: writes are append-only and never rewrite earlier batches. A batch
+cut short by a crash is dropped on read.
+
+--resume reopens the latest run of the script and its loops skip the
+entities already recorded; without it a new run ID is started (the last
+KEEP_RUNS runs are kept).
+
+Usage:
+    checkpoint = Checkpoint(BASE_PATH / 'checkpoints' / 'v3', resume='--resume' in sys.argv)
+    done = checkpoint.done('sku')
+    for sku in eligible_skus:
+        if sku in done:
+            sku_results.extend(done[sku]['predictions'])
+            continue
+        ...
+        checkpoint.add('sku', sku, {'predictions': rows, 'model': model})
+    checkpoint.flush()
+"""
+
+import pickle
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+# Entities per appended batch
+CHECKPOINT_EVERY = 50
+
+# Runs kept per script (older run directories are removed on a new run)
+KEEP_RUNS = 3
+
+
+class Checkpoint:
+    """Append-only store of completed entities per loop, keyed by run ID."""
+
+    def __init__(self, checkpoint_dir, resume=False, every=CHECKPOINT_EVERY):
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.every = every
+        self.pending = {}
+        self.resumed = {}
+
+        latest = self.checkpoint_dir / 'LATEST'
+        if resume and latest.exists():
+            self.run_id = latest.read_text().strip()
+        else:
+            self.run_id = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+            self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+            latest.write_text(self.run_id)
+            runs = sorted(p for p in self.checkpoint_dir.iterdir() if p.is_dir())
+            for old in runs[:max(0, len(runs) - KEEP_RUNS + 1)]:
+                shutil.rmtree(old, ignore_errors=True)
+        self.run_dir = self.checkpoint_dir / self.run_id
+
+    def _path(self, loop):
+        return self.run_dir / f'{loop}.pkl'
+
+    def done(self, loop):
+        """entity -> record for the loop's entities recorded in this run."""
+        records = {}
+        path = self._path(loop)
+        if path.exists():
+            with open(path, 'r+b') as f:
+                good = 0
+                while True:
+                    try:
+                        records.update(pickle.load(f))
+                        good = f.tell()
+                    except Exception:
+                        # End of file, or a batch cut short by a crash: drop
+                        # the partial bytes so later appends stay readable
+                        f.truncate(good)
+                        break
+        self.resumed[loop] = len(records)
+        return records
+
+    def add(self, loop, entity, record):
+        """Record a completed entity (appended with its batch)."""
+        batch = self.pending.setdefault(loop, {})
+        batch[entity] = record
+        if len(batch) >= self.every:
+            self.flush(loop)
+
+    def add_many(self, loop, records):
+        """Record a batch of completed entities and append it now."""
+        self.pending.setdefault(loop, {}).update(records)
+        self.flush(loop)
+
+    def flush(self, loop=None):
+        """Append the buffered records (of one loop, or of all)."""
+        for name in [loop] if loop is not None else list(self.pending):
+            batch = self.pending.pop(name, None)
+            if not batch:
+                continue
+            self.run_dir.mkdir(parents=True, exist_ok=True)
+            with open(self._path(name), 'ab') as f:
+                pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def summary(self):
+        """One-line report for the training log."""
+        resumed = ', '.join(f"{n} {loop}" for loop, n in self.resumed.items() if n)
+        return f"Checkpoint run {self.run_id}" + (f" (resumed: {resumed})" if resumed else '')
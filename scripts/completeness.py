@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Data Completeness Scores
+========================
+Week × region coverage of the line-item extracts, as labels, scores,
+sample weights and masks.
+
+Scores are computed on a small week × region count table, never per row:
+  - week_region_counts   line items per week × region (integer codes + bincount)
+  - coverage_scores      region score = lines / the region's median active week
+                         (capped at 1); week score = share of the regions'
+                         expected lines present that week
+  - broadcast            week table -> fact rows by integer code lookup
+                         (categorical codes when year_week is encoded)
+
+Trainers opt in with --completeness-weights: partial weeks then count less
+as training targets instead of weighing as much as complete ones.
+
+Usage:
+    week_table, region_table = coverage_scores(week_region_counts(df))
+    df['data_completeness'] = broadcast(df, week_table, 'data_completeness')
+
+    scores = week_scores_from_argv(FEATURES_DIR)   # None unless --completeness-weights
+    model.fit(X_train, y_train, sample_weight=sample_weights(train, scores))
+"""
+
+import sys
+
+import pandas as pd
+import numpy as np
+from pathlib import Path
+
+WEEK_TABLE_FILE = 'v2_week_completeness.csv'
+REGION_TABLE_FILE = 'v2_week_region_completeness.csv'
+
+# Scores for tables that only carry the complete / partial / minimal label
+LABEL_SCORES = {'complete': 1.0, 'partial': 0.5, 'minimal': 0.1}
+
+# Trainer flag that turns the week score weights on
+WEIGHTS_FLAG = '--completeness-weights'
+
+# Floor so minimal weeks still contribute a little
+MIN_WEIGHT = 0.1
+
+
+def completeness_labels(week_counts):
+    """complete / partial / minimal per week from its line-item count vs the median week."""
+    median_count = week_counts.median()
+    labels = pd.Series('minimal', index=week_counts.index)
+    labels[week_counts >= median_count * 0.3] = 'partial'
+    labels[week_counts >= median_count * 0.8] = 'complete'
+    return labels
+
+
+def week_region_counts(df, week_col='year_week', region_col='region_name'):
+    """Line items per week × region (missing regions count as 'Unknown')."""
+    week_codes, weeks = pd.factorize(df[week_col], sort=True)
+    region_codes, regions = pd.factorize(df[region_col].astype(object).fillna('Unknown'), sort=True)
+    valid = week_codes >= 0
+    cells = np.bincount(week_codes[valid] * len(regions) + region_codes[valid],
+                        minlength=len(weeks) * len(regions))
+    return pd.DataFrame(cells.reshape(len(weeks), len(regions)),
+                        index=pd.Index(np.asarray(weeks, dtype=object), name=week_col),
+                        columns=pd.Index(np.asarray(regions, dtype=object), name=region_col))
+
+
+def coverage_scores(counts):
+    """
+    Week and week × region scores from a week_region_counts table.
+
+    Returns (week table: year_week, line_items, regions_active,
+    coverage_score, data_completeness; region table: year_week, region_name,
+    line_items, region_score).
+    """
+    values = counts.to_numpy(dtype=float)
+    active = np.where(values > 0, values, np.nan)
+    expected = np.nan_to_num(np.nanmedian(active, axis=0)) if len(values) else np.zeros(values.shape[1])
+
+    present = np.minimum(values, expected)
+    region_score = np.divide(values, expected, out=np.zeros_like(values), where=expected > 0).clip(0, 1)
+    week_score = present.sum(axis=1) / expected.sum() if expected.sum() > 0 else np.zeros(len(values))
+
+    week_col = counts.index.name
+    line_items = counts.sum(axis=1)
+    week_table = pd.DataFrame({
+        week_col: counts.index,
+        'line_items': line_items.to_numpy(),
+        'regions_active': (values > 0).sum(axis=1),
+        'coverage_score': week_score.round(3),
+        'data_completeness': completeness_labels(line_items).to_numpy()
+    })
+
+    region_table = counts.stack().rename('line_items').reset_index()
+    region_table['region_score'] = region_score.ravel().round(3)
+    return week_table, region_table
+
+
+def broadcast(df, table, value_col, key_col='year_week'):
+    """table[value_col] for each row of df, joined on key_col by integer position (NaN if absent)."""
+    keys = df[key_col]
+    values = table.set_index(key_col)[value_col]
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        # Lookup per category, then index by the row codes (-1 -> appended NaN)
+        lookup = values.reindex(keys.cat.categories.astype(object))
+        codes = keys.cat.codes.to_numpy()
+    else:
+        lookup = values
+        codes = pd.Index(values.index).get_indexer(keys)
+    lookup = lookup.to_numpy(dtype=float) if pd.api.types.is_numeric_dtype(lookup) else lookup.to_numpy(dtype=object)
+    return np.append(lookup, np.nan)[codes]
+
+
+def load_week_scores(features_dir):
+    """year_week -> coverage score from the saved week table (label scores for older tables)."""
+    table = pd.read_csv(Path(features_dir) / WEEK_TABLE_FILE, usecols=lambda c: c in (
+        'year_week', 'coverage_score', 'data_completeness'))
+    if 'coverage_score' not in table.columns or table['coverage_score'].isna().all():
+        table['coverage_score'] = table['data_completeness'].map(LABEL_SCORES)
+    return table[['year_week', 'coverage_score']]
+
+
+def week_scores_from_argv(features_dir, argv=None):
+    """Week scores when the trainer runs with --completeness-weights, else None (unweighted)."""
+    argv = sys.argv if argv is None else argv
+    return load_week_scores(features_dir) if WEIGHTS_FLAG in argv else None
+
+
+def sample_weights(df, scores, week_col='year_week', min_weight=MIN_WEIGHT):
+    """Per-row training weights from the week scores (None when scores is None: unweighted)."""
+    if scores is None:
+        return None
+    weights = broadcast(df, scores.rename(columns={'year_week': week_col}), 'coverage_score', week_col)
+    return np.clip(np.nan_to_num(weights, nan=1.0), min_weight, 1.0)
+
+
+def complete_mask(df, scores, threshold=0.8, week_col='year_week'):
+    """Boolean mask of rows whose week scores at least threshold (weeks missing from scores pass)."""
+    weights = broadcast(df, scores.rename(columns={'year_week': week_col}), 'coverage_score', week_col)
+    return np.nan_to_num(weights, nan=1.0) >= threshold
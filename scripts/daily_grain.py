@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Daily Grain Panels
+==================
+Series × Day demand matrices for the forecast_*_daily tables.
+
+The daily tables only hold days with orders. A DailyPanel densifies one
+value column into a float32 matrix (one row per series, one column per day)
+on a Monday-to-Sunday calendar, so:
+  - daily -> weekly resampling is a reshape to (series, weeks, 7) and a sum
+  - weekly -> daily disaggregation is weekly totals × a day-of-week profile
+  - lag / rolling features are array shifts and cumulative sums, built for a
+    chunk of series at a time (float32, ~7x the weekly row count)
+
+Day-of-week profiles are each series' share of volume per weekday, shrunk
+towards the level-wide profile for series with few active weeks.
+
+Usage:
+    panel = DailyPanel.from_frame(daily, 'customer_id', 'quantity')
+    weekly = panel.weekly()                      # series × year_week
+    profile = panel.dow_profile(end=split_day)   # series × Mon..Sun shares
+    daily = disaggregate(weekly_forecast, profile, 'customer_id', 'predicted')
+
+    for chunk in panel.chunks(500):
+        X, rows = daily_features(chunk, horizon=7, profile=profile, end=split_day)
+"""
+
+import pandas as pd
+import numpy as np
+
+DAY_NAMES = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+# Same-weekday lags (days before the target day, >= horizon) and trailing
+# windows ending at the forecast origin
+DAILY_LAGS = (7, 14, 21, 28)
+DAILY_WINDOWS = (7, 28)
+
+DAILY_FEATURES = (
+    [f'lag{lag}d' for lag in DAILY_LAGS]
+    + ['same_dow_mean_4w']
+    + [f'rolling_mean_{w}d' for w in DAILY_WINDOWS]
+    + ['days_since_order', 'dow', 'dow_share', 'week_num', 'is_w47']
+)
+
+
+def year_week(dates):
+    """Dates -> ISO '2025-W05' labels (the weekly tables' year_week)."""
+    iso = pd.DatetimeIndex(dates).isocalendar()
+    return (iso['year'].astype(str) + '-W' + iso['week'].astype(str).str.zfill(2)).to_numpy()
+
+
+def week_start(year_weeks):
+    """ISO '2025-W05' labels -> the Monday of each week."""
+    return pd.to_datetime(pd.Series(year_weeks).astype(str) + '-1', format='%G-W%V-%u')
+
+
+def _shift(values, periods):
+    """Shift along the day axis (columns), padding with 0."""
+    if periods == 0:
+        return values
+    out = np.zeros_like(values)
+    out[:, periods:] = values[:, :-periods]
+    return out
+
+
+def _rolling_mean(values, window):
+    """Trailing mean over the last window days (fewer at the start)."""
+    csum = np.cumsum(values, axis=1, dtype=np.float64)
+    lagged = np.zeros_like(csum)
+    lagged[:, window:] = csum[:, :-window]
+    counts = np.minimum(np.arange(1, values.shape[1] + 1), window)
+    return ((csum - lagged) / counts).astype(np.float32)
+
+
+class DailyPanel:
+    """One value column as a float32 series × day matrix on a Mon-Sun calendar."""
+
+    def __init__(self, keys, dates, values):
+        self.keys = keys            # one row per series (key columns)
+        self.dates = dates          # DatetimeIndex, starts Monday, whole weeks
+        self.values = values        # (len(keys), len(dates)) float32
+
+    @classmethod
+    def from_frame(cls, df, keys, value_col, date_col='date', start=None, end=None):
+        """Densify a sparse daily table (missing days are 0)."""
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        dates = pd.to_datetime(df[date_col]).dt.normalize()
+        start = pd.Timestamp(start or dates.min())
+        end = pd.Timestamp(end or dates.max())
+        start -= pd.Timedelta(days=start.dayofweek)
+        end += pd.Timedelta(days=6 - end.dayofweek)
+        calendar = pd.date_range(start, end, freq='D')
+
+        inside = ((dates >= start) & (dates <= end) & df[keys].notna().all(axis=1)).to_numpy()
+        grouped = df.loc[inside, keys].groupby(keys, sort=True, observed=True)
+        series_codes = grouped.ngroup().to_numpy()
+        day_codes = (dates[inside] - start).dt.days.to_numpy()
+
+        values = np.zeros((grouped.ngroups, len(calendar)), dtype=np.float32)
+        np.add.at(values, (series_codes, day_codes), df.loc[inside, value_col].fillna(0).to_numpy(np.float32))
+        return cls(grouped.size().index.to_frame(index=False), calendar, values)
+
+    @property
+    def n_weeks(self):
+        return len(self.dates) // 7
+
+    def week_labels(self):
+        return year_week(self.dates[::7])
+
+    def chunks(self, size):
+        """Panels over consecutive blocks of series (views, no copies)."""
+        for start in range(0, len(self.keys), size):
+            block = slice(start, start + size)
+            yield DailyPanel(self.keys.iloc[block].reset_index(drop=True), self.dates, self.values[block])
+
+    def day_index(self, date):
+        """Calendar position of date (0 = first Monday)."""
+        return int((pd.Timestamp(date) - self.dates[0]).days)
+
+    def weekly(self, long=True):
+        """Resample to weeks: series × year_week totals (long frame by default)."""
+        totals = self.values.reshape(len(self.keys), self.n_weeks, 7).sum(axis=2)
+        if not long:
+            return totals
+        out = self.keys.loc[self.keys.index.repeat(self.n_weeks)].reset_index(drop=True)
+        out['year_week'] = np.tile(self.week_labels(), len(self.keys))
+        out['quantity'] = totals.ravel()
+        return out
+
+    def to_frame(self, values=None, name='quantity', start=None, nonzero=False):
+        """Long series × date frame of values (default: the panel's own)."""
+        values = self.values if values is None else values
+        first = self.day_index(start) if start is not None else 0
+        values = values[:, first:]
+        out = self.keys.loc[self.keys.index.repeat(values.shape[1])].reset_index(drop=True)
+        out['date'] = np.tile(self.dates[first:].strftime('%Y-%m-%d'), len(self.keys))
+        out[name] = values.ravel()
+        return out[out[name] != 0].reset_index(drop=True) if nonzero else out
+
+    def dow_profile(self, end=None, prior_weeks=4):
+        """
+        Per-series weekday shares of volume in the days before end.
+
+        Shares are blended with the level-wide profile, weighted by active
+        weeks / (active weeks + prior_weeks); series without volume get the
+        level-wide profile.
+        """
+        last = self.day_index(end) if end is not None else len(self.dates)
+        last -= last % 7
+        days = self.values[:, :last].reshape(len(self.keys), -1, 7)
+        by_dow = days.sum(axis=1, dtype=np.float64)
+        totals = by_dow.sum(axis=1, keepdims=True)
+
+        overall = by_dow.sum(axis=0)
+        overall = overall / overall.sum() if overall.sum() > 0 else np.full(7, 1 / 7)
+        own = np.divide(by_dow, totals, out=np.tile(overall, (len(self.keys), 1)), where=totals > 0)
+
+        active = (days.sum(axis=2) > 0).sum(axis=1, keepdims=True)
+        weight = active / (active + prior_weeks)
+        profile = pd.DataFrame((weight * own + (1 - weight) * overall).astype(np.float32), columns=DAY_NAMES)
+        return pd.concat([self.keys, profile], axis=1)
+
+
+def disaggregate(weekly, profile, keys, value_col, week_col='year_week'):
+    """
+    Weekly totals -> daily rows (Mon..Sun) using each series' weekday profile.
+
+    Series missing from the profile use its average profile. Returns keys,
+    year_week, date and value_col; the days of a week sum to its total.
+    """
+    keys = [keys] if isinstance(keys, str) else list(keys)
+    shares = weekly[keys].merge(profile, on=keys, how='left')[list(DAY_NAMES)]
+    fallback = profile[list(DAY_NAMES)].mean()
+    shares = shares.fillna(fallback / fallback.sum()).to_numpy(np.float32)
+
+    totals = weekly[value_col].to_numpy(np.float32)[:, None]
+    out = weekly[keys + [week_col]].loc[weekly.index.repeat(7)].reset_index(drop=True)
+    mondays = week_start(weekly[week_col]).to_numpy().repeat(7)
+    offsets = np.tile(np.arange(7), len(weekly)).astype('timedelta64[D]')
+    out['date'] = pd.DatetimeIndex(mondays + offsets).strftime('%Y-%m-%d')
+    out[value_col] = (totals * shares).ravel()
+    return out
+
+
+def daily_features(panel, horizon=7, profile=None, start=None, end=None):
+    """
+    Feature matrix for every (series, day) of a panel chunk.
+
+    Only values at least horizon days old are used (DAILY_LAGS must be
+    >= horizon), so a row is a horizon-days-ahead forecast. Rows before a series' first order (+ horizon)
+    carry no history and are left out. With end (the first validation day),
+    the first order is looked up before end only, so the rows kept after it do
+    not depend on validation demand: series with no earlier order keep every
+    row from end on. Returns (X float32 [rows, features], rows frame with
+    series / day positions and the target).
+    """
+    n_series, n_days = panel.values.shape
+    known = _shift(panel.values, horizon)
+
+    columns = [_shift(panel.values, lag) for lag in DAILY_LAGS]
+    columns.append(np.mean(columns, axis=0))
+    columns += [_rolling_mean(known, w) for w in DAILY_WINDOWS]
+
+    # Days since the last order visible at the forecast origin
+    day = np.arange(n_days)
+    last_order = np.maximum.accumulate(np.where(known > 0, day, -1), axis=1)
+    columns.append(np.where(last_order >= 0, day - last_order, n_days).astype(np.float32))
+
+    dow = np.broadcast_to(panel.dates.dayofweek.to_numpy(), (n_series, n_days))
+    columns.append(dow)
+    if profile is not None:
+        shares = panel.keys.merge(profile, on=list(panel.keys.columns), how='left')[list(DAY_NAMES)]
+        shares = shares.fillna(1 / 7).to_numpy(np.float32)
+    else:
+        shares = np.full((n_series, 7), 1 / 7, dtype=np.float32)
+    columns.append(np.take_along_axis(shares, dow, axis=1))
+
+    week_num = np.broadcast_to(panel.dates.isocalendar()['week'].to_numpy(), (n_series, n_days))
+    columns += [week_num, week_num == 47]
+
+    # Rows with history (first order from the training days), from start on
+    cutoff = int(np.clip(panel.day_index(end), 0, n_days)) if end is not None else n_days
+    ordered = panel.values[:, :cutoff] > 0
+    first_row = np.argmax(ordered, axis=1) + horizon
+    first_row[~ordered.any(axis=1)] = cutoff
+    keep = day[None, :] >= first_row[:, None]
+    if start is not None:
+        keep &= day[None, :] >= panel.day_index(start)
+    series_idx, day_idx = np.nonzero(keep)
+
+    X = np.empty((len(series_idx), len(columns)), dtype=np.float32)
+    for j, col in enumerate(columns):
+        X[:, j] = col[series_idx, day_idx]
+    rows = pd.DataFrame({'series': series_idx, 'day': day_idx, 'target': panel.values[series_idx, day_idx]})
+    return X, rows
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Demand Pattern Classification
+=============================
+Demand statistics and Syntetos-Boylan classes for every series of a level
+(SKU, customer, category) in one pass over a Series × Week matrix.
+
+Per series, over its active weeks (first demand week to the last week of the
+table, weeks without a row counting as zero demand):
+  - adi: average weeks between demands (active weeks / demand weeks)
+  - cv2: squared coefficient of variation of the non-zero demand sizes
+  - zero_ratio: share of active weeks without demand
+  - trend_strength: 1 - Var(remainder) / Var(trend + remainder), linear trend
+  - seasonality_strength: 1 - Var(remainder) / Var(seasonal + remainder),
+    seasonal = mean detrended demand per position in a SEASON_PERIOD-week
+    cycle (a single year of data cannot show yearly seasonality)
+  - sb_class: smooth / erratic / intermittent / lumpy by the Syntetos-Boylan
+    cut-offs (ADI 1.32, CV² 0.49); no_demand for series without demand
+
+legacy_patterns() is the stable / volatile / sparse split of
+TRAIN_V3_1_MODELS.py, computed for all SKUs with one groupby.
+
+Usage:
+    patterns = pattern_stats(sku_weekly_h1, 'sku', value_col='quantity')
+    lookup = patterns.set_index('sku')['sb_class']
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from intermittent import demand_matrix
+
+# Syntetos-Boylan cut-offs
+ADI_CUTOFF = 1.32
+CV2_CUTOFF = 0.49
+
+# Weeks per seasonal cycle (week-of-month ordering rhythm)
+SEASON_PERIOD = 4
+
+STAT_COLUMNS = ['active_weeks', 'demand_weeks', 'mean_demand', 'adi', 'cv2', 'zero_ratio',
+                'trend_strength', 'seasonality_strength', 'sb_class']
+
+
+def _strength(remainder, component_plus_remainder):
+    var_r = np.nanvar(remainder, axis=1)
+    var_total = np.nanvar(component_plus_remainder, axis=1)
+    return np.clip(1 - var_r / np.where(var_total > 0, var_total, np.nan), 0, 1)
+
+
+def sb_class(adi, cv2, demand_weeks):
+    """Syntetos-Boylan class per series (cv2 of a single demand counts as 0)."""
+    cv2 = np.nan_to_num(cv2)
+    frequent = adi < ADI_CUTOFF
+    stable_size = cv2 < CV2_CUTOFF
+    labels = np.where(frequent, np.where(stable_size, 'smooth', 'erratic'),
+                      np.where(stable_size, 'intermittent', 'lumpy'))
+    return np.where(demand_weeks > 0, labels, 'no_demand')
+
+
+def pattern_stats(frame, id_col, value_col='weekly_quantity', week_col='year_week', period=SEASON_PERIOD):
+    """One row per series of frame with the statistics and class above."""
+    keys, weeks, Y = demand_matrix(frame, id_col, value_col, week_col)
+
+    t = np.arange(len(weeks))
+    has_demand = Y > 0
+    first = np.where(has_demand.any(axis=1), has_demand.argmax(axis=1), len(weeks))
+    active = t[None, :] >= first[:, None]
+    demand = has_demand & active
+
+    with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+        warnings.simplefilter('ignore', RuntimeWarning)
+        active_weeks = active.sum(axis=1)
+        demand_weeks = demand.sum(axis=1)
+        Yn = np.where(active, Y, np.nan)
+        sizes = np.where(demand, Y, np.nan)
+        size_mean = np.nanmean(sizes, axis=1)
+        size_std = np.nanstd(sizes, axis=1, ddof=1)
+        cv2 = np.where(demand_weeks > 1, (size_std / size_mean) ** 2, np.nan)
+        adi = np.where(demand_weeks > 0, active_weeks / np.maximum(demand_weeks, 1), np.nan)
+
+        # Linear trend over the active weeks
+        tn = np.where(active, t[None, :], np.nan)
+        t_dev = tn - np.nanmean(tn, axis=1, keepdims=True)
+        y_mean = np.nanmean(Yn, axis=1, keepdims=True)
+        slope = np.nanmean(t_dev * (Yn - y_mean), axis=1, keepdims=True) / np.nanmean(t_dev ** 2, axis=1, keepdims=True)
+        trend = np.nan_to_num(slope) * t_dev
+        detrended = Yn - y_mean - trend
+
+        # Mean detrended demand per cycle position
+        phase = t % period
+        seasonal = np.full_like(Yn, np.nan)
+        for p in range(period):
+            cols = phase == p
+            seasonal[:, cols] = np.nanmean(detrended[:, cols], axis=1, keepdims=True)
+        seasonal = np.where(active, np.nan_to_num(seasonal), np.nan)
+        remainder = detrended - seasonal
+
+        trend_strength = _strength(remainder, remainder + trend)
+        seasonality_strength = _strength(remainder, remainder + seasonal)
+
+    return pd.DataFrame({
+        id_col: keys,
+        'active_weeks': active_weeks,
+        'demand_weeks': demand_weeks,
+        'mean_demand': np.nan_to_num(y_mean[:, 0]),
+        'adi': adi,
+        'cv2': cv2,
+        'zero_ratio': np.where(active_weeks > 0, 1 - demand_weeks / np.maximum(active_weeks, 1), np.nan),
+        'trend_strength': trend_strength,
+        'seasonality_strength': seasonality_strength,
+        'sb_class': sb_class(adi, cv2, demand_weeks),
+    })
+
+
+def legacy_patterns(frame, id_col='sku', value_col='weekly_quantity'):
+    """
+    id -> 'sparse' (over half the rows zero) / 'volatile' (CV > 1.5) / 'stable'
+    over the rows present, as TRAIN_V3_1_MODELS.py classifies SKUs.
+    """
+    values = frame[value_col]
+    grouped = values.groupby(frame[id_col], sort=False)
+    mean, std, total = grouped.mean(), grouped.std(), grouped.size()
+    zero_pct = (values == 0).groupby(frame[id_col], sort=False).sum() / total
+    cv = (std / mean).where(mean > 0, 10)
+    labels = np.where(zero_pct > 0.5, 'sparse', np.where(cv > 1.5, 'volatile', 'stable'))
+    return pd.Series(labels, index=mean.index)
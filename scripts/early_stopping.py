@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Early Stopping
+==============
+Tree counts chosen on the latest weeks of each model's own training rows.
+
+fit_early_stopped(model, X, y) for an unfitted GradientBoostingRegressor:
+  - the last TAIL_FRACTION of the rows (by week_num when X has it, else by
+    position) are held out; the model is fitted on the rest with at most
+    min(model.n_estimators, MAX_TREES) trees, stopping once the held-out
+    absolute error has not improved for PATIENCE trees
+  - the model is then refitted on all rows with the best tree count, so the
+    latest weeks still count for the final model
+  - the chosen count is kept on the model as best_iteration_
+
+Models with fewer than MIN_ROWS rows, or whose tail would hold fewer than
+MIN_TAIL_ROWS rows (one or two rows are too noisy to pick a tree count on), are
+fitted with the cap, unchanged. Per-SKU models with enough rows for a tail
+typically stop after a few trees, so the refit costs far less than the fixed
+count it replaces.
+
+Usage:
+    model = GradientBoostingRegressor(n_estimators=100, max_depth=5, random_state=42)
+    model = fit_early_stopped(model, X_train, y_train, sample_weight)
+    log(tree_summary(models.values()))
+"""
+
+import numpy as np
+
+# Share of each model's rows (latest weeks) held out to pick the tree count
+TAIL_FRACTION = 0.2
+
+# Trees without improvement on the held-out rows before stopping
+PATIENCE = 10
+
+# Models with fewer rows keep the full tree count
+MIN_ROWS = 4
+
+# Held-out rows needed to choose a tree count; smaller tails keep the cap
+MIN_TAIL_ROWS = 3
+
+# Global cap on trees per model
+MAX_TREES = 300
+
+
+class _TailMonitor:
+    """GBR fit monitor: held-out error after each stage, stop after `patience` without a new best."""
+
+    def __init__(self, X_tail, y_tail, patience):
+        self.X_tail = np.asarray(X_tail, dtype=np.float32)
+        self.y_tail = np.asarray(y_tail, dtype=float)
+        self.patience = patience
+        self.raw = None
+        self.losses = []
+
+    def __call__(self, i, model, _locals):
+        if self.raw is None:
+            self.raw = (np.zeros(len(self.X_tail)) if model.init_ == 'zero'
+                        else model.init_.predict(self.X_tail).astype(float))
+        self.raw += model.learning_rate * model.estimators_[i, 0].predict(self.X_tail)
+        self.losses.append(np.mean(np.abs(self.y_tail - self.raw)))
+        return i + 1 - self.best >= self.patience
+
+    @property
+    def best(self):
+        return int(np.argmin(self.losses)) + 1
+
+
+def _tail_mask(X, n_tail, time_col):
+    """Rows of the latest n_tail weeks (among equal weeks, the later rows)."""
+    order = np.arange(len(X))
+    if hasattr(X, 'columns') and time_col in X.columns:
+        order = np.argsort(X[time_col].to_numpy(), kind='stable')
+    tail = np.zeros(len(X), dtype=bool)
+    tail[order[-n_tail:]] = True
+    return tail
+
+
+def _rows(data, mask):
+    if data is None:
+        return None
+    return data[mask] if isinstance(data, np.ndarray) else data.iloc[np.flatnonzero(mask)]
+
+
+def fit_early_stopped(model, X, y, sample_weight=None, tail_fraction=TAIL_FRACTION, patience=PATIENCE,
+                      min_rows=MIN_ROWS, max_trees=MAX_TREES, time_col='week_num', min_tail=MIN_TAIL_ROWS):
+    """Fit model with its tree count chosen on the latest rows (see module docstring)."""
+    cap = min(model.n_estimators, max_trees)
+    n_tail = int(round(len(X) * tail_fraction))
+    if len(X) < min_rows or n_tail < min_tail or len(X) - n_tail < 2:
+        model.set_params(n_estimators=cap)
+        model.fit(X, y, sample_weight=sample_weight)
+        model.best_iteration_ = cap
+        return model
+
+    tail = _tail_mask(X, n_tail, time_col)
+    weight = np.asarray(sample_weight) if sample_weight is not None else None
+    monitor = _TailMonitor(_rows(X, tail), _rows(y, tail), patience)
+    model.set_params(n_estimators=cap)
+    model.fit(_rows(X, ~tail), _rows(y, ~tail),
+              sample_weight=_rows(weight, ~tail), monitor=monitor)
+
+    best = monitor.best
+    model.set_params(n_estimators=best)
+    model.fit(X, y, sample_weight=sample_weight)
+    model.best_iteration_ = best
+    return model
+
+
+def tree_summary(models):
+    """One-line tree count report for the training log."""
+    counts = np.array([getattr(m, 'best_iteration_', m.n_estimators) for m in models if m is not None])
+    if len(counts) == 0:
+        return "Trees: no models"
+    return (f"Trees: {counts.sum():,} over {len(counts)} models "
+            f"(median {np.median(counts):.0f}, max {counts.max()} per model)")
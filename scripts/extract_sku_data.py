@@ -19,6 +19,9 @@ import warnings
 import re
 warnings.filterwarnings('ignore')
 
+from product_dim import attach_product_attrs, build_product_dimension
+from product_dim import load_product_master as load_product_master_csv
+
 # Configuration
 BASE_PATH = Path("/sessions/affectionate-pensive-goodall/mnt/demand planning")
 DATA_PATH = BASE_PATH / "2025"
@@ -236,13 +239,11 @@ def extract_lineitems_from_file(filepath, region, month_date):
     return lineitems
 
 def load_product_master():
-    """Load product master data."""
+    """Load product master data keyed by normalised SKU (empty if missing)."""
     products_file = BASE_PATH / "features" / "dim_products.csv"
     if products_file.exists():
-        df = pd.read_csv(products_file)
-        df['sku_clean'] = df['sku'].str.replace('ACP-', '', regex=False)
-        return df.set_index('sku_clean').to_dict('index')
-    return {}
+        return load_product_master_csv(products_file)
+    return pd.DataFrame(columns=['sku', 'sku_clean'])
 
 def extract_all_lineitems():
     """Extract line items from all regional files."""
@@ -286,7 +287,7 @@ def extract_all_lineitems():
 
     return pd.DataFrame(all_lineitems)
 
-def engineer_sku_features(df_lineitems, products_lookup):
+def engineer_sku_features(df_lineitems, products):
     """Engineer features at SKU level."""
     print("\n" + "=" * 60)
     print("FEATURE ENGINEERING - SKU LEVEL")
@@ -334,19 +335,8 @@ def engineer_sku_features(df_lineitems, products_lookup):
     sku_weekly['quantity_diff_1w'] = sku_weekly.groupby('sku')['weekly_quantity'].diff()
     sku_weekly['price_change'] = sku_weekly.groupby('sku')['avg_price'].diff()
 
-    # Add product attributes
-    def get_product_attr(sku, attr, default='Unknown'):
-        sku_clean = str(sku)
-        if sku_clean in products_lookup:
-            val = products_lookup[sku_clean].get(attr, default)
-            return val if pd.notna(val) else default
-        return default
-
-    sku_weekly['brand'] = sku_weekly['sku'].apply(lambda x: get_product_attr(x, 'brand'))
-    sku_weekly['category'] = sku_weekly['sku'].apply(
-        lambda x: get_product_attr(x, 'categories', '').split('/')[-1] if get_product_attr(x, 'categories') else 'Unknown'
-    )
-    sku_weekly['manufacturer'] = sku_weekly['sku'].apply(lambda x: get_product_attr(x, 'manufacturer'))
+    # Add product attributes (brand, leaf category, manufacturer)
+    sku_weekly = attach_product_attrs(sku_weekly, products)
 
     print(f"Generated {len(sku_weekly)} SKU-week records")
     print(f"Unique SKUs: {sku_weekly['sku'].nunique()}")
@@ -354,7 +344,7 @@ def engineer_sku_features(df_lineitems, products_lookup):
 
     return sku_weekly
 
-def engineer_category_features(df_lineitems, products_lookup):
+def engineer_category_features(df_lineitems, products):
     """Engineer features at category level."""
     print("\n" + "=" * 60)
     print("FEATURE ENGINEERING - CATEGORY LEVEL")
@@ -363,16 +353,7 @@ def engineer_category_features(df_lineitems, products_lookup):
     df_lineitems['order_date'] = pd.to_datetime(df_lineitems['order_date'])
     df_lineitems['year_week'] = df_lineitems['order_date'].dt.strftime('%Y-W%V')
 
-    def get_category(sku):
-        sku_clean = str(sku)
-        if sku_clean in products_lookup:
-            cats = products_lookup[sku_clean].get('categories', '')
-            if cats and pd.notna(cats):
-                parts = cats.split('/')
-                return parts[-1] if parts else 'Unknown'
-        return 'Unknown'
-
-    df_lineitems['category'] = df_lineitems['sku'].apply(get_category)
+    df_lineitems['category'] = attach_product_attrs(df_lineitems[['sku']], products, attrs=())['category']
 
     cat_weekly = df_lineitems.groupby(['year_week', 'category']).agg({
         'quantity': 'sum',
@@ -406,7 +387,7 @@ def engineer_category_features(df_lineitems, products_lookup):
 
     return cat_weekly
 
-def create_product_dimension(df_lineitems, products_lookup):
+def create_product_dimension(df_lineitems, products):
     """Create product dimension table."""
     print("\n" + "=" * 60)
     print("CREATING PRODUCT DIMENSION")
@@ -414,44 +395,7 @@ def create_product_dimension(df_lineitems, products_lookup):
 
     unique_skus = df_lineitems[['sku', 'description']].drop_duplicates()
 
-    def enrich_sku(row):
-        sku_clean = str(row['sku'])
-        if sku_clean in products_lookup:
-            master = products_lookup[sku_clean]
-            return pd.Series({
-                'sku': f"ACP-{sku_clean}",
-                'name': master.get('name', row['description']),
-                'brand': master.get('brand', 'Unknown'),
-                'manufacturer': master.get('manufacturer', 'Unknown'),
-                'category_path': master.get('categories', ''),
-                'price': master.get('price', 0),
-                'fmcg': master.get('fmcg', 'Unknown')
-            })
-        return pd.Series({
-            'sku': f"ACP-{sku_clean}",
-            'name': row['description'],
-            'brand': 'Unknown',
-            'manufacturer': 'Unknown',
-            'category_path': '',
-            'price': 0,
-            'fmcg': 'Unknown'
-        })
-
-    products_df = unique_skus.apply(enrich_sku, axis=1)
-
-    def extract_categories(path):
-        if not path or pd.isna(path):
-            return 'Unknown', 'Unknown', 'Unknown'
-        parts = [p.strip() for p in str(path).split('/') if p.strip()]
-        cat_l1 = parts[1] if len(parts) > 1 else 'Unknown'
-        cat_l2 = parts[2] if len(parts) > 2 else cat_l1
-        cat_l3 = parts[-1] if len(parts) > 0 else 'Unknown'
-        return cat_l1, cat_l2, cat_l3
-
-    cats = products_df['category_path'].apply(extract_categories)
-    products_df['category_l1'] = [c[0] for c in cats]
-    products_df['category_l2'] = [c[1] for c in cats]
-    products_df['category_l3'] = [c[2] for c in cats]
+    products_df = build_product_dimension(unique_skus, products)
 
     print(f"Created product dimension with {len(products_df)} SKUs")
     print(f"Category L1 count: {products_df['category_l1'].nunique()}")
@@ -460,8 +404,8 @@ def create_product_dimension(df_lineitems, products_lookup):
 
 def main():
     print("Loading product master data...")
-    products_lookup = load_product_master()
-    print(f"Loaded {len(products_lookup)} products from master")
+    products = load_product_master()
+    print(f"Loaded {len(products)} products from master")
 
     df_lineitems = extract_all_lineitems()
 
@@ -480,9 +424,9 @@ def main():
     print(f"\nBy Region:")
     print(df_lineitems.groupby('region_name')['quantity'].sum().to_string())
 
-    sku_weekly = engineer_sku_features(df_lineitems.copy(), products_lookup)
-    cat_weekly = engineer_category_features(df_lineitems.copy(), products_lookup)
-    products_df = create_product_dimension(df_lineitems, products_lookup)
+    sku_weekly = engineer_sku_features(df_lineitems.copy(), products)
+    cat_weekly = engineer_category_features(df_lineitems.copy(), products)
+    products_df = create_product_dimension(df_lineitems, products)
 
     print("\n" + "=" * 60)
     print("SAVING OUTPUTS")
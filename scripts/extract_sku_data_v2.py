@@ -18,16 +18,29 @@ Output files:
   - v2_features_category.csv  - Category × Week
   - v2_dim_customers.csv      - Customer dimension with buyer type
   - v2_dim_products.csv       - Product dimension with price history
-  - v2_week_completeness.csv  - Data quality flags
+  - v2_week_completeness.csv  - Data quality flags and coverage scores
+  - v2_week_region_completeness.csv - Week × region coverage scores
+  - schema_dictionaries.json  - Shared key dictionaries (see schema.py)
+  - state/                    - Trailing per-series state for --incremental
+
+Run with --incremental to append only the weeks after the last stored week
+(reads only the months from that week on; see feature_store.py).
 """
 
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from datetime import datetime, timedelta
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+from aggregation import aggregate_levels
+from completeness import REGION_TABLE_FILE, broadcast, coverage_scores, week_region_counts
+from feature_store import WeeklyFeatureStore, classify_buyer, classify_cycle, segment_customer
+from product_dim import attach_product_attrs
+from schema import Schema
+
 # Configuration
 SCRIPT_DIR = Path(__file__).parent.resolve()
 BASE_PATH = SCRIPT_DIR.parent  # demand planning folder
@@ -47,6 +60,58 @@ REGIONS = {
     'limpopo': 'Polokwane'
 }
 
+# Output tables aggregated from the fact table: name -> (keys, out_col -> (source_col, func))
+AGGREGATION_LEVELS = {
+    'sku_customer_week': (['sku', 'customer_id', 'year_week'], {
+        'weekly_quantity': ('quantity', 'sum'),
+        'avg_unit_price': ('unit_price', 'mean'),
+        'weekly_revenue': ('line_total', 'sum'),
+        'order_count': ('invoice_id', 'nunique'),
+        'customer_name': ('customer_name', 'first'),
+        'customer_segment': ('customer_segment', 'first'),
+        'buyer_type': ('buyer_type', 'first'),
+        'data_completeness': ('data_completeness', 'first')
+    }),
+    'sku_week': (['sku', 'year_week'], {
+        'weekly_quantity': ('quantity', 'sum'),
+        'avg_unit_price': ('unit_price', 'mean'),
+        'weekly_revenue': ('line_total', 'sum'),
+        'order_count': ('invoice_id', 'nunique'),
+        'unique_customers': ('customer_id', 'nunique'),
+        'description': ('description', 'first'),
+        'data_completeness': ('data_completeness', 'first')
+    }),
+    'category_week': (['category_l1', 'year_week'], {
+        'weekly_quantity': ('quantity', 'sum'),
+        'avg_unit_price': ('unit_price', 'mean'),
+        'weekly_revenue': ('line_total', 'sum'),
+        'unique_skus': ('sku', 'nunique'),
+        'order_count': ('invoice_id', 'nunique'),
+        'data_completeness': ('data_completeness', 'first')
+    }),
+    'product': (['sku'], {
+        'name': ('description', 'first'),
+        'avg_price': ('unit_price', 'mean'),
+        'min_price': ('unit_price', 'min'),
+        'max_price': ('unit_price', 'max'),
+        'price_std': ('unit_price', 'std'),
+        'total_quantity': ('quantity', 'sum'),
+        'total_revenue': ('line_total', 'sum'),
+        'total_orders': ('invoice_id', 'nunique'),
+        'active_weeks': ('year_week', 'nunique')
+    }),
+    'week': (['year_week'], {
+        'invoice_count': ('invoice_id', 'nunique'),
+        'total_quantity': ('quantity', 'sum'),
+        'total_revenue': ('line_total', 'sum'),
+        'unique_skus': ('sku', 'nunique'),
+        'unique_customers': ('customer_id', 'nunique'),
+        'regions_active': ('region_name', 'nunique'),
+        'data_completeness': ('data_completeness', 'first'),
+        'prices_captured': ('price_captured', 'sum')  # Count non-zero prices
+    })
+}
+
 
 def detect_price_column(df):
     """Detect price column with flexible matching"""
@@ -368,19 +433,10 @@ def calculate_buying_cycles(df):
             std_days = np.std(gaps) if len(gaps) > 1 else 0
 
             # Classify regularity
-            if avg_days_between <= 7 and std_days < 3:
-                cycle_regularity = 'Weekly'
-            elif avg_days_between <= 14 and std_days < 5:
-                cycle_regularity = 'Bi-weekly'
-            elif avg_days_between <= 35 and std_days < 10:
-                cycle_regularity = 'Monthly'
-            elif std_days > 20:
-                cycle_regularity = 'Irregular'
-            else:
-                cycle_regularity = 'Sporadic'
+            cycle_regularity = classify_cycle(avg_days_between, std_days)
 
         # Get SKU patterns
-        top_skus = cust_data.groupby('sku')['quantity'].sum().nlargest(5).index.tolist()
+        top_skus = cust_data.groupby('sku', observed=True)['quantity'].sum().nlargest(5).index.tolist()
 
         # Get total metrics
         total_orders = cust_data['invoice_id'].nunique()
@@ -389,16 +445,7 @@ def calculate_buying_cycles(df):
         avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
 
         # Classify buyer type
-        if total_units > 100000:
-            buyer_type = 'Bulk Buyer'
-        elif avg_order_value > 50000:
-            buyer_type = 'High-Value Buyer'
-        elif total_orders >= 40:
-            buyer_type = 'Frequent Buyer'
-        elif total_orders >= 10:
-            buyer_type = 'Regular Buyer'
-        else:
-            buyer_type = 'Occasional Buyer'
+        buyer_type = classify_buyer(total_units, avg_order_value, total_orders)
 
         cycles.append({
             'customer_id': customer_id,
@@ -423,7 +470,7 @@ def calculate_buying_cycles(df):
 def create_price_history(df):
     """Create SKU × Week price history table"""
     # Group by SKU and week, capture all price points
-    price_data = df[df['unit_price'] > 0].groupby(['sku', 'year_week']).agg({
+    price_data = df[df['unit_price'] > 0].groupby(['sku', 'year_week'], observed=True).agg({
         'unit_price': ['mean', 'min', 'max', 'std', 'count'],
         'quantity': 'sum',
         'line_total': 'sum'
@@ -444,20 +491,56 @@ def create_price_history(df):
     return price_data
 
 
-def segment_customer(row):
-    """Classify customer by buying behavior"""
-    total_units = row.get('total_units', 0)
-    total_orders = row.get('total_orders', 0)
-    avg_order = total_units / total_orders if total_orders > 0 else 0
+DIM_CUSTOMER_COLUMNS = ['customer_id', 'customer_name', 'primary_region',
+                        'total_orders', 'total_units', 'total_revenue',
+                        'avg_order_value', 'avg_days_between_orders',
+                        'cycle_regularity', 'buyer_type', 'customer_segment',
+                        'first_order', 'last_order', 'active_weeks']
+
+
+def load_v1_products():
+    """v1 product dimension (first row per SKU) for the category hierarchy."""
+    products_v1 = pd.read_csv(BASE_PATH / 'features_v1' / 'v1_dim_products.csv')
+    # Handle duplicate SKUs by keeping first occurrence
+    return products_v1, products_v1.drop_duplicates(subset='sku', keep='first')
+
+
+def add_categories(df, products_v1_dedup):
+    """Attach category_l1 / category_l2 to the fact table."""
+    categories = attach_product_attrs(df[['sku']], products_v1_dedup, attrs=('category_l1', 'category_l2'), category_col=None)
+    df['category_l1'] = categories['category_l1']
+    df['category_l2'] = categories['category_l2']
+    return df
+
 
-    if total_units > 100000 or avg_order > 10000:
-        return 'Bulk/Wholesale'
-    elif avg_order > 2000:
-        return 'Large Retailer'
-    elif avg_order > 500:
-        return 'Medium Retailer'
-    else:
-        return 'Small Retailer'
+def first_month(year_week):
+    """
+    First month to reread for a '%Y-W%V' week label: the month of its Monday,
+    or January when the ISO week starts in the previous year.
+    """
+    monday = datetime.strptime(year_week + '-1', '%G-W%V-%u')
+    return monday.month if monday.year == int(year_week[:4]) else 1
+
+
+def run_incremental(store, df, latest_week):
+    """Append the weeks after latest_week to the feature tables from the store state."""
+    new_weeks = sorted(w for w in df['year_week'].dropna().unique() if w > latest_week)
+    print(f"\n📊 Appending {len(new_weeks)} week(s) after {latest_week}...")
+    _, products_v1_dedup = load_v1_products()
+    df = add_categories(df, products_v1_dedup)
+
+    # Stored weeks reread with the new ones are checked for late lines, then skipped
+    print(f"\n💾 Appending to {OUTPUT_DIR}...")
+    customer_cycles = store.append(df, AGGREGATION_LEVELS)
+    if customer_cycles is None:
+        print(f"\n✅ No weeks after {latest_week} - feature tables are current")
+        return
+
+    customer_cycles.to_csv(OUTPUT_DIR / 'v2_customer_cycles.csv', index=False)
+    print(f"   v2_customer_cycles.csv: {len(customer_cycles):,} rows")
+    customer_cycles[DIM_CUSTOMER_COLUMNS].to_csv(OUTPUT_DIR / 'v2_dim_customers.csv', index=False)
+    print(f"   v2_dim_customers.csv: {len(customer_cycles):,} rows")
+    print("   (v2_dim_products.csv is refreshed on full runs)")
 
 
 def main():
@@ -469,6 +552,12 @@ def main():
     # Create output directory
     OUTPUT_DIR.mkdir(exist_ok=True)
 
+    # --incremental: only read months from the last stored week onwards
+    store = WeeklyFeatureStore(OUTPUT_DIR)
+    incremental = '--incremental' in sys.argv and store.exists()
+    latest_week = store.latest_week() if incremental else None
+    start_month = first_month(latest_week) if incremental else 1
+
     # Find all source files
     data_path = BASE_PATH / '2025'
     all_line_items = []
@@ -482,6 +571,8 @@ def main():
         month_name = month_folder.name.replace(' 2025', '')
         if month_name not in MONTHS:
             continue
+        if MONTHS.index(month_name) + 1 < start_month:
+            continue
 
         print(f"\n📁 Processing {month_folder.name}...")
 
@@ -507,22 +598,20 @@ def main():
     # Create main DataFrame
     df = pd.DataFrame(all_line_items)
 
-    # === CREATE OUTPUTS ===
+    if incremental:
+        run_incremental(store, df, latest_week)
+        return
 
-    # 1. Fact table with data completeness
-    print("\n📊 Creating fact table...")
-    week_counts = df.groupby('year_week').size()
-    median_count = week_counts.median()
+    # === CREATE OUTPUTS ===
 
-    def get_completeness(week):
-        count = week_counts.get(week, 0)
-        if count >= median_count * 0.8:
-            return 'complete'
-        elif count >= median_count * 0.3:
-            return 'partial'
-        return 'minimal'
+    # Keys as categoricals over shared dictionaries (saved for later stages)
+    schema = Schema()
+    df = schema.encode(df)
 
-    df['data_completeness'] = df['year_week'].apply(get_completeness)
+    # 1. Fact table with data completeness (scored per week × region, joined on week codes)
+    print("\n📊 Creating fact table...")
+    week_scores, week_region_scores = coverage_scores(week_region_counts(df))
+    df['data_completeness'] = broadcast(df, week_scores, 'data_completeness')
 
     # 2. Price History Table
     print("📊 Creating price history table...")
@@ -543,21 +632,17 @@ def main():
     df['customer_segment'] = df['customer_id'].map(segment_map)
     df['buyer_type'] = df['customer_id'].map(buyer_type_map)
 
+    # Category hierarchy for the category level
+    products_v1, products_v1_dedup = load_v1_products()
+    df = add_categories(df, products_v1_dedup)
+
+    # 4-9. Every SKU / customer / category / week aggregate in one pass
+    print("📊 Aggregating SKU, SKU×Customer, category, product and week levels...")
+    tables = aggregate_levels(df.assign(price_captured=df['unit_price'] > 0), AGGREGATION_LEVELS)
+
     # 4. Weekly Features with Price
     print("📊 Creating weekly features...")
-    weekly_features = df.groupby(['sku', 'year_week']).agg({
-        'quantity': 'sum',
-        'unit_price': 'mean',
-        'line_total': 'sum',
-        'invoice_id': 'nunique',
-        'customer_id': 'nunique',
-        'description': 'first',
-        'data_completeness': 'first'
-    }).reset_index()
-
-    weekly_features.columns = ['sku', 'year_week', 'weekly_quantity', 'avg_unit_price',
-                               'weekly_revenue', 'order_count', 'unique_customers',
-                               'description', 'data_completeness']
+    weekly_features = tables['sku_week']
 
     # Add lag features
     weekly_features = weekly_features.sort_values(['sku', 'year_week'])
@@ -578,71 +663,23 @@ def main():
 
     # 5. SKU × Customer × Week Features
     print("📊 Creating SKU×Customer features...")
-    sku_customer = df.groupby(['sku', 'customer_id', 'year_week']).agg({
-        'quantity': 'sum',
-        'unit_price': 'mean',
-        'line_total': 'sum',
-        'invoice_id': 'nunique',
-        'customer_name': 'first',
-        'customer_segment': 'first',
-        'buyer_type': 'first',
-        'data_completeness': 'first'
-    }).reset_index()
-
-    sku_customer.columns = ['sku', 'customer_id', 'year_week', 'weekly_quantity',
-                            'avg_unit_price', 'weekly_revenue', 'order_count',
-                            'customer_name', 'customer_segment', 'buyer_type', 'data_completeness']
+    sku_customer = tables['sku_customer_week']
 
     # 6. Category Features
     print("📊 Creating category features...")
-    # Load product dimension for categories
-    products_v1 = pd.read_csv(BASE_PATH / 'features_v1' / 'v1_dim_products.csv')
-    # Handle duplicate SKUs by keeping first occurrence
-    products_v1_dedup = products_v1.drop_duplicates(subset='sku', keep='first')
-    sku_category = products_v1_dedup.set_index('sku')[['category_l1', 'category_l2']].to_dict('index')
-
-    df['category_l1'] = df['sku'].astype(str).map(lambda x: sku_category.get(int(x), {}).get('category_l1', 'Unknown') if x.isdigit() else 'Unknown')
-    df['category_l2'] = df['sku'].astype(str).map(lambda x: sku_category.get(int(x), {}).get('category_l2', 'Unknown') if x.isdigit() else 'Unknown')
-
-    category_features = df.groupby(['category_l1', 'year_week']).agg({
-        'quantity': 'sum',
-        'unit_price': 'mean',
-        'line_total': 'sum',
-        'sku': 'nunique',
-        'invoice_id': 'nunique',
-        'data_completeness': 'first'
-    }).reset_index()
-
-    category_features.columns = ['category', 'year_week', 'weekly_quantity', 'avg_unit_price',
-                                  'weekly_revenue', 'unique_skus', 'order_count', 'data_completeness']
+    category_features = tables['category_week'].rename(columns={'category_l1': 'category'})
 
     # 7. Customer Dimension
     print("📊 Creating customer dimension...")
-    dim_customers = customer_cycles[['customer_id', 'customer_name', 'primary_region',
-                                      'total_orders', 'total_units', 'total_revenue',
-                                      'avg_order_value', 'avg_days_between_orders',
-                                      'cycle_regularity', 'buyer_type', 'customer_segment',
-                                      'first_order', 'last_order', 'active_weeks']].copy()
+    dim_customers = customer_cycles[DIM_CUSTOMER_COLUMNS].copy()
 
     # 8. Product Dimension with Price Stats
     print("📊 Creating product dimension...")
-    product_stats = df.groupby('sku').agg({
-        'description': 'first',
-        'unit_price': ['mean', 'min', 'max', 'std'],
-        'quantity': 'sum',
-        'line_total': 'sum',
-        'invoice_id': 'nunique',
-        'year_week': 'nunique'
-    }).reset_index()
-
-    product_stats.columns = ['sku', 'name', 'avg_price', 'min_price', 'max_price',
-                             'price_std', 'total_quantity', 'total_revenue',
-                             'total_orders', 'active_weeks']
+    product_stats = tables['product']
 
-    # Merge with existing product info (convert both to string for merge)
-    product_stats['sku'] = product_stats['sku'].astype(str)
-    products_v1['sku'] = products_v1['sku'].astype(str)
-    products_merged = product_stats.merge(
+    # Merge with existing product info (on the shared SKU codes)
+    products_merged = schema.merge(
+        product_stats,
         products_v1[['sku', 'brand', 'manufacturer', 'category_path', 'fmcg',
                      'category_l1', 'category_l2', 'category_l3']],
         on='sku', how='left'
@@ -654,23 +691,11 @@ def main():
 
     # 9. Week Completeness
     print("📊 Creating week completeness table...")
-    week_completeness = df.groupby('year_week').agg({
-        'invoice_id': 'nunique',
-        'quantity': 'sum',
-        'line_total': 'sum',
-        'sku': 'nunique',
-        'customer_id': lambda x: x.dropna().nunique(),
-        'region_name': 'nunique',
-        'data_completeness': 'first',
-        'unit_price': lambda x: (x > 0).sum()  # Count non-zero prices
-    }).reset_index()
-
-    week_completeness.columns = ['year_week', 'invoice_count', 'total_quantity',
-                                  'total_revenue', 'unique_skus', 'unique_customers',
-                                  'regions_active', 'data_completeness', 'prices_captured']
+    week_completeness = tables['week']
 
     week_completeness['price_coverage'] = (week_completeness['prices_captured'] /
                                             week_completeness['invoice_count'] * 100).round(1)
+    week_completeness['coverage_score'] = broadcast(week_completeness, week_scores, 'coverage_score')
 
     # === SAVE OUTPUTS ===
     print(f"\n💾 Saving to {OUTPUT_DIR}...")
@@ -702,6 +727,16 @@ def main():
     week_completeness.to_csv(OUTPUT_DIR / 'v2_week_completeness.csv', index=False)
     print(f"   v2_week_completeness.csv: {len(week_completeness):,} rows")
 
+    week_region_scores.to_csv(OUTPUT_DIR / REGION_TABLE_FILE, index=False)
+    print(f"   {REGION_TABLE_FILE}: {len(week_region_scores):,} rows")
+
+    schema.save(OUTPUT_DIR)
+    print(f"   schema_dictionaries.json: {len(schema.dictionaries)} key dictionaries")
+
+    # Trailing state for --incremental refreshes
+    store.initialise(df, weekly_features, price_history)
+    print(f"   state/: trailing state up to {store.latest_week()}")
+
     # === SUMMARY ===
     print(f"\n{'=' * 60}")
     print("V2 EXTRACTION SUMMARY")
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Feature Materialisation Cache
+=============================
+Derived training frames cached on disk, keyed by content.
+
+A cached frame is identified by:
+  - the SHA-256 of every input file's bytes (a missing input counts as absent)
+  - the code of the load function and of each feature group applied, plus
+    what they depend on by value (closures, constants, feature graphs, classes
+    and the pipeline functions they call, followed recursively)
+  - the source of every scripts/ helper module they reach - through a
+    function, class, instance or module reference - and of the scripts/
+    modules those import, so method and attribute calls (schema.read_csv,
+    graph.compute) are covered too
+
+so a training run only pays the feature cost when an input or a feature
+function changed. Frames are stored as pickles (binary and dtype-preserving,
+no extra dependency). Each feature group is stored on its own as the columns
+it added or changed plus the resulting row order:
+  - adding a group at the end computes only that group
+  - editing a group recomputes it and the groups after it
+
+Usage:
+    cache = FeatureCache(FEATURES_DIR / 'cache', refresh='--no-feature-cache' in sys.argv)
+    weekly = cache.read_csv(FEATURES_DIR / 'v2_features_weekly.csv')
+    products = cache.read_csv(FEATURES_DIR / 'v2_dim_products.csv', schema=schema)  # keys encoded
+
+    weekly = cache.materialise(
+        'v3_1_weekly', [FEATURES_DIR / 'v2_features_weekly.csv'],
+        load=lambda: pd.read_csv(FEATURES_DIR / 'v2_features_weekly.csv'),
+        groups=[('v3_1', add_v3_1_features)])
+    log(cache.summary())
+
+Only the latest key of each step is kept; the cache directory can be
+deleted at any time.
+
+share_in_memory() additionally keeps every step's frame in this process (and
+in processes forked from it) for all FeatureCache instances, so several
+training scripts run in one process (TRAIN_ALL_VERSIONS.py) load and feature
+each frame once. Callers get their own frame object: a shallow copy under
+pandas copy-on-write, a deep copy otherwise.
+"""
+
+import hashlib
+import inspect
+import os
+import re
+from pathlib import Path
+
+import pandas as pd
+
+# Bump to invalidate every cached frame (e.g. after a storage layout change)
+CACHE_VERSION = '1'
+
+# Step path -> frame for every cache in this process, once share_in_memory() is called
+_MEMORY = None
+_DIGESTS = {}
+
+# Shallow copies are independent frames only under copy-on-write (always on from pandas 3)
+_COPY_ON_WRITE = int(pd.__version__.split('.')[0]) >= 3 or pd.get_option('mode.copy_on_write') is True
+
+
+def share_in_memory():
+    """Keep materialised frames in memory for every FeatureCache of this process."""
+    global _MEMORY
+    if _MEMORY is None:
+        _MEMORY = {}
+
+
+def memory_bytes():
+    """Bytes held by the in-memory frames (0 unless share_in_memory() was called)."""
+    return sum(int(df.memory_usage(deep=True).sum()) for df in (_MEMORY or {}).values())
+
+
+def _handout(df):
+    """A frame the caller can modify without touching the shared one."""
+    return df.copy(deep=not _COPY_ON_WRITE)
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 of a file's bytes (remembered by size and mtime while sharing in memory)."""
+    if not os.path.exists(path):
+        return 'missing'
+    if _MEMORY is not None:
+        stat = os.stat(path)
+        stamp = (str(path), stat.st_size, stat.st_mtime_ns)
+        if stamp not in _DIGESTS:
+            _DIGESTS[stamp] = _file_digest(path, chunk_size)
+        return _DIGESTS[stamp]
+    return _file_digest(path, chunk_size)
+
+
+def _file_digest(path, chunk_size):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _code(code):
+    """Bytecode, names and constants of a code object (nested code included)."""
+    consts = [_code(c) if inspect.iscode(c) else repr(c) for c in code.co_consts]
+    return f"{code.co_code.hex()}|{code.co_names}|{code.co_varnames}|{consts}"
+
+
+def _source(obj):
+    # A lambda's source is its whole enclosing line, so hash its bytecode instead
+    if inspect.isfunction(obj) and obj.__name__ == '<lambda>':
+        return _code(obj.__code__)
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        return getattr(obj, '__qualname__', type(obj).__name__)
+
+
+# Functions defined here (the pipeline scripts) are followed recursively
+SCRIPTS_DIR = Path(__file__).parent.resolve()
+
+
+def _is_local(obj):
+    try:
+        return Path(inspect.getsourcefile(obj)).resolve().parent == SCRIPTS_DIR
+    except TypeError:
+        return False
+
+
+def _module(module, seen):
+    """Source of a scripts/ module plus that of the scripts/ modules it imports."""
+    if module in seen:
+        return module.__name__
+    seen.add(module)
+    parts = [inspect.getsource(module)]
+    for value in list(vars(module).values()):
+        dep = value if inspect.ismodule(value) else \
+            inspect.getmodule(value) if inspect.isfunction(value) or inspect.isclass(value) else None
+        if dep is not None and dep is not module and _is_local(dep):
+            parts.append(_module(dep, seen))
+    return '\n'.join(parts)
+
+
+def _local(value, seen, root):
+    """Digest text of a scripts/ function or class: followed in root's module, whole module elsewhere."""
+    if value.__module__ != root:
+        return _module(inspect.getmodule(value), seen)
+    if inspect.isclass(value):
+        methods = [v for v in vars(value).values() if inspect.isfunction(v)]
+        return '\n'.join([_source(value)] + [_function(v, seen, root) for v in methods])
+    return _function(value, seen, root)
+
+
+def _value(value, seen, root):
+    """Stable text for a value a function depends on (no object addresses)."""
+    if isinstance(value, (str, int, float, bool, type(None))):
+        return repr(value)
+    if isinstance(value, (set, frozenset)):
+        return f"set({sorted(_value(v, seen, root) for v in value)})"
+    if isinstance(value, (list, tuple)):
+        return f"{type(value).__name__}({[_value(v, seen, root) for v in value]})"
+    if isinstance(value, dict):
+        return repr({k: _value(v, seen, root) for k, v in value.items()})
+    if inspect.ismodule(value):
+        return _module(value, seen) if _is_local(value) else value.__name__
+    if inspect.isfunction(value) or inspect.isclass(value):
+        return _local(value, seen, root) if _is_local(value) else _source(value)
+    # Instances: their class's code (scripts/ classes) plus their fingerprint
+    parts = [_local(type(value), seen, root) if _is_local(type(value)) else type(value).__name__]
+    if hasattr(value, 'fingerprint'):
+        parts.append(value.fingerprint())
+    return '\n'.join(parts)
+
+
+def _function(fn, seen, root):
+    """Code of fn plus its closure variables and referenced globals."""
+    if fn in seen:
+        return fn.__qualname__
+    seen.add(fn)
+    parts = [_source(fn)]
+    for cell in fn.__closure__ or ():
+        try:
+            parts.append(_value(cell.cell_contents, seen, root))
+        except ValueError:
+            continue
+    for name in fn.__code__.co_names:
+        if name in fn.__globals__:
+            parts.append(_value(fn.__globals__[name], seen, root))
+    return '\n'.join(parts)
+
+
+def function_digest(fn):
+    """
+    Hash of fn's code plus what it depends on by value: closure variables,
+    partial arguments and referenced globals (constants by value, feature
+    graphs by fingerprint, classes and library functions by source).
+    Functions of fn's own module are followed recursively; anything reached
+    in another scripts/ module brings in that module's whole source (and the
+    scripts/ modules it imports).
+    """
+    seen = set()
+    parts = []
+    if hasattr(fn, 'func'):  # functools.partial
+        root = getattr(fn.func, '__module__', None)
+        parts += [_value(fn.args, seen, root), _value(fn.keywords, seen, root)]
+        fn = fn.func
+    root = getattr(fn, '__module__', None)
+    parts.append(_function(fn, seen, root) if inspect.isfunction(fn) else _source(fn))
+    return _key(*parts)
+
+
+def _key(*parts):
+    return hashlib.sha256('\x00'.join(str(p) for p in parts).encode()).hexdigest()[:16]
+
+
+def _delta(before, after):
+    """Columns of after that are new or differ from before, plus after's layout."""
+    aligned = before.reindex(after.index) if not before.index.equals(after.index) else before
+    changed = [c for c in after.columns
+               if c not in aligned.columns or not after[c].equals(aligned[c])]
+    return {'index': after.index, 'columns': list(after.columns), 'data': after[changed]}
+
+
+def _apply_delta(df, delta):
+    """Rebuild a feature group's output from its input frame and stored delta."""
+    data = delta['data']
+    base = df.reindex(delta['index']) if not df.index.equals(delta['index']) else df
+    base = base.drop(columns=[c for c in data.columns if c in base.columns])
+    return pd.concat([base, data], axis=1)[delta['columns']]
+
+
+class FeatureCache:
+    """Content-addressed store of loaded frames and feature groups."""
+
+    def __init__(self, cache_dir, refresh=False):
+        self.cache_dir = Path(cache_dir)
+        self.refresh = refresh
+        self.hits = []
+        self.computed = []
+        self.shared = []
+
+    def _path(self, name, key):
+        return self.cache_dir / f'{name}-{key}.pkl'
+
+    def _load(self, path):
+        if self.refresh or not path.exists():
+            return None
+        try:
+            return pd.read_pickle(path)
+        except Exception:
+            # Partial or unreadable file: recompute and overwrite
+            return None
+
+    def _recall(self, path, step):
+        """Frame of a step already materialised in this process (share_in_memory)."""
+        if _MEMORY is None or path not in _MEMORY:
+            return None
+        self.shared.append(step)
+        return _MEMORY[path]
+
+    def _remember(self, path, df):
+        if _MEMORY is not None:
+            _MEMORY[path] = df
+
+    def _store(self, path, obj):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        pd.to_pickle(obj, tmp)
+        os.replace(tmp, path)
+
+        # Older keys of the same step are superseded
+        stem = re.escape(path.stem.rsplit('-', 1)[0])
+        for old in self.cache_dir.glob('*.pkl'):
+            if old != path and re.fullmatch(rf'{stem}-[0-9a-f]{{16}}\.pkl', old.name):
+                old.unlink()
+
+    def materialise(self, name, inputs, load, groups=()):
+        """
+        Frame from load() with each feature group applied, cached per step.
+
+        inputs: files load() reads (their bytes key the cache).
+        groups: ordered (group name, fn) pairs; fn(df) returns df with the
+                group's columns added or changed.
+        """
+        key = _key(CACHE_VERSION, function_digest(load), *(file_digest(p) for p in inputs))
+        path = self._path(name, key)
+        df = self._recall(path, f'{name}:load')
+        if df is None:
+            df = self._load(path)
+            if df is None:
+                df = load()
+                self._store(path, df)
+                self.computed.append(f'{name}:load')
+            else:
+                self.hits.append(f'{name}:load')
+            self._remember(path, df)
+
+        for group_name, fn in groups:
+            key = _key(key, group_name, function_digest(fn))
+            path = self._path(f'{name}-{group_name}', key)
+            shared = self._recall(path, f'{name}:{group_name}')
+            if shared is not None:
+                df = shared
+                continue
+            delta = self._load(path)
+            if delta is None:
+                source = _handout(df) if _MEMORY is not None else df
+                out = fn(source)
+                self._store(path, _delta(df, out))
+                df = out
+                self.computed.append(f'{name}:{group_name}')
+            else:
+                df = _apply_delta(df, delta)
+                self.hits.append(f'{name}:{group_name}')
+            self._remember(path, df)
+        return _handout(df) if _MEMORY is not None else df
+
+    def read_csv(self, path, schema=None, **kwargs):
+        """
+        pd.read_csv (schema.read_csv with a Schema, keys encoded against it),
+        served from the binary cache while the file is unchanged.
+        """
+        path = Path(path)
+        if schema is None:
+            name = f"{path.stem}-{_key(sorted(kwargs.items()))}"
+            return self.materialise(name, [path], lambda: pd.read_csv(path, **kwargs))
+        name = f"{path.stem}-schema-{_key(sorted(kwargs.items()))}"
+        inputs = [path] + ([schema.path] if getattr(schema, 'path', None) is not None else [])
+        return schema.encode(self.materialise(name, inputs, lambda: schema.read_csv(path, **kwargs)))
+
+    def summary(self):
+        """One-line hit / compute report for the training log."""
+        return (f"Feature cache: {len(self.hits)} cached, {len(self.computed)} computed"
+                + (f" ({', '.join(self.computed)})" if self.computed else '')
+                + (f", {len(self.shared)} shared in memory" if self.shared else ''))
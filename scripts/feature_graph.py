@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Lazy Feature Graph
+==================
+Declarative feature definitions, resolved per model request.
+
+Each feature declares the columns it reads. A model asks for the features it
+uses and only that subgraph runs, in dependency order, with shared
+intermediates (e.g. the per-SKU shifted quantity behind every rolling window)
+computed once:
+
+    graph = FeatureGraph(sort_by=['sku', 'year_week'])
+    graph.add('week_num', ['year_week'], lambda df: df['year_week'].str.extract(r'W(\\d+)')[0].astype(int))
+    graph.lag('lag1', 'weekly_quantity', 1)
+    graph.rolling('rolling_std_4w', 'weekly_quantity', 4, 'std')
+
+    df = graph.compute(weekly, ['lag1', 'rolling_std_4w', 'week_num'])
+
+compute() returns the input columns plus the requested features:
+  - NaN in the requested features is filled with fill_value (only those
+    columns that have any, not the whole frame)
+  - a feature's finish step (e.g. inf -> 0 and clipping) runs after the fill
+  - intermediates that were not requested are dropped; names starting with
+    '_' are intermediates by convention
+"""
+
+import pandas as pd
+import numpy as np
+
+from feature_cache import function_digest
+
+
+class FeatureGraph:
+    """Features keyed by name: inputs, compute function and optional finish step."""
+
+    def __init__(self, group_col='sku', sort_by=None, fill_value=0):
+        self.group_col = group_col
+        self.sort_by = sort_by
+        self.fill_value = fill_value
+        # name -> (inputs, fn, finish, context)
+        self.nodes = {}
+
+    def add(self, name, inputs, fn, finish=None, context=()):
+        """
+        Register a feature.
+
+        fn(df, **context) returns the column; context names keyword arguments
+        taken from compute(**context). finish(series) runs after the NaN fill.
+        """
+        self.nodes[name] = (tuple(inputs), fn, finish, tuple(context))
+        return self
+
+    def lag(self, name, col, periods):
+        """Per-group shift of col by periods."""
+        group_col = self.group_col
+        return self.add(name, [col, group_col],
+                        lambda df: df.groupby(group_col, observed=True)[col].shift(periods))
+
+    def rolling(self, name, col, window, stat, shift=1):
+        """
+        Per-group rolling stat over window rows (min_periods=1).
+
+        shift=1 rolls over the previous rows only; the shifted series is a
+        shared intermediate reused by every window / stat on the same column.
+        """
+        source = col
+        if shift:
+            source = f'_{col}_shift{shift}'
+            if source not in self.nodes:
+                self.lag(source, col, shift)
+
+        group_col = self.group_col
+
+        def fn(df):
+            window_rows = df[source].groupby(df[group_col], observed=True, sort=False).rolling(window, min_periods=1)
+            return getattr(window_rows, stat)().droplevel(0).reindex(df.index)
+
+        return self.add(name, [source, group_col], fn)
+
+    def _closure(self, features, columns):
+        """Nodes needed for features, in dependency order (raises on unknown inputs)."""
+        order = []
+        done = set()
+
+        def visit(name, path):
+            if name in done:
+                return
+            if name in path:
+                raise ValueError(f"Feature graph cycle at '{name}'")
+            if name not in self.nodes:
+                if name in columns:
+                    return
+                raise KeyError(f"'{name}' is neither a column nor a registered feature")
+            for dep in self.nodes[name][0]:
+                visit(dep, path | {name})
+            done.add(name)
+            order.append(name)
+
+        for name in features:
+            visit(name, frozenset())
+        return order
+
+    def available(self, columns, features):
+        """The features that can be computed from the given input columns."""
+        result = []
+        for name in features:
+            try:
+                self._closure([name], set(columns))
+                result.append(name)
+            except KeyError:
+                continue
+        return result
+
+    def public(self):
+        """Every registered feature that is not an intermediate."""
+        return [name for name in self.nodes if not name.startswith('_')]
+
+    def compute(self, df, features, **context):
+        """df (sorted by sort_by) plus the requested features."""
+        features = list(dict.fromkeys(features))
+        order = self._closure(features, set(df.columns))
+
+        out = df.sort_values(self.sort_by) if self.sort_by else df.copy()
+        for name in order:
+            _, fn, _, needs = self.nodes[name]
+            out[name] = fn(out, **{k: context[k] for k in needs if k in context})
+
+        for name in features:
+            if pd.api.types.is_numeric_dtype(out[name]) and out[name].hasnans:
+                out[name] = out[name].fillna(self.fill_value)
+        for name in features:
+            finish = self.nodes.get(name, (None, None, None))[2]
+            if finish is not None:
+                out[name] = finish(out[name])
+
+        dropped = [n for n in order if n not in features and n not in df.columns]
+        return out.drop(columns=dropped)
+
+    def fingerprint(self):
+        """Stable digest of every definition (used by FeatureCache keys)."""
+        parts = []
+        for name, (inputs, fn, finish, context) in self.nodes.items():
+            tail = function_digest(finish) if finish is not None else ''
+            parts.append(f'{name}|{inputs}|{context}|{function_digest(fn)}|{tail}')
+        return '\n'.join(parts)
+
+
+def clip_finite(lower, upper):
+    """Finish step: +/-inf -> 0, then clip to [lower, upper]."""
+    return lambda values: values.replace([np.inf, -np.inf], 0).clip(lower, upper)
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Incremental Weekly Feature Store
+================================
+Append new weeks to the v2 feature tables without rebuilding history.
+
+Per-series trailing state is kept next to the tables in features_v2/state/:
+  - sku_state.csv          last 4 weekly quantities / prices and last positive price per SKU
+  - customer_state.csv     order-date gaps, totals, first/last order per customer
+  - customer_regions.csv   line counts per customer × region (primary region)
+  - customer_skus.csv      units per customer × SKU (top SKUs)
+  - week_state.csv         line items per week (data completeness labels)
+  - week_region_state.csv  line items per week × region (coverage scores)
+
+Lags and rolling windows are trailing, so a new week only adds rows: the
+rows for SKUs, customers and categories active that week are computed from
+the state and appended; history is never reread. Stored weeks reread with
+the new ones are skipped unless they gained line items, which needs a full
+rebuild (run without --incremental).
+
+Usage:
+    store = WeeklyFeatureStore(OUTPUT_DIR)
+    store.initialise(df, weekly_features, price_history)   # after a full run
+    store.append(new_week_df, AGGREGATION_LEVELS)           # weekly refresh
+"""
+
+import pandas as pd
+import numpy as np
+from pathlib import Path
+
+from aggregation import aggregate_levels
+from completeness import (REGION_TABLE_FILE, broadcast, completeness_labels, coverage_scores,
+                          week_region_counts)
+
+# Trailing rows kept per SKU (lag4 is the deepest window)
+WINDOW = 4
+
+# v2_price_history rows: SKU × Week over lines with a positive price
+PRICE_LEVELS = {
+    'price_week': (['sku', 'year_week'], {
+        'avg_price': ('unit_price', 'mean'),
+        'min_price': ('unit_price', 'min'),
+        'max_price': ('unit_price', 'max'),
+        'price_std': ('unit_price', 'std'),
+        'price_observations': ('unit_price', 'count'),
+        'weekly_quantity': ('quantity', 'sum'),
+        'weekly_revenue': ('line_total', 'sum')
+    })
+}
+
+
+def classify_cycle(avg_days_between, std_days):
+    """Buying cycle regularity from the mean / std of days between orders."""
+    if avg_days_between <= 7 and std_days < 3:
+        return 'Weekly'
+    elif avg_days_between <= 14 and std_days < 5:
+        return 'Bi-weekly'
+    elif avg_days_between <= 35 and std_days < 10:
+        return 'Monthly'
+    elif std_days > 20:
+        return 'Irregular'
+    return 'Sporadic'
+
+
+def classify_buyer(total_units, avg_order_value, total_orders):
+    """Buyer type from customer totals."""
+    if total_units > 100000:
+        return 'Bulk Buyer'
+    elif avg_order_value > 50000:
+        return 'High-Value Buyer'
+    elif total_orders >= 40:
+        return 'Frequent Buyer'
+    elif total_orders >= 10:
+        return 'Regular Buyer'
+    return 'Occasional Buyer'
+
+
+def segment_customer(row):
+    """Classify customer by buying behavior"""
+    total_units = row.get('total_units', 0)
+    total_orders = row.get('total_orders', 0)
+    avg_order = total_units / total_orders if total_orders > 0 else 0
+
+    if total_units > 100000 or avg_order > 10000:
+        return 'Bulk/Wholesale'
+    elif avg_order > 2000:
+        return 'Large Retailer'
+    elif avg_order > 500:
+        return 'Medium Retailer'
+    else:
+        return 'Small Retailer'
+
+
+def _customers(df):
+    """Line items with a usable customer id."""
+    ids = df['customer_id']
+    return df[ids.notna() & (ids.astype(str) != '')]
+
+
+class WeeklyFeatureStore:
+    """v2 feature tables plus the per-series state needed to extend them."""
+
+    def __init__(self, output_dir):
+        self.output_dir = Path(output_dir)
+        self.state_dir = self.output_dir / 'state'
+
+    def _state_path(self, name):
+        return self.state_dir / f'{name}.csv'
+
+    def exists(self):
+        return self._state_path('sku_state').exists() and self._state_path('week_state').exists()
+
+    def _read_state(self, name, keys):
+        return pd.read_csv(self._state_path(name), dtype={k: str for k in keys})
+
+    def _write_state(self, name, frame):
+        self.state_dir.mkdir(exist_ok=True)
+        frame.to_csv(self._state_path(name), index=False)
+
+    def latest_week(self):
+        """Latest week held in the store."""
+        return self._read_state('week_state', ['year_week'])['year_week'].max()
+
+    # ------------------------------------------------------------------
+    # State from a full run
+    # ------------------------------------------------------------------
+
+    def initialise(self, df, weekly_features, price_history):
+        """Snapshot trailing state after a full extraction run."""
+        self._write_state('week_state', df.groupby('year_week').size().rename('line_items').reset_index())
+        self._write_state('week_region_state', week_region_counts(df).stack().rename('line_items').reset_index())
+        self._write_state('sku_state', self._sku_state(weekly_features, price_history))
+        self._init_customer_state(df)
+
+    def _sku_state(self, weekly_features, price_history):
+        """Last WINDOW quantities / prices per SKU (q1 = most recent)."""
+        tail = weekly_features.sort_values(['sku', 'year_week']).groupby('sku').tail(WINDOW).copy()
+        tail['sku'] = tail['sku'].astype(str)
+        tail['back'] = tail.groupby('sku').cumcount(ascending=False) + 1
+
+        state = tail.groupby('sku')['year_week'].max().rename('last_week').to_frame()
+        for col, prefix in [('weekly_quantity', 'q'), ('avg_unit_price', 'p')]:
+            wide = tail.pivot(index='sku', columns='back', values=col).reindex(columns=range(1, WINDOW + 1))
+            wide.columns = [f'{prefix}{i}' for i in wide.columns]
+            state = state.join(wide)
+
+        last_price = price_history.sort_values(['sku', 'year_week']).groupby('sku').last()
+        last_price.index = last_price.index.astype(str)
+        state['last_price'] = last_price['avg_price'].reindex(state.index)
+        return state.reset_index()
+
+    def _init_customer_state(self, df):
+        """Cycle, total, region and SKU state per customer."""
+        cust = _customers(df)
+        customer_id = cust['customer_id'].astype(str)
+
+        dates = pd.DataFrame({'customer_id': customer_id, 'order_date': pd.to_datetime(cust['order_date'])})
+        dates = dates.dropna().drop_duplicates().sort_values(['customer_id', 'order_date'])
+        gaps = dates.groupby('customer_id')['order_date'].diff().dt.days
+
+        state = cust.assign(customer_id=customer_id).groupby('customer_id').agg(
+            customer_name=('customer_name', 'first'),
+            total_orders=('invoice_id', 'nunique'),
+            total_units=('quantity', 'sum'),
+            total_revenue=('line_total', 'sum'),
+            active_weeks=('year_week', 'nunique')
+        )
+        state['first_order'] = dates.groupby('customer_id')['order_date'].min()
+        state['last_order'] = dates.groupby('customer_id')['order_date'].max()
+        state['n_gaps'] = gaps.groupby(dates['customer_id']).count()
+        state['gap_sum'] = gaps.groupby(dates['customer_id']).sum()
+        state['gap_sq_sum'] = (gaps ** 2).groupby(dates['customer_id']).sum()
+        state[['n_gaps', 'gap_sum', 'gap_sq_sum']] = state[['n_gaps', 'gap_sum', 'gap_sq_sum']].fillna(0)
+        self._write_state('customer_state', state.reset_index())
+
+        keyed = cust.assign(customer_id=customer_id)
+        self._write_state('customer_regions', keyed.groupby(['customer_id', 'region_name'], observed=True).size().rename('lines').reset_index())
+        self._write_state('customer_skus', keyed.groupby(['customer_id', 'sku'], observed=True)['quantity'].sum().reset_index())
+
+    # ------------------------------------------------------------------
+    # Weekly refresh
+    # ------------------------------------------------------------------
+
+    def append(self, df, levels):
+        """
+        Append new weeks of line items (with category_l1 attached).
+
+        levels are the extraction's aggregation levels ('sku_week',
+        'sku_customer_week', 'category_week', 'week'). Returns the updated
+        customer cycles table.
+        """
+        df = self._new_weeks(df)
+        if df.empty:
+            return None
+
+        week_table = self._update_week_state(df)
+        df['data_completeness'] = broadcast(df, week_table, 'data_completeness')
+
+        cycles = self._update_customer_state(df)
+        df['customer_segment'] = df['customer_id'].astype(str).map(cycles.set_index('customer_id')['customer_segment'])
+        df['buyer_type'] = df['customer_id'].astype(str).map(cycles.set_index('customer_id')['buyer_type'])
+
+        tables = aggregate_levels(df.assign(price_captured=df['unit_price'] > 0),
+                                  {name: levels[name] for name in ('sku_week', 'sku_customer_week', 'category_week', 'week')})
+
+        price_weeks = aggregate_levels(df[df['unit_price'] > 0], PRICE_LEVELS)['price_week']
+        price_weeks['price_std'] = price_weeks['price_std'].fillna(0)
+
+        # Weeks one at a time so each week's lags see the previous one
+        weekly_rows, price_rows = [], []
+        sku_state = self._read_state('sku_state', ['sku']).set_index('sku')
+        for week in sorted(df['year_week'].unique()):
+            weekly, sku_state = self._extend_skus(tables['sku_week'][tables['sku_week']['year_week'] == week], sku_state)
+            prices, sku_state = self._extend_prices(price_weeks[price_weeks['year_week'] == week], sku_state)
+            weekly_rows.append(weekly)
+            price_rows.append(prices)
+        self._write_state('sku_state', sku_state.reset_index())
+
+        week_completeness = tables['week']
+        week_completeness['price_coverage'] = (week_completeness['prices_captured'] /
+                                                week_completeness['invoice_count'] * 100).round(1)
+        week_completeness['coverage_score'] = broadcast(week_completeness, week_table, 'coverage_score')
+
+        self._append_csv('v2_features_weekly.csv', pd.concat(weekly_rows))
+        self._append_csv('v2_price_history.csv', pd.concat(price_rows))
+        self._append_csv('v2_features_sku_customer.csv', tables['sku_customer_week'])
+        self._append_csv('v2_features_category.csv', tables['category_week'].rename(columns={'category_l1': 'category'}))
+        self._append_csv('v2_week_completeness.csv', week_completeness)
+        self._append_csv('v2_fact_lineitem.csv', df)
+        return cycles
+
+    def _new_weeks(self, df):
+        """
+        Rows of df after the latest stored week. Weeks already stored are
+        reread from the start of their month: they are dropped when they hold
+        no more line items than the store (a week whose first days fall in
+        an earlier month is reread only in part), and raise when they hold
+        more - lines that arrived late for a stored week need a full rebuild.
+        """
+        latest = self.latest_week()
+        stored = df['year_week'] <= latest
+        if not stored.any():
+            return df.copy()
+
+        counts = self._read_state('week_state', ['year_week']).set_index('year_week')['line_items']
+        reread = df.loc[stored, 'year_week'].value_counts()
+        late = reread[reread > counts.reindex(reread.index).fillna(0)]
+        if len(late) > 0:
+            weeks = ', '.join(f"{week} (+{n - int(counts.get(week, 0))})" for week, n in sorted(late.items()))
+            raise ValueError(f"Late line items for stored weeks {weeks}; run a full rebuild")
+        return df[~stored].copy()
+
+    def _append_csv(self, name, rows):
+        """Append rows to a feature table in its existing column order."""
+        path = self.output_dir / name
+        columns = pd.read_csv(path, nrows=0).columns
+        rows.reindex(columns=columns).to_csv(path, mode='a', header=False, index=False)
+        print(f"   {name}: +{len(rows):,} rows")
+
+    def _update_week_state(self, df):
+        """Add the new weeks' line counts; returns the week completeness table (labels, scores)."""
+        weeks = self._read_state('week_state', ['year_week']).set_index('year_week')['line_items']
+        weeks = pd.concat([weeks, df.groupby('year_week').size()])
+        self._write_state('week_state', weeks.rename('line_items').rename_axis('year_week').reset_index())
+
+        # Week × region counts (stores from before the region state start from the new weeks)
+        counts = week_region_counts(df)
+        if self._state_path('week_region_state').exists():
+            stored = self._read_state('week_region_state', ['year_week', 'region_name'])
+            stored = stored.set_index(['year_week', 'region_name'])['line_items'].unstack(fill_value=0)
+            counts = pd.concat([stored, counts]).fillna(0).astype(int)
+            counts.columns.name = 'region_name'
+        self._write_state('week_region_state', counts.stack().rename('line_items').reset_index())
+
+        week_table, region_table = coverage_scores(counts)
+        region_table.to_csv(self.output_dir / REGION_TABLE_FILE, index=False)
+        week_table['data_completeness'] = completeness_labels(weeks).reindex(week_table['year_week']).to_numpy()
+        return week_table
+
+    def _extend_skus(self, week_rows, sku_state):
+        """Lag / rolling features for one week's SKU rows from the trailing state."""
+        week_rows = week_rows.copy()
+        keys = week_rows['sku'].astype(str)
+        prev = sku_state.reindex(keys)
+
+        for lag in [1, 2, 4]:
+            week_rows[f'lag{lag}_quantity'] = prev[f'q{lag}'].to_numpy()
+            week_rows[f'lag{lag}_price'] = prev[f'p{lag}'].to_numpy()
+
+        # rolling(4, min_periods=1) over this row and the 3 before it
+        quantities = np.column_stack([week_rows['weekly_quantity'].to_numpy(dtype=float)] +
+                                     [prev[f'q{i}'].to_numpy(dtype=float) for i in range(1, WINDOW)])
+        prices = np.column_stack([week_rows['avg_unit_price'].to_numpy(dtype=float)] +
+                                 [prev[f'p{i}'].to_numpy(dtype=float) for i in range(1, WINDOW)])
+        with np.errstate(all='ignore'):
+            week_rows['rolling_avg_4w'] = np.nanmean(quantities, axis=1)
+            week_rows['price_rolling_avg_4w'] = np.nanmean(prices, axis=1)
+
+        week_rows['price_change'] = week_rows['avg_unit_price'] - week_rows['lag1_price']
+        week_rows['price_change_pct'] = (week_rows['price_change'] / week_rows['lag1_price'] * 100).round(2)
+
+        # Shift the windows: this week becomes q1 / p1
+        shifted = pd.DataFrame(index=keys.to_numpy())
+        shifted['last_week'] = week_rows['year_week'].to_numpy()
+        for prefix, current in [('q', quantities[:, 0]), ('p', prices[:, 0])]:
+            shifted[f'{prefix}1'] = current
+            for i in range(2, WINDOW + 1):
+                shifted[f'{prefix}{i}'] = prev[f'{prefix}{i - 1}'].to_numpy()
+
+        shifted['last_price'] = prev['last_price'].to_numpy()
+
+        sku_state = pd.concat([sku_state.drop(shifted.index, errors='ignore'), shifted[sku_state.columns]])
+        return week_rows, sku_state
+
+    def _extend_prices(self, price_rows, sku_state):
+        """v2_price_history rows for one week; prev_avg_price is the SKU's last priced week."""
+        price_rows = price_rows.copy()
+        keys = price_rows['sku'].astype(str).to_numpy()
+        price_rows['prev_avg_price'] = sku_state['last_price'].reindex(keys).to_numpy()
+        price_rows['price_change'] = price_rows['avg_price'] - price_rows['prev_avg_price']
+        price_rows['price_change_pct'] = (price_rows['price_change'] / price_rows['prev_avg_price'] * 100).round(2)
+
+        # SKUs priced for the first time have no window yet
+        new = pd.Index(keys).difference(sku_state.index)
+        if len(new) > 0:
+            sku_state = pd.concat([sku_state, pd.DataFrame(index=new, columns=sku_state.columns)])
+        sku_state.loc[keys, 'last_price'] = price_rows['avg_price'].to_numpy()
+        return price_rows, sku_state
+
+    def _update_customer_state(self, df):
+        """Fold the new weeks into the customer state; returns the customer cycles table."""
+        cust = _customers(df)
+        cust = cust.assign(customer_id=cust['customer_id'].astype(str))
+        state = self._read_state('customer_state', ['customer_id']).set_index('customer_id')
+        state['first_order'] = pd.to_datetime(state['first_order'])
+        state['last_order'] = pd.to_datetime(state['last_order'])
+
+        week = cust.groupby('customer_id').agg(
+            customer_name=('customer_name', 'first'),
+            total_orders=('invoice_id', 'nunique'),
+            total_units=('quantity', 'sum'),
+            total_revenue=('line_total', 'sum'),
+            active_weeks=('year_week', 'nunique')
+        )
+
+        # Gaps continue from each customer's last stored order date
+        dates = pd.DataFrame({'customer_id': cust['customer_id'], 'order_date': pd.to_datetime(cust['order_date'])})
+        dates = dates.dropna().drop_duplicates()
+        previous = state['last_order'].reindex(dates['customer_id'].unique()).dropna()
+        dates = pd.concat([dates, previous.rename('order_date').rename_axis('customer_id').reset_index()])
+        dates = dates.drop_duplicates().sort_values(['customer_id', 'order_date'])
+        gaps = dates.groupby('customer_id')['order_date'].diff().dt.days
+        week['first_order'] = dates.groupby('customer_id')['order_date'].min()
+        week['last_order'] = dates.groupby('customer_id')['order_date'].max()
+        week['n_gaps'] = gaps.groupby(dates['customer_id']).count()
+        week['gap_sum'] = gaps.groupby(dates['customer_id']).sum()
+        week['gap_sq_sum'] = (gaps ** 2).groupby(dates['customer_id']).sum()
+
+        additive = ['total_orders', 'total_units', 'total_revenue', 'active_weeks', 'n_gaps', 'gap_sum', 'gap_sq_sum']
+        merged = state.reindex(state.index.union(week.index))
+        merged[additive] = merged[additive].fillna(0).add(week[additive].reindex(merged.index).fillna(0))
+        merged['customer_name'] = merged['customer_name'].fillna(week['customer_name'])
+        merged['first_order'] = merged['first_order'].fillna(week['first_order'])
+        merged['last_order'] = week['last_order'].reindex(merged.index).fillna(merged['last_order'])
+        self._write_state('customer_state', merged.rename_axis('customer_id').reset_index())
+
+        regions = self._add_counts('customer_regions', cust.groupby(['customer_id', 'region_name']).size().rename('lines'))
+        skus = self._add_counts('customer_skus', cust.groupby(['customer_id', 'sku'])['quantity'].sum())
+        return self._cycles(merged, regions, skus)
+
+    def _add_counts(self, name, week_counts):
+        """Add a week's (customer, key) counts to a running count table."""
+        key = week_counts.index.names[1]
+        state = self._read_state(name, ['customer_id', key]).set_index(['customer_id', key]).iloc[:, 0]
+        state = state.add(week_counts, fill_value=0)
+        self._write_state(name, state.rename(week_counts.name).reset_index())
+        return state
+
+    def _cycles(self, state, regions, skus):
+        """Customer cycles table (same layout as calculate_buying_cycles) from the state."""
+        cycles = state.copy()
+        n_gaps = cycles['n_gaps']
+        mean_gap = cycles['gap_sum'] / n_gaps.where(n_gaps > 0)
+        std_gap = np.sqrt(np.maximum(cycles['gap_sq_sum'] / n_gaps.where(n_gaps > 0) - mean_gap ** 2, 0))
+        std_gap = std_gap.where(n_gaps > 1, 0)
+
+        cycles['avg_days_between_orders'] = mean_gap
+        cycles['cycle_regularity'] = [classify_cycle(m, s) if n > 0 else 'One-time'
+                                      for m, s, n in zip(mean_gap, std_gap, n_gaps)]
+        cycles['avg_order_value'] = (cycles['total_revenue'] / cycles['total_orders'].where(cycles['total_orders'] > 0)).fillna(0)
+        cycles['buyer_type'] = [classify_buyer(u, a, o) for u, a, o in
+                                zip(cycles['total_units'], cycles['avg_order_value'], cycles['total_orders'])]
+
+        # Most lines, then smallest region name (like Series.mode()[0])
+        by_region = regions.rename('lines').reset_index().sort_values(['customer_id', 'lines', 'region_name'],
+                                                                      ascending=[True, False, True])
+        cycles['primary_region'] = by_region.drop_duplicates('customer_id').set_index('customer_id')['region_name']
+
+        by_sku = skus.rename('quantity').reset_index().sort_values(['customer_id', 'quantity', 'sku'],
+                                                                   ascending=[True, False, True])
+        top = by_sku.groupby('customer_id').head(5)
+        cycles['top_skus'] = top.groupby('customer_id')['sku'].agg(lambda s: ','.join(s.astype(str)))
+
+        cycles['first_order'] = cycles['first_order'].dt.strftime('%Y-%m-%d')
+        cycles['last_order'] = cycles['last_order'].dt.strftime('%Y-%m-%d')
+        cycles['customer_segment'] = cycles.apply(segment_customer, axis=1)
+
+        columns = ['customer_name', 'primary_region', 'total_orders', 'total_units', 'total_revenue',
+                   'avg_order_value', 'avg_days_between_orders', 'cycle_regularity', 'buyer_type',
+                   'top_skus', 'first_order', 'last_order', 'active_weeks', 'customer_segment']
+        return cycles[columns].rename_axis('customer_id').reset_index()
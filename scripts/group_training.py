@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Per-Group Model Training
+========================
+One model per group (category, customer, SKU) with a shared fallback.
+
+The train and test frames are partitioned once (row positions per group)
+instead of re-filtering the full frame for every entity:
+  - groups with at least min_rows complete training rows get their own model
+  - fits run in parallel worker processes, in batches of groups; small jobs
+    stay single-process
+  - with a Checkpoint (checkpoint.py), each finished batch of models is
+    appended to it and groups it already holds are not refitted
+  - each group's test block is predicted in one call, and every row without a
+    group model goes through the fallback model in one call
+  - features are copied once per frame into a C-contiguous float32 matrix
+    (missing values 0) with each group's rows adjacent; fits and predictions
+    get row slices of it (views) instead of a float64 copy per group. Tree
+    models split on float32 anyway, so the fitted trees are unchanged and
+    predictions differ only by float rounding (~1e-15); pass
+    dtype=np.float64 for other models
+  - sample weights are computed once for the training frame and sliced per
+    group, like the features
+
+fit(X, y, sample_weight) must be a module-level function (it is sent to the
+worker processes by reference). A fit that raises leaves its group on the
+fallback.
+
+Usage:
+    rows, models = train_per_group(
+        train, test, 'category', feature_cols, 'weekly_quantity', train_model,
+        min_rows=50, fallback=global_model,
+        weights=lambda frame: sample_weights(frame, week_scores))
+    rows['predicted'] = np.clip(rows['predicted'], 0, None)
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Group fits run in parallel batches; jobs with few groups stay single-process
+GROUP_WORKERS = min(4, os.cpu_count() or 1)
+MIN_GROUPS_PER_WORKER = 8
+GROUP_BATCH = 50
+
+# Feature matrix dtype (what tree models convert their input to)
+MATRIX_DTYPE = np.float32
+
+
+def feature_matrix(frame, features, rows=None, dtype=MATRIX_DTYPE):
+    """
+    frame[features] (the rows at positions rows, in that order) as one
+    C-contiguous matrix with missing values 0, filled column by column.
+    """
+    n = len(frame) if rows is None else len(rows)
+    X = np.empty((n, len(features)), dtype=dtype)
+    for j, feature in enumerate(features):
+        values = frame[feature].to_numpy(dtype=dtype, na_value=np.nan)
+        X[:, j] = values if rows is None else values[rows]
+    X[np.isnan(X)] = 0
+    return X
+
+
+def feature_frame(X, columns, start=0, stop=None):
+    """Rows start:stop of a feature matrix as a DataFrame over the same memory."""
+    return pd.DataFrame(X[start:stop], columns=columns, copy=False)
+
+
+def _fit_groups(fit, batch):
+    """Worker: fit a batch of (group, X, y, weight) jobs; failed fits are None."""
+    models = {}
+    for group, X, y, weight in batch:
+        try:
+            models[group] = fit(X, y, weight)
+        except Exception:
+            models[group] = None
+    return models
+
+
+def fit_groups(jobs, fit, workers=GROUP_WORKERS, checkpoint=None, loop=None):
+    """
+    group -> fitted model (None where the fit failed) for (group, X, y, weight)
+    jobs. With a checkpoint, models recorded under loop are reused and each
+    finished batch is appended to it.
+    """
+    done = checkpoint.done(loop) if checkpoint is not None else {}
+    models = {group: done[group]['model'] for group, *_ in jobs if group in done}
+    todo = [job for job in jobs if job[0] not in done]
+    batches = [todo[i:i + GROUP_BATCH] for i in range(0, len(todo), GROUP_BATCH)]
+
+    def collect(results):
+        for batch_models in results:
+            models.update(batch_models)
+            if checkpoint is not None:
+                checkpoint.add_many(loop, {group: {'model': model} for group, model in batch_models.items()})
+
+    workers = max(1, min(workers or 1, len(todo) // MIN_GROUPS_PER_WORKER))
+    if workers == 1:
+        collect(_fit_groups(fit, batch) for batch in batches)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            collect(pool.map(_fit_groups, [fit] * len(batches), batches))
+    return {group: models[group] for group, *_ in jobs}
+
+
+def group_jobs(train, group_col, features, target, min_rows, weights=None, dtype=MATRIX_DTYPE):
+    """
+    (group, X, y, weight) fit jobs for the groups with at least min_rows rows,
+    X / y / weight being slices of one feature matrix / target / weight array
+    in group order (weights is called once, on all of train).
+    """
+    groups = [(group, pos) for group, pos in train.groupby(group_col, sort=False, observed=True).indices.items()
+              if len(pos) >= min_rows]
+    if not groups:
+        return []
+    order = np.concatenate([pos for _, pos in groups])
+    X = feature_matrix(train, features, order, dtype)
+    y = train[target].to_numpy(dtype=float)[order]
+    weight = weights(train) if weights is not None else None
+    weight = np.asarray(weight, dtype=float)[order] if weight is not None else None
+
+    columns = pd.Index(features)
+    jobs, start = [], 0
+    for group, pos in groups:
+        stop = start + len(pos)
+        jobs.append((group, feature_frame(X, columns, start, stop), y[start:stop],
+                     weight[start:stop] if weight is not None else None))
+        start = stop
+    return jobs
+
+
+def train_per_group(train, test, group_col, features, target, fit, min_rows,
+                    fallback=None, required=None, weights=None, workers=GROUP_WORKERS,
+                    checkpoint=None, name=None, dtype=MATRIX_DTYPE):
+    """
+    Fit a model per group on train and predict test with it.
+
+    required: columns a row needs to be used (default: features); other
+              missing feature values are filled with 0.
+    fallback: fitted model for groups without their own; None drops those
+              groups' test rows.
+    weights:  weights(frame) -> per-row sample weights of frame (called once
+              on the training rows and sliced per group).
+    checkpoint: Checkpoint for the fitted models (loop name: name, default
+              group_col).
+    dtype:    feature matrix dtype (float32: see module docstring).
+
+    Returns (test rows in group order with 'predicted' and 'model_type'
+    ('group' / 'fallback'), group -> model for the groups that were fitted).
+    """
+    required = list(features) if required is None else list(required)
+    train = train.dropna(subset=required)
+
+    jobs = group_jobs(train, group_col, features, target, min_rows, weights, dtype)
+    fitted = fit_groups(jobs, fit, workers, checkpoint, name or group_col)
+    models = {group: model for group, model in fitted.items() if model is not None}
+    return predict_per_group(test, group_col, features, models, fallback, required, dtype), models
+
+
+def predict_per_group(test, group_col, features, models, fallback=None, required=None, dtype=MATRIX_DTYPE):
+    """
+    Predict test with group -> model, the fallback for other groups.
+
+    Returns test rows (with the required columns) in group order, plus
+    'predicted' and 'model_type' ('group' / 'fallback'); groups with neither
+    a model nor a fallback are left out.
+    """
+    required = list(features) if required is None else list(required)
+    order = test[group_col].unique()
+    test = test.dropna(subset=required)
+
+    # Test rows grouped in order of the groups' first appearance in test
+    test_groups = test.groupby(group_col, sort=False, observed=True).indices
+    order = [g for g in order if g in test_groups]
+    groups = [g for g in order if g in models or fallback is not None]
+    blocks = [test_groups[g] for g in groups]
+
+    if not blocks:
+        rows = test.iloc[:0].copy()
+        rows['predicted'] = np.array([], dtype=float)
+        rows['model_type'] = np.array([], dtype=object)
+        return rows
+
+    # One feature matrix in output row order; each group's block is a slice of it
+    positions = np.concatenate(blocks)
+    X_test = feature_matrix(test, features, positions, dtype)
+    bounds = np.cumsum([0] + [len(pos) for pos in blocks])
+    columns = pd.Index(features)
+    predicted = np.empty(len(positions))
+    is_group = np.zeros(len(positions), dtype=bool)
+    for group, start, stop in zip(groups, bounds[:-1], bounds[1:]):
+        if group in models:
+            predicted[start:stop] = models[group].predict(feature_frame(X_test, columns, start, stop))
+            is_group[start:stop] = True
+
+    # Rows of every fallback group predicted in one call
+    if not is_group.all():
+        predicted[~is_group] = fallback.predict(feature_frame(X_test[~is_group], columns))
+
+    rows = test.iloc[positions].copy()
+    rows['predicted'] = predicted
+    rows['model_type'] = np.where(is_group, 'group', 'fallback').astype(object)
+    return rows
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Intermittent Demand Forecasting
+===============================
+Croston, SBA and TSB for every sparse series at once.
+
+The training rows become one Series × Week demand matrix (weeks without a row
+are zero demand). Each method runs once over the weeks, updating the states
+of all series and all candidate smoothing constants together as arrays:
+  - Croston: demand size z and interval p smoothed at demand weeks, forecast z / p
+  - SBA: Croston × (1 - alpha / 2) (bias-corrected)
+  - TSB: demand size z at demand weeks, demand probability updated every week
+    (beta), forecast probability × z; decays towards 0 for dead series
+Smoothing constants are picked per series from the ALPHAS grid (TSB: ALPHAS ×
+BETAS) by in-sample one-step-ahead MAE; method='auto' also picks the method
+per series the same way. Forecasts are flat over the horizon.
+
+Usage:
+    fits = fit_intermittent(h1_sparse, 'sku')              # one row per SKU
+    rows = predict_intermittent(h2_sparse, fits, 'sku')    # + 'predicted', 'method'
+"""
+
+import numpy as np
+import pandas as pd
+
+# Smoothing constants tried for the demand size / interval (alpha) and the
+# demand probability (beta, TSB)
+ALPHAS = np.array([0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5])
+BETAS = np.array([0.02, 0.05, 0.1, 0.2, 0.3])
+
+METHODS = ('croston', 'sba', 'tsb')
+
+
+def demand_matrix(frame, id_col, value_col='weekly_quantity', week_col='year_week'):
+    """(series keys, week labels, Series × Week demand) with missing weeks as 0."""
+    keys, series = np.unique(frame[id_col].to_numpy(), return_inverse=True)
+    weeks, week = np.unique(frame[week_col].astype(str).to_numpy(), return_inverse=True)
+    Y = np.zeros((len(keys), len(weeks)))
+    np.add.at(Y, (series, week), np.nan_to_num(frame[value_col].to_numpy(dtype=float)))
+    return keys, weeks, np.clip(Y, 0, None)
+
+
+def _run(Y, alpha, beta=None, sba=False):
+    """
+    One pass over the weeks for P parameter sets at once: (in-sample MAE,
+    final forecast), both (P, series). alpha / beta: (P,) arrays; beta set = TSB.
+    """
+    n, T = Y.shape
+    a = alpha[:, None]
+    factor = 1 - a / 2 if sba else 1
+    z = np.full((len(alpha), n), np.nan)
+    level = np.full((len(alpha), n), np.nan)       # Croston / SBA: interval, TSB: probability
+    q = np.ones(n)
+    abs_error = np.zeros((len(alpha), n))
+    fitted = np.zeros(n)
+
+    for t in range(T):
+        d = Y[:, t]
+        pos = d > 0
+        forecast = level * z if beta is not None else factor * z / level
+        seen = ~np.isnan(forecast)
+        abs_error += np.where(seen, np.abs(d - np.nan_to_num(forecast)), 0)
+        fitted = fitted + seen[0]
+
+        new = np.isnan(z) & pos
+        z = np.where(new, d, np.where(pos, z + a * (d - z), z))
+        if beta is not None:
+            b = beta[:, None]
+            level = np.where(new, 1 / q, np.where(np.isnan(level), level, level + b * (pos - level)))
+        else:
+            level = np.where(new, q, np.where(pos, level + a * (q - level), level))
+        q = np.where(pos, 1, q + 1)
+
+    forecast = level * z if beta is not None else factor * z / level
+    mae = np.where(fitted > 0, abs_error / np.maximum(fitted, 1), np.inf)
+    return mae, np.nan_to_num(forecast)
+
+
+def _best(mae, forecast):
+    """Per series: lowest-MAE parameter set -> (mae, forecast, param index)."""
+    idx = np.argmin(mae, axis=0)
+    cols = np.arange(mae.shape[1])
+    return mae[idx, cols], forecast[idx, cols], idx
+
+
+def fit_intermittent(frame, id_col, value_col='weekly_quantity', week_col='year_week', method='auto',
+                     alphas=ALPHAS, betas=BETAS):
+    """
+    One row per series of frame: method, alpha, beta, in-sample MAE, forecast,
+    demand weeks and ADI (average weeks between demands).
+    """
+    keys, weeks, Y = demand_matrix(frame, id_col, value_col, week_col)
+    methods = METHODS if method == 'auto' else (method,)
+    results = {}
+    for m in methods:
+        if m == 'tsb':
+            grid_a, grid_b = np.repeat(alphas, len(betas)), np.tile(betas, len(alphas))
+            mae, forecast, idx = _best(*_run(Y, grid_a, grid_b))
+            results[m] = (mae, forecast, grid_a[idx], grid_b[idx])
+        else:
+            mae, forecast, idx = _best(*_run(Y, alphas, sba=(m == 'sba')))
+            results[m] = (mae, forecast, alphas[idx], np.full(len(keys), np.nan))
+
+    maes = np.vstack([results[m][0] for m in methods])
+    pick = np.argmin(maes, axis=0)
+    cols = np.arange(len(keys))
+    stacked = [np.vstack([results[m][i] for m in methods])[pick, cols] for i in range(4)]
+
+    demand_weeks = (Y > 0).sum(axis=1)
+    return pd.DataFrame({
+        id_col: keys,
+        'method': np.array(methods)[pick],
+        'alpha': stacked[2],
+        'beta': stacked[3],
+        'mae': np.where(np.isfinite(stacked[0]), stacked[0], np.nan),
+        'forecast': np.where(demand_weeks > 0, stacked[1], 0.0),
+        'demand_weeks': demand_weeks,
+        'adi': np.where(demand_weeks > 0, len(weeks) / np.maximum(demand_weeks, 1), np.inf),
+    })
+
+
+def predict_intermittent(test, fits, id_col):
+    """test rows of fitted series with the flat forecast as 'predicted' and the 'method'."""
+    lookup = fits.set_index(id_col)
+    rows = test[test[id_col].isin(lookup.index)].copy()
+    rows['predicted'] = rows[id_col].map(lookup['forecast']).to_numpy(dtype=float)
+    rows['method'] = rows[id_col].map(lookup['method']).to_numpy()
+    return rows
+
+
+def intermittent_model(train, test, id_col, value_col='weekly_quantity', method='auto'):
+    """Baseline-zoo signature (MODEL_EVALUATION.py / backtest.py): one forecast per series."""
+    fits = fit_intermittent(train, id_col, value_col, method=method)
+    rows = predict_intermittent(test, fits, id_col)
+    return pd.DataFrame({
+        id_col: rows[id_col].to_numpy(),
+        'year_week': rows['year_week'].to_numpy(),
+        'predicted': rows['predicted'].to_numpy(),
+        'actual': rows[value_col].to_numpy()
+    })
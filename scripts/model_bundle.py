@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Model Bundles
+=============
+Many small gradient-boosted models (one per SKU / category / customer) packed
+into one file, loaded lazily per entity.
+
+Layout of a .bundle file:
+  - header: magic, offset and length of the index
+  - one block per model: node arrays of all its trees (children, feature,
+    threshold, leaf value) plus the trees' root nodes, base and learning rate
+  - index (JSON): entity code -> (offset, length), dtype and metadata
+
+Opening a bundle reads only the header and index; the file is memory-mapped
+and bundle[code] wraps that model's block in numpy views (one seek, no copy,
+no unpickling), so cold starts are fast and only touched pages are resident.
+float32=True stores thresholds and leaf values as float32 (bundles about 30%
+smaller): thresholds are rounded down so splits on float32 inputs (what sklearn
+trees see) are unchanged, leaf values round to ~7 significant digits.
+
+Usage:
+    write_bundle(OUTPUT_DIR / 'sku_models_v4.bundle', {**sku_models, FALLBACK_KEY: global_model},
+                 meta={'features': v4_features})
+
+    with ModelBundle(OUTPUT_DIR / 'sku_models_v4.bundle') as bundle:
+        preds = bundle.model_for(sku).predict(X)   # the SKU's model, else the fallback
+"""
+
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+
+MAGIC = b'DPMODEL1'
+HEADER = struct.Struct('<8sQQ')          # magic, index offset, index length
+BLOCK = struct.Struct('<IIIIdd')         # trees, nodes, features, pad, base, scale
+
+# Entity key of the model used for codes without their own
+FALLBACK_KEY = '__fallback__'
+
+
+def _align(offset, size):
+    return -offset % size
+
+
+def _ensemble_arrays(model):
+    """(base, scale, n_features, roots, left, right, feature, threshold, value) of a fitted GBR."""
+    if not (hasattr(model, 'estimators_') and hasattr(model, 'learning_rate') and hasattr(model, 'init_')):
+        raise TypeError(f"Only fitted gradient-boosted regressors can be bundled, not {type(model).__name__}")
+
+    n_features = model.n_features_in_
+    base = 0.0 if model.init_ == 'zero' else float(model.init_.predict(np.zeros((1, n_features)))[0])
+
+    roots, left, right, feature, threshold, value = [], [], [], [], [], []
+    n_nodes = 0
+    for estimator in model.estimators_[:, 0]:
+        tree = estimator.tree_
+        is_leaf = tree.children_left < 0
+        roots.append(n_nodes)
+        left.append(np.where(is_leaf, -1, tree.children_left + n_nodes))
+        right.append(np.where(is_leaf, -1, tree.children_right + n_nodes))
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        value.append(tree.value.reshape(-1))
+        n_nodes += tree.node_count
+
+    return (base, float(model.learning_rate), n_features, np.array(roots, dtype=np.int32),
+            np.concatenate(left).astype(np.int32), np.concatenate(right).astype(np.int32),
+            np.concatenate(feature).astype(np.int32), np.concatenate(threshold), np.concatenate(value))
+
+
+def _round_down_float32(values):
+    """float32 values <= values (splits on float32 inputs stay the same)."""
+    rounded = values.astype(np.float32)
+    above = rounded.astype(np.float64) > values
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def _encode(model, dtype):
+    """One model's block bytes."""
+    base, scale, n_features, roots, left, right, feature, threshold, value = _ensemble_arrays(model)
+    if dtype == np.float32:
+        threshold = _round_down_float32(threshold)
+    value = value.astype(dtype)
+
+    parts = [BLOCK.pack(len(roots), len(left), n_features, 0, base, scale)]
+    size = BLOCK.size
+    for array in (roots, left, right, feature, threshold.astype(dtype), value):
+        pad = _align(size, array.itemsize)
+        parts += [b'\0' * pad, array.tobytes()]
+        size += pad + array.nbytes
+    return b''.join(parts)
+
+
+def write_bundle(path, models, float32=False, meta=None):
+    """
+    Write entity -> fitted model (None entries are skipped) to one bundle file.
+
+    Blocks start on 8-byte boundaries; entity codes are stored as text.
+    Returns the number of models written.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    dtype = np.float32 if float32 else np.float64
+    index = {}
+
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, 0, 0))
+        offset = HEADER.size
+        for entity, model in models.items():
+            if model is None:
+                continue
+            pad = _align(offset, 8)
+            block = _encode(model, dtype)
+            f.write(b'\0' * pad + block)
+            index[str(entity)] = (offset + pad, len(block))
+            offset += pad + len(block)
+
+        payload = json.dumps({'dtype': np.dtype(dtype).name, 'meta': meta or {}, 'entities': index}).encode()
+        f.write(payload)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, offset, len(payload)))
+    os.replace(tmp, path)
+    return len(index)
+
+
+class CompactEnsemble:
+    """Predict-only boosted trees over flat node arrays (views into a bundle)."""
+
+    def __init__(self, base, scale, n_features, roots, left, right, feature, threshold, value):
+        self.base = base
+        self.scale = scale
+        self.n_features_in_ = n_features
+        self.roots = roots
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(*_ensemble_arrays(model))
+
+    def predict(self, X):
+        """Same results as the source model's predict (float32 splits, stage-wise sums)."""
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        node = np.repeat(self.roots[None, :], len(X), axis=0)
+        while True:
+            left = self.left[node]
+            inner = left >= 0
+            if not inner.any():
+                break
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(inner, np.where(go_left, left, self.right[node]), node)
+
+        leaves = self.value[node].astype(np.float64)
+        out = np.full(len(X), self.base)
+        for j in range(leaves.shape[1]):
+            out += self.scale * leaves[:, j]
+        return out
+
+
+class ModelBundle:
+    """Read side of a bundle file: entity code -> CompactEnsemble, loaded on access."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_offset, index_length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a model bundle")
+        index = json.loads(self._map[index_offset:index_offset + index_length])
+        self.dtype = np.dtype(index['dtype'])
+        self.meta = index['meta']
+        self.entities = index['entities']
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __contains__(self, code):
+        return str(code) in self.entities
+
+    def keys(self):
+        return self.entities.keys()
+
+    def __getitem__(self, code):
+        offset, _ = self.entities[str(code)]
+        n_trees, n_nodes, n_features, _, base, scale = BLOCK.unpack_from(self._map, offset)
+        position = offset + BLOCK.size
+        arrays = []
+        for dtype, count in ((np.int32, n_trees), (np.int32, n_nodes), (np.int32, n_nodes),
+                             (np.int32, n_nodes), (self.dtype, n_nodes), (self.dtype, n_nodes)):
+            itemsize = np.dtype(dtype).itemsize
+            position += _align(position, itemsize)
+            arrays.append(np.frombuffer(self._map, dtype=dtype, count=count, offset=position))
+            position += count * itemsize
+        return CompactEnsemble(base, scale, n_features, *arrays)
+
+    def model_for(self, code):
+        """The entity's model, else the bundle's fallback model (KeyError if neither)."""
+        return self[code] if code in self else self[FALLBACK_KEY]
+
+    def close(self):
+        # Views handed out keep the mapping alive until they are released
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
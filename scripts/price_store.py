@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+As-of Price Store
+=================
+Indexed SKU × Week price history with time-travel lookups.
+
+Prices are held in flat arrays sorted by (sku code, week code), so:
+  - store.asof(sku, '2025-W30')         -> last known price at or before W30, O(log n)
+  - store.asof_join(df)                 -> vectorised as-of lookup for a whole frame
+  - store.append(new_weeks)             -> incremental update with new weeks
+
+Use strict=True for lag semantics: the last known price from a week strictly
+before W. This is not groupby('sku').shift(1): rows without a price are not
+stored, so a missing price carries the previous one forward instead of
+giving NaN, and a week present twice for a SKU keeps its last price and
+looks back to the week before it, where shift(1) would return the other row
+of the same week.
+
+Usage:
+    store = PriceStore.from_csv(FEATURES_DIR / 'v2_price_history.csv')
+    store.asof(10002, '2025-W30')
+    df['price_lag1'] = store.asof_join(df, strict=True)['avg_price']
+"""
+
+import hashlib
+
+import pandas as pd
+import numpy as np
+
+# Key layout: sku_code * WEEK_SPACE + week_code (week_code = YYYYWW)
+WEEK_SPACE = 1_000_000
+
+
+def week_code(year_week):
+    """'2025-W05' -> 202505 (works on scalars and Series; unparseable -> 0)."""
+    if isinstance(year_week, pd.Series):
+        parts = year_week.astype(str).str.extract(r'(\d{4})-W(\d+)').fillna(0).astype(int)
+        return (parts[0] * 100 + parts[1]).to_numpy()
+    year, week = str(year_week).split('-W')
+    return int(year) * 100 + int(week)
+
+
+def week_label(code):
+    """202505 -> '2025-W05' (works on scalars and arrays)."""
+    if np.ndim(code) == 0:
+        return f"{int(code) // 100}-W{int(code) % 100:02d}"
+    codes = pd.Series(np.asarray(code, dtype=np.int64))
+    return ((codes // 100).astype(str) + '-W' + (codes % 100).astype(str).str.zfill(2)).to_numpy()
+
+
+def _sku_keys(values):
+    """SKUs are keyed as strings so int and str forms of the same code match."""
+    return pd.Series(values).astype(str).str.strip().to_numpy()
+
+
+class PriceStore:
+    """SKU × Week price history with O(log n) as-of lookups."""
+
+    def __init__(self, price_history, value_cols=('avg_price',)):
+        self.value_cols = list(value_cols)
+        self._skus = pd.Index([], dtype=object)
+        self._keys = np.array([], dtype=np.int64)
+        self._values = {col: np.array([], dtype=float) for col in self.value_cols}
+        self.append(price_history)
+
+    @classmethod
+    def from_csv(cls, path, value_cols=('avg_price', 'min_price', 'max_price')):
+        """Load from a price history table (e.g. v2_price_history.csv)."""
+        return cls(pd.read_csv(path), value_cols=value_cols)
+
+    @classmethod
+    def from_frame(cls, df, price_col, sku_col='sku', week_col='year_week'):
+        """Build a store from any SKU × Week frame (price_col becomes the value)."""
+        prices = df[[sku_col, week_col, price_col]].dropna(subset=[price_col])
+        prices = prices.rename(columns={sku_col: 'sku', week_col: 'year_week'})
+        return cls(prices, value_cols=(price_col,))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _encode_skus(self, skus, add=False):
+        keys = _sku_keys(skus)
+        if add:
+            new = pd.Index(pd.unique(keys)).difference(self._skus)
+            if len(new) > 0:
+                self._skus = self._skus.append(new)
+        return self._skus.get_indexer(keys)
+
+    def append(self, price_history):
+        """
+        Add (or overwrite) SKU × Week prices.
+
+        New weeks for existing SKUs and brand new SKUs are merged into the
+        sorted arrays; an existing (sku, week) pair is replaced by the new value.
+        """
+        if len(price_history) == 0:
+            return self
+
+        sku_codes = self._encode_skus(price_history['sku'], add=True).astype(np.int64)
+        new_keys = sku_codes * WEEK_SPACE + week_code(price_history['year_week'].reset_index(drop=True))
+
+        keys = np.concatenate([self._keys, new_keys])
+        values = {col: np.concatenate([self._values[col], price_history[col].to_numpy(dtype=float)])
+                  for col in self.value_cols}
+
+        # Stable sort keeps later rows after earlier ones; keep the last per key
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        keep = np.append(keys[1:] != keys[:-1], True)
+
+        self._keys = keys[keep]
+        self._values = {col: vals[order][keep] for col, vals in values.items()}
+        return self
+
+    def _positions(self, sku_codes, weeks, strict):
+        """Index of the as-of row for each query, -1 where no earlier price exists."""
+        targets = sku_codes * WEEK_SPACE + weeks
+        pos = np.searchsorted(self._keys, targets, side='left' if strict else 'right') - 1
+        found = (sku_codes >= 0) & (pos >= 0)
+        found[found] = (self._keys[pos[found]] // WEEK_SPACE) == sku_codes[found]
+        return np.where(found, pos, -1)
+
+    def asof(self, sku, year_week, col='avg_price', strict=False):
+        """Price of SKU as of week (last known if absent). None if never seen."""
+        code = self._encode_skus([sku])
+        pos = self._positions(code.astype(np.int64), np.array([week_code(year_week)]), strict)[0]
+        return None if pos < 0 else float(self._values[col][pos])
+
+    def asof_join(self, df, sku_col='sku', week_col='year_week', cols=None, strict=False):
+        """
+        Vectorised as-of lookup for every row of df.
+
+        Returns a frame aligned to df.index with the requested value columns
+        plus 'asof_week' (the week the price was taken from); NaN where the
+        SKU has no price at or before the row's week.
+        """
+        cols = cols or self.value_cols
+        result = pd.DataFrame(index=df.index)
+        if len(self._keys) == 0:
+            for col in cols:
+                result[col] = np.nan
+            result['asof_week'] = None
+            return result
+
+        sku_codes = self._encode_skus(df[sku_col]).astype(np.int64)
+        pos = self._positions(sku_codes, week_code(df[week_col].reset_index(drop=True)), strict)
+        found = pos >= 0
+
+        for col in cols:
+            result[col] = np.where(found, self._values[col][pos], np.nan)
+        weeks = week_label(np.where(found, self._keys[pos] % WEEK_SPACE, 0))
+        result['asof_week'] = np.where(found, weeks, None)
+        return result
+
+    def fingerprint(self):
+        """Digest of the held prices (used by FeatureCache keys)."""
+        digest = hashlib.sha256(self._keys.tobytes())
+        digest.update('\n'.join(map(str, self._skus)).encode())
+        for col in self.value_cols:
+            digest.update(col.encode() + self._values[col].tobytes())
+        return digest.hexdigest()
+
+    def latest_week(self):
+        """Latest week held in the store ('' when empty)."""
+        return week_label(int((self._keys % WEEK_SPACE).max())) if len(self._keys) else ''
+
+    def to_frame(self):
+        """Materialise the store as a SKU × Week table."""
+        frame = pd.DataFrame({
+            'sku': self._skus.to_numpy()[self._keys // WEEK_SPACE],
+            'year_week': week_label(self._keys % WEEK_SPACE)
+        })
+        for col in self.value_cols:
+            frame[col] = self._values[col]
+        return frame
+
+    def save(self, path):
+        """Persist as CSV (same layout as the price history table)."""
+        self.to_frame().to_csv(path, index=False)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Product Dimension Joins
+=======================
+Vectorised SKU key normalisation and product-attribute joins.
+
+SKU keys arrive in several forms across the pipeline ('ACP-10002' in the
+product master, 10002 / '10002' / 10002.0 in fact tables). They are
+normalised once to a plain string key, and attributes are attached with a
+single join instead of a per-row dictionary lookup.
+
+Usage:
+    products = load_product_master(BASE_PATH / 'features' / 'dim_products.csv')
+    sku_weekly = attach_product_attrs(sku_weekly, products)
+    cats = split_category_path(products['categories'])
+"""
+
+import pandas as pd
+import numpy as np
+
+SKU_PREFIX = 'ACP-'
+UNKNOWN = 'Unknown'
+
+
+def normalize_sku(values):
+    """SKU values -> plain string keys ('ACP-10002', 10002, '10002.0' -> '10002')."""
+    keys = pd.Series(values).astype(str).str.strip()
+    keys = keys.str.replace(f'^{SKU_PREFIX}', '', regex=True)
+    return keys.str.replace(r'^(\d+)\.0+$', r'\1', regex=True)
+
+
+def split_category_path(paths):
+    """
+    Split category paths into levels, vectorised over the unique paths.
+
+    Returns a frame aligned to paths with:
+      category_l1   - second path segment (the first is the catalogue root)
+      category_l2   - third segment, falling back to category_l1
+      category_l3   - last segment
+      category_leaf - raw text after the last '/' (the legacy 'category')
+    Empty or missing paths map to 'Unknown'.
+    """
+    paths = pd.Series(paths)
+    unique = pd.Series(paths.dropna().astype(str).unique())
+
+    # Drop blank segments so 'a / /b/' splits like ['a', 'b']
+    clean = unique.str.strip().str.replace(r'\s*/\s*', '/', regex=True)
+    clean = clean.str.replace(r'/{2,}', '/', regex=True).str.strip('/')
+    parts = clean.str.split('/', expand=True).reindex(columns=range(3))
+
+    levels = pd.DataFrame({
+        'category_l1': parts[1].fillna(UNKNOWN),
+        'category_l2': parts[2].fillna(parts[1]).fillna(UNKNOWN),
+        'category_l3': clean.str.rsplit('/', n=1).str[-1].replace('', UNKNOWN),
+        'category_leaf': unique.str.rsplit('/', n=1).str[-1]
+    })
+    levels.loc[clean == '', ['category_l1', 'category_l2', 'category_l3']] = UNKNOWN
+    levels.loc[unique == '', 'category_leaf'] = UNKNOWN
+    levels.index = unique
+
+    result = levels.reindex(paths.astype(object).where(paths.notna(), None))
+    result.index = paths.index
+    return result.fillna(UNKNOWN)
+
+
+def load_product_master(path):
+    """Load a product master table keyed by normalised SKU (sku_clean)."""
+    products = pd.read_csv(path)
+    products['sku_clean'] = normalize_sku(products['sku']).to_numpy()
+    return products
+
+
+def product_lookup(products, attrs=('brand', 'manufacturer'), default=UNKNOWN):
+    """
+    One row per normalised SKU with the requested attributes plus category levels.
+
+    Duplicate SKUs keep the last row; missing attributes become default.
+    """
+    key = 'sku_clean' if 'sku_clean' in products.columns else 'sku'
+    lookup = products.assign(sku_clean=normalize_sku(products[key]).to_numpy())
+    lookup = lookup.drop_duplicates('sku_clean', keep='last').set_index('sku_clean')
+
+    attrs = [a for a in attrs if a in lookup.columns]
+    result = lookup[attrs].fillna(default)
+    if 'categories' in lookup.columns:
+        result = result.join(split_category_path(lookup['categories']))
+    return result
+
+
+def attach_product_attrs(df, products, sku_col='sku', attrs=('brand', 'manufacturer'),
+                         category_col='category', default=UNKNOWN):
+    """
+    Join product attributes onto df by normalised SKU (row order and index kept).
+
+    category_col receives the legacy leaf category; pass None to attach the
+    L1/L2/L3 levels instead. SKUs missing from the master get default.
+    """
+    lookup = product_lookup(products, attrs, default)
+    if category_col is None:
+        cols = tuple(attrs) + tuple(c for c in ('category_l1', 'category_l2', 'category_l3') if c in lookup.columns)
+    else:
+        lookup = lookup.rename(columns={'category_leaf': category_col})
+        cols = tuple(attrs) + (category_col,)
+    cols = [c for c in dict.fromkeys(cols) if c in lookup.columns]
+
+    keys = pd.Index(normalize_sku(df[sku_col]).to_numpy())
+    attached = lookup[cols].reindex(keys)
+    attached.index = df.index
+
+    df = df.drop(columns=[c for c in cols if c in df.columns])
+    return df.join(attached.fillna(default))
+
+
+def build_product_dimension(skus, products):
+    """
+    Product dimension for the SKUs seen in a fact table.
+
+    skus has 'sku' and 'description'; master attributes win where present.
+    """
+    lookup = products.drop_duplicates('sku_clean', keep='last').set_index('sku_clean')
+    keys = normalize_sku(skus['sku']).to_numpy()
+    master = lookup.reindex(keys)
+    in_master = master.index.isin(lookup.index) if len(lookup) else np.zeros(len(keys), dtype=bool)
+
+    def master_col(col, fallback):
+        values = master[col].to_numpy() if col in master.columns else np.full(len(keys), None)
+        return np.where(in_master, values, fallback)
+
+    dim = pd.DataFrame({
+        'sku': SKU_PREFIX + pd.Series(keys, index=skus.index),
+        'name': master_col('name', skus['description'].to_numpy()),
+        'brand': master_col('brand', UNKNOWN),
+        'manufacturer': master_col('manufacturer', UNKNOWN),
+        'category_path': master_col('categories', ''),
+        'price': master_col('price', 0),
+        'fmcg': master_col('fmcg', UNKNOWN)
+    }, index=skus.index)
+
+    levels = split_category_path(dim['category_path'])
+    for col in ['category_l1', 'category_l2', 'category_l3']:
+        dim[col] = levels[col]
+    return dim
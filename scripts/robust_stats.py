@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Grouped Robust Statistics
+=========================
+Per-series outlier bounds, flags and winsorisation for all series at once.
+
+One grouped quantile / mean / std call per statistic replaces the
+`for group in df[group_col].unique()` mask-and-quantile loops:
+  - iqr_bounds / zscore_bounds      -> per-row lower / upper bounds
+  - flag_outliers                   -> boolean outlier flag per row
+  - winsorize                       -> values clipped to per-series percentiles
+
+Leak-free variants:
+  - fit_mask=...   bounds from the masked rows only (e.g. H1), applied to all rows
+  - causal=True    bounds from each series' earlier rows only (expanding window,
+                   needs order_col), so a row never sees itself or the future
+
+Usage:
+    df['is_outlier'] = flag_outliers(df, 'sku', 'weekly_quantity', threshold=2.0)
+    df['qty_winsorized'] = winsorize(df, 'sku', 'weekly_quantity', fit_mask=df['week_num'] <= 26)
+"""
+
+import pandas as pd
+
+
+def _fit_rows(df, group_col, value_col, fit_mask):
+    """Grouped values the bounds are fitted on."""
+    values = df[value_col] if fit_mask is None else df.loc[fit_mask, value_col]
+    return values.groupby(df[group_col] if fit_mask is None else df.loc[fit_mask, group_col])
+
+
+def _to_rows(df, group_col, per_group):
+    """Broadcast a per-group Series back onto df's rows."""
+    return pd.Series(per_group.reindex(df[group_col]).to_numpy(), index=df.index)
+
+
+def _expanding(df, group_col, value_col, order_col, stat, *args):
+    """Per-row statistic of the series' earlier values only (causal, expanding)."""
+    ordered = df.sort_values([group_col, order_col]) if order_col else df
+    previous = ordered.groupby(group_col)[value_col].shift(1)
+    window = previous.groupby(ordered[group_col]).expanding(min_periods=1)
+    result = getattr(window, stat)(*args).droplevel(0)
+    return result.reindex(df.index)
+
+
+def group_quantiles(df, group_col, value_col, qs, fit_mask=None, causal=False, order_col=None):
+    """Per-row quantiles of the row's series (one column per q)."""
+    if causal:
+        return pd.DataFrame({q: _expanding(df, group_col, value_col, order_col, 'quantile', q)
+                             for q in qs}, index=df.index)
+
+    per_group = _fit_rows(df, group_col, value_col, fit_mask).quantile(list(qs)).unstack()
+    return pd.DataFrame({q: _to_rows(df, group_col, per_group[q]) for q in qs}, index=df.index)
+
+
+def group_counts(df, group_col, value_col, fit_mask=None, causal=False, order_col=None):
+    """Per-row number of observations the row's bounds are based on."""
+    if causal:
+        return _expanding(df, group_col, value_col, order_col, 'count').fillna(0)
+    return _to_rows(df, group_col, _fit_rows(df, group_col, value_col, fit_mask).count()).fillna(0)
+
+
+def iqr_bounds(df, group_col, value_col, threshold=1.5, **fit):
+    """Per-row (lower, upper) = Q1 - threshold * IQR, Q3 + threshold * IQR."""
+    quartiles = group_quantiles(df, group_col, value_col, [0.25, 0.75], **fit)
+    iqr = quartiles[0.75] - quartiles[0.25]
+    return quartiles[0.25] - threshold * iqr, quartiles[0.75] + threshold * iqr
+
+
+def zscore_bounds(df, group_col, value_col, threshold=3.0, fit_mask=None, causal=False, order_col=None):
+    """Per-row (lower, upper) = mean -/+ threshold * std."""
+    if causal:
+        mean = _expanding(df, group_col, value_col, order_col, 'mean')
+        std = _expanding(df, group_col, value_col, order_col, 'std')
+    else:
+        grouped = _fit_rows(df, group_col, value_col, fit_mask)
+        mean = _to_rows(df, group_col, grouped.mean())
+        std = _to_rows(df, group_col, grouped.std())
+    return mean - threshold * std, mean + threshold * std
+
+
+def flag_outliers(df, group_col, value_col, method='iqr', threshold=1.5, min_count=5, **fit):
+    """
+    Outlier flag per row for every series at once.
+
+    Series (or, with causal=True, rows) with fewer than min_count
+    observations behind their bounds are never flagged.
+    """
+    bounds = iqr_bounds if method == 'iqr' else zscore_bounds
+    lower, upper = bounds(df, group_col, value_col, threshold, **fit)
+    enough = group_counts(df, group_col, value_col, **fit) >= min_count
+    values = df[value_col]
+    return ((values < lower) | (values > upper)) & enough
+
+
+def winsorize(df, group_col, value_col, lower_pct=0.05, upper_pct=0.95, **fit):
+    """Values clipped to their series' [lower_pct, upper_pct] percentiles."""
+    bounds = group_quantiles(df, group_col, value_col, [lower_pct, upper_pct], **fit)
+    return df[value_col].clip(bounds[lower_pct], bounds[upper_pct])
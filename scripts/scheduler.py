@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Training Scheduler
+==================
+Per-entity models in order of contribution, within a wall-clock budget.
+
+Entities are ranked by their share of the training rows' revenue (volume
+where the frame has no revenue column), and each is given a tier by the
+share accumulated before it:
+  - tiers = [(name, cumulative share, fit), ...], head first: e.g. the
+    entities making up the first 80% of revenue get the full model, the
+    next 15% a lighter one
+  - fits run head first in chunks (fit_groups, group_training.py); before
+    each chunk, the first included, the time left is compared with the
+    chunk's expected time (seconds per fit so far, carried over from the
+    previous tier / level at a tier's start), and a tier stops at the first
+    chunk that does not fit - its remaining entities move to the front of
+    the next tier
+  - entities past the last tier, with fewer than min_rows rows or not reached
+    within the budget are predicted by the fallback model (the baseline), so
+    the prediction set is always complete
+
+One budget covers every level trained through the same scheduler; the clock
+starts at the first train() (or an explicit start()), not at construction, so
+loading the data does not count against it. schedule() holds the per-entity
+plan and outcome (entities under min_rows are planned for the baseline),
+report() the entities, contribution share and seconds per level and tier.
+
+Usage:
+    scheduler = TrainingScheduler(budget_minutes(sys.argv) * 60, [('full', 0.80, fit), ('light', 0.95, light_fit)])
+    rows, models = scheduler.train(train, test, 'sku', features, 'weekly_quantity',
+                                   fallback=global_model, min_rows=4)
+    log(scheduler.summary())
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from group_training import GROUP_BATCH, GROUP_WORKERS, fit_groups, group_jobs, predict_per_group
+
+# Tier of entities predicted by the fallback model
+BASELINE = 'baseline'
+
+# Trainer flag: --time-budget, --time-budget=MINUTES or --time-budget MINUTES
+BUDGET_FLAG = '--time-budget'
+
+
+def budget_minutes(argv=None, default=None):
+    """
+    Minutes given with BUDGET_FLAG (default when the flag has no value, None
+    without the flag). A value that is not a number raises ValueError.
+    """
+    argv = sys.argv if argv is None else argv
+    for i, arg in enumerate(argv):
+        if arg.startswith(BUDGET_FLAG + '='):
+            value = arg.split('=', 1)[1]
+        elif arg == BUDGET_FLAG:
+            following = argv[i + 1] if i + 1 < len(argv) else ''
+            value = following if not following.startswith('--') and following else None
+        else:
+            continue
+        if value is None:
+            return default
+        try:
+            return float(value)
+        except ValueError:
+            raise ValueError(f"{BUDGET_FLAG} takes minutes, got '{value}'") from None
+    return None
+
+
+def rank_entities(train, id_col, weight_col='weekly_revenue', value_col='weekly_quantity'):
+    """
+    Entities of train by descending contribution (sum of weight_col, value_col
+    when train has no weight_col): contribution, share, cum_share, rank.
+    """
+    col = weight_col if weight_col in train.columns else value_col
+    contribution = train[col].fillna(0).clip(lower=0).groupby(train[id_col], sort=False, observed=True).sum()
+    ranking = contribution.sort_values(ascending=False, kind='stable').rename('contribution').reset_index()
+    total = ranking['contribution'].sum()
+    ranking['share'] = ranking['contribution'] / total if total > 0 else 1 / max(len(ranking), 1)
+    ranking['cum_share'] = ranking['share'].cumsum()
+    ranking['rank'] = np.arange(1, len(ranking) + 1)
+    return ranking
+
+
+def assign_tiers(ranking, tiers):
+    """Tier name per ranked entity: the first tier whose cut-off the share before it is under."""
+    prior = (ranking['cum_share'] - ranking['share']).to_numpy()
+    labels = np.full(len(ranking), BASELINE, dtype=object)
+    for name, cutoff, _ in reversed(tiers):
+        labels[prior < cutoff] = name
+    return labels
+
+
+class TrainingScheduler:
+    """Contribution-ranked, tiered per-entity training under one wall-clock budget."""
+
+    def __init__(self, budget_seconds, tiers, workers=GROUP_WORKERS):
+        self.budget = budget_seconds
+        self.deadline = None
+        self.per_fit = 0
+        self.tiers = tiers
+        self.workers = workers
+        self.schedules = []
+        self.timings = []
+
+    def start(self):
+        """Start the budget's clock (once; later calls keep the first deadline)."""
+        if self.deadline is None:
+            self.deadline = time.monotonic() + self.budget
+
+    def remaining(self):
+        if self.deadline is None:
+            return self.budget
+        return self.deadline - time.monotonic()
+
+    def train(self, train, test, id_col, features, target, fallback, min_rows,
+              required=None, weights=None, checkpoint=None, weight_col='weekly_revenue'):
+        """
+        train_per_group (group_training.py) in contribution order within the
+        budget; groups without a model are predicted by the fallback.
+
+        Returns (test rows with 'predicted' and 'model_type', group -> model).
+        """
+        self.start()
+        required = list(features) if required is None else list(required)
+        ranking = rank_entities(train, id_col, weight_col, target)
+        ranking['tier'] = assign_tiers(ranking, self.tiers)
+        ranking['trained'] = BASELINE
+
+        # Fit jobs of every eligible entity, slices of one feature matrix
+        jobs = {job[0]: job for job in group_jobs(train.dropna(subset=required), id_col, features, target,
+                                                    min_rows, weights)}
+        eligible = ranking[id_col].isin(list(jobs)).to_numpy()
+        ranking.loc[~eligible, 'tier'] = BASELINE
+        index_of = {group: i for i, group in enumerate(ranking[id_col])}
+
+        models = {}
+        carried = []
+        chunk = GROUP_BATCH * max(1, self.workers)
+        for name, _, fit in self.tiers:
+            groups = carried + ranking.loc[(ranking['tier'] == name).to_numpy() & eligible, id_col].tolist()
+            carried = []
+
+            # Models of this tier checkpointed by the run being resumed cost no time
+            loop = f'{id_col}_{name}'
+            done = checkpoint.done(loop) if checkpoint is not None else {}
+            for group in groups:
+                if group in done and done[group]['model'] is not None:
+                    models[group] = done[group]['model']
+                    ranking.iat[index_of[group], ranking.columns.get_loc('trained')] = name
+            groups = [group for group in groups if group not in done]
+
+            start, fitted = time.monotonic(), 0
+            for i in range(0, len(groups), chunk):
+                part = groups[i:i + chunk]
+                if fitted:
+                    self.per_fit = (time.monotonic() - start) / fitted
+                if self.remaining() <= 0 or self.per_fit * len(part) > self.remaining():
+                    carried = groups[i:]
+                    break
+                chunk_models = fit_groups([jobs[group] for group in part], fit, self.workers)
+                if checkpoint is not None:
+                    checkpoint.add_many(loop, {group: {'model': model} for group, model in chunk_models.items()})
+                for group, model in chunk_models.items():
+                    if model is not None:
+                        models[group] = model
+                        ranking.iat[index_of[group], ranking.columns.get_loc('trained')] = name
+                fitted += len(part)
+            self.timings.append({'level': id_col, 'tier': name, 'seconds': time.monotonic() - start})
+
+        ranking.insert(0, 'level', id_col)
+        self.schedules.append(ranking.rename(columns={id_col: 'key'}))
+        return predict_per_group(test, id_col, features, models, fallback, required), models
+
+    def schedule(self):
+        """Per entity: level, key, contribution, share, cum_share, rank, planned tier, trained tier."""
+        if not self.schedules:
+            return pd.DataFrame(columns=['level', 'key', 'contribution', 'share', 'cum_share', 'rank',
+                                         'tier', 'trained'])
+        schedule = pd.concat(self.schedules, ignore_index=True)
+        schedule['key'] = schedule['key'].astype(str)
+        return schedule
+
+    def report(self):
+        """Per level and tier: entities planned / trained, their contribution share, seconds spent."""
+        schedule = self.schedule()
+        tier_order = [name for name, _, _ in self.tiers] + [BASELINE]
+        planned = schedule.groupby(['level', 'tier'], sort=False).agg(
+            planned=('key', 'size'), planned_share=('share', 'sum'))
+        trained = schedule.groupby(['level', 'trained'], sort=False).agg(
+            trained=('key', 'size'), trained_share=('share', 'sum'))
+        trained.index.names = ['level', 'tier']
+        seconds = pd.DataFrame(self.timings).groupby(['level', 'tier'], sort=False)['seconds'].sum() \
+            if self.timings else pd.Series(dtype=float, name='seconds')
+        report = planned.join(trained, how='outer').join(seconds, how='left').fillna(0).reset_index()
+        report[['planned', 'trained']] = report[['planned', 'trained']].astype(int)
+        report['tier'] = pd.Categorical(report['tier'], tier_order, ordered=True)
+        levels = list(dict.fromkeys(schedule['level']))
+        report['level'] = pd.Categorical(report['level'], levels, ordered=True)
+        return report.sort_values(['level', 'tier']).reset_index(drop=True)
+
+    def summary(self):
+        """One-line budget report for the training log."""
+        used = self.budget - self.remaining()
+        schedule = self.schedule()
+        modelled = (schedule['trained'] != BASELINE).sum()
+        return (f"Schedule: {used / 60:.1f} of {self.budget / 60:.1f} min used, "
+                f"{modelled}/{len(schedule)} entities with their own model")
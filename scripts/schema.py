@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Typed Key Schema
+================
+Compact categorical dtypes for the keys that travel through the pipeline.
+
+sku, customer_id, region_name, category, year_week, buyer_type,
+customer_segment, data_completeness (and the other columns listed in
+CATEGORICAL_COLUMNS) are held as pandas categoricals over one shared
+dictionary per column, so:
+  - every table encodes the same key to the same integer code
+  - merges and groupbys run on the int codes instead of Python strings
+  - the int/str flips ('10002' vs 10002 vs 10002.0) are resolved once,
+    on load, instead of with astype(str) before every merge
+
+Dictionaries are kept sorted, so sort_values / groupby order on an encoded
+column is the same as on the plain strings (year_week is also ordered, so
+min / max work). They can be saved next to the
+feature tables (schema_dictionaries.json) and reloaded by later stages.
+Exports write the labels, so CSV outputs are unchanged.
+
+Usage:
+    schema = Schema.load(FEATURES_DIR)
+    weekly = schema.read_csv(FEATURES_DIR / 'v2_features_weekly.csv')
+    products = schema.read_csv(FEATURES_DIR / 'v2_dim_products.csv')
+    weekly = schema.merge(weekly, products[['sku', 'category_l1']], on='sku', how='left')
+    h1 = weekly[at_or_before(weekly['year_week'], '2025-W26')]
+    schema.save(FEATURES_DIR)
+"""
+
+import json
+from pathlib import Path
+
+import pandas as pd
+import numpy as np
+
+from product_dim import normalize_sku
+
+DICTIONARY_FILE = 'schema_dictionaries.json'
+
+# Low-cardinality columns stored as categoricals
+CATEGORICAL_COLUMNS = (
+    'sku', 'customer_id', 'region_name', 'primary_region',
+    'category', 'category_l1', 'category_l2', 'category_l3',
+    'year_week', 'buyer_type', 'customer_segment', 'cycle_regularity',
+    'data_completeness', 'model_version'
+)
+
+# Numeric ids that arrive as int, float or str
+ID_COLUMNS = ('customer_id',)
+
+# Sorted dictionaries whose order is meaningful (min / max / sort by week)
+ORDERED_COLUMNS = ('year_week',)
+
+
+def clean_keys(values, col):
+    """Key values -> canonical strings (NaN kept); SKUs also lose the 'ACP-' prefix."""
+    values = pd.Series(values)
+    present = values.notna()
+    if col == 'sku':
+        keys = normalize_sku(values[present])
+    else:
+        keys = values[present].astype(str).str.strip()
+        if col in ID_COLUMNS:
+            keys = keys.str.replace(r'^(\d+)\.0+$', r'\1', regex=True)
+    result = pd.Series(np.full(len(values), np.nan, dtype=object), index=values.index)
+    result[present] = keys.to_numpy()
+    return result
+
+
+class Schema:
+    """Shared per-column dictionaries for the categorical key columns."""
+
+    def __init__(self, dictionaries=None, columns=CATEGORICAL_COLUMNS):
+        self.columns = tuple(columns)
+        self.dictionaries = {col: pd.Index(sorted(values), dtype=object)
+                             for col, values in (dictionaries or {}).items()}
+        # Dictionary file this schema was loaded from (None when built in memory)
+        self.path = None
+
+    @classmethod
+    def load(cls, directory):
+        """Load saved dictionaries from directory (empty schema if none saved)."""
+        path = Path(directory) / DICTIONARY_FILE
+        if not path.exists():
+            schema = cls()
+        else:
+            with open(path) as f:
+                schema = cls(json.load(f))
+        schema.path = path
+        return schema
+
+    def save(self, directory):
+        """Persist the dictionaries as JSON next to the feature tables."""
+        with open(Path(directory) / DICTIONARY_FILE, 'w') as f:
+            json.dump({col: list(values) for col, values in self.dictionaries.items()}, f)
+
+    def categories(self, col):
+        return self.dictionaries.get(col, pd.Index([], dtype=object))
+
+    def _extend(self, col, values):
+        """Add unseen values to the column's dictionary (kept sorted)."""
+        new = pd.Index(pd.unique(values.dropna())).difference(self.categories(col))
+        if len(new) > 0:
+            self.dictionaries[col] = self.categories(col).append(new).sort_values()
+
+    def encode(self, df, columns=None):
+        """
+        Convert the schema's key columns present in df to shared categoricals.
+
+        Unseen values extend the dictionary; columns already encoded are
+        re-aligned to the current dictionary (codes may shift, labels do not).
+        """
+        columns = [c for c in (columns or self.columns) if c in df.columns]
+        if not columns:
+            return df
+        df = df.copy()
+        for col in columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                keys = df[col].cat.categories.to_series()
+                self._extend(col, keys)
+                df[col] = df[col].cat.set_categories(self.categories(col), ordered=col in ORDERED_COLUMNS)
+                continue
+            # Clean the unique values only, then map row codes onto the dictionary
+            codes, uniques = pd.factorize(df[col])
+            keys = clean_keys(pd.Series(uniques, dtype=object), col)
+            self._extend(col, keys)
+            positions = np.append(self.categories(col).get_indexer(keys), -1)
+            df[col] = pd.Categorical.from_codes(positions[codes], categories=self.categories(col),
+                                                ordered=col in ORDERED_COLUMNS)
+        return df
+
+    def read_csv(self, path, **kwargs):
+        """pd.read_csv with key columns read as text and encoded."""
+        header = pd.read_csv(path, nrows=0).columns
+        dtype = {c: str for c in self.columns if c in header}
+        dtype.update(kwargs.pop('dtype', {}))
+        return self.encode(pd.read_csv(path, dtype=dtype, **kwargs))
+
+    def fillna(self, df, col, value):
+        """Fill missing keys of df[col] with value (added to the column's dictionary)."""
+        self._extend(col, pd.Series([value]))
+        df = self.encode(df, [col])
+        df[col] = df[col].fillna(value)
+        return df
+
+    def merge(self, left, right, on, **kwargs):
+        """Merge on key columns encoded against the same dictionary (joins on codes)."""
+        keys = [on] if isinstance(on, str) else list(on)
+        left = self.encode(left, keys)
+        right = self.encode(right, keys)
+        # left was encoded first; re-align it if right extended a dictionary
+        left = self.encode(left, keys)
+        return left.merge(right, on=on, **kwargs)
+
+
+def at_or_before(values, label):
+    """values <= label for a plain or encoded key column (labels need not be in the dictionary)."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        cut = values.cat.categories.searchsorted(label, side='right')
+        return pd.Series((values.cat.codes < cut) & values.notna(), index=values.index)
+    return values <= label
+
+
+def decode(df, columns=None):
+    """Categorical columns back to plain object strings (e.g. for dict keys or uploads)."""
+    columns = columns or [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    df = df.copy()
+    for col in columns:
+        df[col] = df[col].astype(object).where(df[col].notna(), None)
+    return df
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Hyperparameter Search
+=====================
+Successive halving over model hyperparameters, candidates scored in parallel.
+
+  - candidates: the current defaults plus configs sampled from a search space
+  - each rung scores every surviving candidate on a budget (e.g. a number of
+    SKUs), then keeps the best 1/ETA for the next, larger budget
+  - so most configs are discarded after a cheap run on a small subset and
+    only the last few are scored on the full budget
+
+evaluate(params, budget) -> error (lower is better) must be a module-level
+function (it is sent to the worker processes by reference); data it needs is
+set up once per worker by initializer(*initargs) instead of being sent with
+every task. A candidate whose evaluation raises scores inf.
+
+Usage:
+    candidates = [DEFAULTS] + sample_configs(SEARCH_SPACE, 26)
+    results = successive_halving(candidates, evaluate_on_skus, budgets=[40, 120, 360],
+                                 initializer=init_worker, initargs=(train, test))
+    best = results.iloc[0]['params']
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Candidates are scored in parallel worker processes
+TUNE_WORKERS = min(4, os.cpu_count() or 1)
+
+# Fraction of candidates kept per rung is 1 / ETA
+ETA = 3
+
+
+def sample_configs(space, n, seed=42):
+    """n distinct configs drawn from name -> list of values (fewer if the space is smaller)."""
+    rng = np.random.default_rng(seed)
+    names = list(space)
+    size = int(np.prod([len(space[name]) for name in names]))
+    configs, seen = [], set()
+    for _ in range(50 * n):
+        if len(configs) >= min(n, size):
+            break
+        choice = tuple(int(rng.integers(len(space[name]))) for name in names)
+        if choice not in seen:
+            seen.add(choice)
+            configs.append({name: space[name][i] for name, i in zip(names, choice)})
+    return configs
+
+
+def rung_budgets(full_budget, n_rungs, eta=ETA, minimum=1):
+    """Budgets growing by eta per rung, the last one full_budget."""
+    return [max(minimum, int(round(full_budget / eta ** (n_rungs - 1 - r)))) for r in range(n_rungs)]
+
+
+def _score(evaluate, candidate_id, params, budget):
+    """Worker: (candidate, error, seconds) of one evaluation."""
+    start = time.time()
+    try:
+        error = float(evaluate(params, budget))
+    except Exception:
+        error = np.inf
+    return candidate_id, error, time.time() - start
+
+
+def successive_halving(candidates, evaluate, budgets, eta=ETA, workers=TUNE_WORKERS,
+                       initializer=None, initargs=(), log=print):
+    """
+    Score candidates (list of param dicts) rung by rung on increasing budgets.
+
+    Returns one row per evaluation (rung, budget, candidate, params, error,
+    seconds, kept), the last rung's best first.
+    """
+    workers = max(1, min(workers or 1, len(candidates)))
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs)
+    elif initializer is not None:
+        initializer(*initargs)
+
+    rows = []
+    alive = list(range(len(candidates)))
+    try:
+        for rung, budget in enumerate(budgets):
+            start = time.time()
+            args = [(evaluate, i, candidates[i], budget) for i in alive]
+            scored = pool.map(_score, *zip(*args)) if pool is not None else (_score(*a) for a in args)
+            scored = sorted(scored, key=lambda s: (s[1], s[0]))
+
+            last = rung == len(budgets) - 1
+            keep = len(scored) if last else max(1, len(scored) // eta)
+            for rank, (i, error, seconds) in enumerate(scored):
+                rows.append({'rung': rung, 'budget': budget, 'candidate': i, 'params': candidates[i],
+                             'error': error, 'seconds': round(seconds, 2), 'kept': rank < keep})
+            log(f"  Rung {rung + 1}/{len(budgets)}: {len(scored)} candidates on budget {budget}, "
+                f"best {scored[0][1]:.2f} (#{scored[0][0]}), {time.time() - start:.1f}s")
+            alive = [i for i, _, _ in scored[:keep]]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    results = pd.DataFrame(rows)
+    return results.sort_values(['rung', 'error', 'candidate'], ascending=[False, True, True]).reset_index(drop=True)
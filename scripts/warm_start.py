@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Warm-Start Retraining
+=====================
+Weekly model refreshes that add trees for the new weeks instead of refitting.
+
+Each model's state (fitted model, features, last trained week and its errors
+on the weeks added since its fit) is pickled per model set in the state
+directory. On the next run, the rows of weeks after the model's last trained
+week are:
+  - scored with the stored model first (drift check: WMAPE on the new weeks)
+  - within the drift threshold - DRIFT_RATIO × the model's mean stored error,
+    at least DRIFT_FLOOR: the model gets EXTRA_TREES more boosting stages,
+    fitted on the new rows only (GradientBoostingRegressor warm_start)
+  - above it, or when the features changed: full refit on all rows
+
+Stored errors are all out-of-sample (weeks the model had not seen), so a
+model's first refresh after a fit has only the floor to clear; its error
+then becomes the baseline. In-sample errors are not used: boosted per-entity
+models fit their training weeks almost exactly, which would put the
+threshold near zero.
+
+HistGradientBoosting models are refit: they do warm-start (warm_start=True
+with a higher max_iter), but each fit rebuilds the bin mapper from the rows
+given and replays the stored trees on them by bin index, so on the new weeks'
+rows alone the stored trees' predictions - and the residuals the added trees
+fit - would be wrong.
+
+Usage:
+    store = ModelStore(BASE_PATH / 'model_state' / 'v4')
+    global_model = store.retrain('sku_global', train_valid, features, 'weekly_quantity', train_model)
+    rows, models = store.train_per_group(train, test, 'sku', features, 'weekly_quantity',
+                                         train_model, min_rows=4, fallback=global_model)
+    log(store.summary())
+
+Delete the state directory to force a full rebuild.
+"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from group_training import GROUP_WORKERS, fit_groups, predict_per_group
+
+# Boosting stages added per refresh, fitted on the new weeks' rows
+EXTRA_TREES = 20
+
+# Full refit when the error on new weeks exceeds this × the model's usual error
+DRIFT_RATIO = 1.5
+
+# ... and this WMAPE (%), so noisy weeks of an accurate model do not force refits
+DRIFT_FLOOR = 100.0
+
+ACTIONS = ('fit', 'refit', 'warm', 'unchanged')
+
+
+def _wmape(actual, predicted):
+    total = np.sum(actual)
+    return 100 * np.sum(np.abs(actual - predicted)) / total if total > 0 else None
+
+
+def can_warm_start(model):
+    """Boosting models whose extra trees can be fitted on new rows only."""
+    return hasattr(model, 'estimators_') and 'n_estimators' in model.get_params()
+
+
+def add_trees(model, X, y, n_trees=EXTRA_TREES, sample_weight=None):
+    """n_trees more boosting stages, fitted on X / y (in place)."""
+    model.set_params(warm_start=True, n_estimators=model.n_estimators + n_trees)
+    model.fit(X, y, sample_weight=sample_weight)
+    return model
+
+
+def model_state(model, frame, features, week_col='year_week', errors=()):
+    """Stored state of a model trained on frame."""
+    return {'model': model, 'features': list(features),
+            'trained_through': frame[week_col].astype(str).max(), 'errors': list(errors)}
+
+
+def drift_threshold(errors, drift_ratio=DRIFT_RATIO, floor=DRIFT_FLOOR):
+    """WMAPE above which new weeks count as drift: drift_ratio × mean error, at least floor."""
+    return max(drift_ratio * np.mean(errors), floor) if len(errors) else floor
+
+
+def plan(state, frame, features, target, week_col='year_week', drift_ratio=DRIFT_RATIO, floor=DRIFT_FLOOR):
+    """
+    What a model needs for frame: ('fit' | 'refit' | 'warm' | 'unchanged',
+    mask of rows after its last trained week, its WMAPE on those rows).
+    """
+    if state is None or state['features'] != list(features):
+        return 'fit', None, None
+    new = frame[week_col].astype(str).to_numpy() > state['trained_through']
+    if not new.any():
+        return 'unchanged', new, None
+    if not can_warm_start(state['model']):
+        return 'refit', new, None
+
+    rows = frame[new]
+    predicted = np.clip(state['model'].predict(rows[features].fillna(0)), 0, None)
+    error = _wmape(rows[target].to_numpy(), predicted)
+    if error is not None and error > drift_threshold(state['errors'], drift_ratio, floor):
+        return 'refit', new, error
+    return 'warm', new, error
+
+
+class ModelStore:
+    """Model states per model set, pickled in state_dir between runs."""
+
+    def __init__(self, state_dir, n_trees=EXTRA_TREES, drift_ratio=DRIFT_RATIO, drift_floor=DRIFT_FLOOR,
+                 week_col='year_week'):
+        self.state_dir = Path(state_dir)
+        self.n_trees = n_trees
+        self.drift_ratio = drift_ratio
+        self.drift_floor = drift_floor
+        self.week_col = week_col
+        self.actions = dict.fromkeys(ACTIONS, 0)
+
+    def _path(self, name):
+        return self.state_dir / f'{name}.pkl'
+
+    def load(self, name):
+        """key -> state for a model set ({} when missing or unreadable: full fit)."""
+        path = self._path(name)
+        if not path.exists():
+            return {}
+        try:
+            return pd.read_pickle(path)
+        except Exception:
+            return {}
+
+    def save(self, name, states):
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(name)
+        tmp = path.with_suffix('.tmp')
+        pd.to_pickle(states, tmp)
+        os.replace(tmp, path)
+
+    def _update(self, states, frames, features, target, fit, weights, workers, checkpoint=None, loop=None):
+        """key -> updated state for key -> training frame; full fits run in parallel."""
+        updated, jobs = {}, []
+        for key, frame in frames.items():
+            state = states.get(key)
+            action, new, error = plan(state, frame, features, target, self.week_col, self.drift_ratio,
+                                      self.drift_floor)
+            self.actions[action] += 1
+            if action in ('fit', 'refit'):
+                weight = weights(frame) if weights is not None else None
+                jobs.append((key, frame[features].fillna(0), frame[target], weight))
+            elif action == 'warm':
+                rows = frame[new]
+                weight = weights(rows) if weights is not None else None
+                add_trees(state['model'], rows[features].fillna(0), rows[target], self.n_trees, weight)
+                errors = state['errors'] + ([error] if error is not None else [])
+                updated[key] = model_state(state['model'], frame, features, self.week_col, errors)
+            else:
+                updated[key] = state
+
+        for key, model in fit_groups(jobs, fit, workers, checkpoint, loop).items():
+            if model is not None:
+                updated[key] = model_state(model, frames[key], features, self.week_col)
+        return updated
+
+    def retrain(self, name, frame, features, target, fit, weights=None):
+        """One model on all of frame, brought up to date from its stored state."""
+        states = self._update(self.load(name), {name: frame}, features, target, fit, weights, workers=1)
+        self.save(name, states)
+        return states[name]['model']
+
+    def train_per_group(self, train, test, group_col, features, target, fit, min_rows,
+                        fallback=None, required=None, weights=None, workers=GROUP_WORKERS,
+                        checkpoint=None, name=None):
+        """
+        group_training.train_per_group with the group models kept in the
+        store (model set name: group_col unless given).
+        """
+        required = list(features) if required is None else list(required)
+        name = name or group_col
+        train = train.dropna(subset=required)
+
+        frames = {group: train.iloc[pos]
+                  for group, pos in train.groupby(group_col, sort=False, observed=True).indices.items()
+                  if len(pos) >= min_rows}
+        states = self._update(self.load(name), frames, features, target, fit, weights, workers, checkpoint, name)
+        self.save(name, states)
+
+        models = {group: state['model'] for group, state in states.items()}
+        return predict_per_group(test, group_col, features, models, fallback, required), models
+
+    def summary(self):
+        """One-line action report for the training log."""
+        return "Model state: " + ', '.join(f"{self.actions[a]} {a}" for a in ACTIONS)
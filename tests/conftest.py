@@ -0,0 +1,53 @@
+"""Tests import the helper modules the way the scripts do (scripts/ on the path, plus the repo root)."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.tree import DecisionTreeRegressor
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+# Feature columns of the synthetic per-group frames
+FEATURES = ['lag1', 'lag2']
+
+
+def fit_tree(X, y, sample_weight=None):
+    """Module-level fit (group_training sends it to worker processes by reference)."""
+    return DecisionTreeRegressor(max_depth=3, random_state=0).fit(X, y, sample_weight=sample_weight)
+
+
+def group_frame(sizes, group_col='group', target='y', missing=0.0, seed=0):
+    """
+    Rows per group (group -> count) with FEATURES, a 'weight' column and
+    target = 2 × lag1 + lag2; a share `missing` of lag2 is NaN (counted as 0).
+    """
+    rng = np.random.default_rng(seed)
+    groups = np.repeat(list(sizes), list(sizes.values()))
+    n = len(groups)
+    frame = pd.DataFrame({
+        group_col: groups,
+        'lag1': rng.random(n) * 10,
+        'lag2': np.where(rng.random(n) < missing, np.nan, rng.random(n) * 10),
+        'weight': rng.random(n) + 0.5,
+    })
+    frame[target] = frame['lag1'] * 2 + np.nan_to_num(frame['lag2'])
+    return frame
+
+
+@pytest.fixture(scope='module')
+def group_frames():
+    """(train, test): four groups of 30 / 20 / 10 / 3 rows, shuffled, 10% of lag2 missing."""
+    frame = group_frame({'a': 30, 'b': 20, 'c': 10, 'd': 3}, missing=0.1)
+    frame = frame.sample(frac=1, random_state=1).reset_index(drop=True)
+    return frame.iloc[:45].reset_index(drop=True), frame.iloc[45:].reset_index(drop=True)
+
+
+@pytest.fixture(scope='module')
+def sku_frame():
+    """SKUs of 30 / 20 / 10 / 2 weekly rows, no missing features."""
+    return group_frame({'a': 30, 'b': 20, 'c': 10, 'd': 2}, group_col='sku', target='weekly_quantity')
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregation import aggregate_levels
+
+MEASURES = {
+    'weekly_quantity': ('quantity', 'sum'),
+    'avg_unit_price': ('unit_price', 'mean'),
+    'weekly_revenue': ('line_total', 'sum'),
+    'order_count': ('invoice_id', 'nunique'),
+    'description': ('desc', 'first'),
+}
+
+LEVELS = {
+    'sku_customer_week': (['sku', 'customer_id', 'year_week'], {**MEASURES, 'first_region': ('region', 'first')}),
+    'sku_week': (['sku', 'year_week'], {**MEASURES, 'unique_customers': ('customer_id', 'nunique'),
+                                         'max_price': ('unit_price', 'max')}),
+    'category_week': (['category', 'year_week'], {'quantity': ('quantity', 'sum'), 'price': ('unit_price', 'mean'),
+                                                  'skus': ('sku', 'nunique')}),
+    'week': (['year_week'], {'quantity': ('quantity', 'sum'), 'priced': ('unit_price', 'count'),
+                             'rows': ('quantity', 'size'), 'customers': ('customer_id', 'nunique')}),
+    'sku': (['sku'], {'min_price': ('unit_price', 'min'), 'price_std': ('unit_price', 'std'),
+                      'weeks': ('year_week', 'nunique'), 'description': ('desc', 'first')}),
+}
+
+
+@pytest.fixture(scope='module')
+def lines():
+    rng = np.random.default_rng(0)
+    n = 3000
+    df = pd.DataFrame({
+        'sku': rng.integers(100, 140, n),
+        'customer_id': rng.integers(1, 30, n).astype(float),
+        'year_week': [f'2025-W{w:02d}' for w in rng.integers(1, 12, n)],
+        'quantity': rng.integers(1, 10, n),
+        'unit_price': np.where(rng.random(n) < 0.1, np.nan, rng.random(n) * 100),
+        'invoice_id': rng.integers(0, 800, n),
+        'region': rng.choice(['a', 'b', 'c'], n),
+        'category': rng.choice(['X', 'Y', 'Z'], n),
+    })
+    df['desc'] = np.where(rng.random(n) < 0.3, None, df['region'])
+    df['line_total'] = df['quantity'] * df['unit_price'].fillna(0)
+    df.loc[rng.random(n) < 0.02, 'category'] = np.nan
+    df.loc[rng.random(n) < 0.02, 'customer_id'] = np.nan
+    return df
+
+
+@pytest.mark.parametrize('name', list(LEVELS))
+def test_levels_match_groupby(lines, name):
+    tables = aggregate_levels(lines, LEVELS)
+    keys, measures = LEVELS[name]
+    expected = lines.groupby(keys).agg(**measures).reset_index()
+    got = tables[name][expected.columns].reset_index(drop=True)
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False, check_exact=False, rtol=1e-9)
+
+
+def test_single_level_matches_groupby(lines):
+    keys, measures = LEVELS['sku_week']
+    got = aggregate_levels(lines, {'sku_week': LEVELS['sku_week']})['sku_week']
+    expected = lines.groupby(keys).agg(**measures).reset_index()
+    pd.testing.assert_frame_equal(got[expected.columns], expected, check_dtype=False, check_exact=False, rtol=1e-9)
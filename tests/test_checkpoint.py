@@ -0,0 +1,46 @@
+import pickle
+
+from checkpoint import Checkpoint
+
+
+def records(names):
+    return {name: {'predictions': [name], 'model': None} for name in names}
+
+
+def test_resume_reads_completed_batches(tmp_path):
+    checkpoint = Checkpoint(tmp_path, every=2)
+    for name, record in records('abc').items():
+        checkpoint.add('sku', name, record)
+    checkpoint.flush()
+
+    resumed = Checkpoint(tmp_path, resume=True)
+    assert resumed.run_id == checkpoint.run_id
+    assert resumed.done('sku') == records('abc')
+    assert resumed.done('customer') == {}
+
+
+def test_batch_truncated_mid_record_is_dropped(tmp_path):
+    checkpoint = Checkpoint(tmp_path)
+    checkpoint.add_many('sku', records('ab'))
+    checkpoint.add_many('sku', records('cd'))
+    path = checkpoint.run_dir / 'sku.pkl'
+    size = path.stat().st_size
+    second = len(pickle.dumps(records('cd'), protocol=pickle.HIGHEST_PROTOCOL))
+
+    # A crash part-way through appending the second batch
+    with open(path, 'r+b') as f:
+        f.truncate(size - second // 2)
+
+    resumed = Checkpoint(tmp_path, resume=True)
+    assert resumed.done('sku') == records('ab')
+    assert path.stat().st_size == size - second
+
+    # Appends after the dropped batch stay readable
+    resumed.add_many('sku', records('ce'))
+    assert Checkpoint(tmp_path, resume=True).done('sku') == records('abce')
+
+
+def test_new_run_starts_empty(tmp_path):
+    Checkpoint(tmp_path).add_many('sku', records('ab'))
+    fresh = Checkpoint(tmp_path)
+    assert fresh.done('sku') == {}
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from completeness import (WEEK_TABLE_FILE, broadcast, complete_mask, coverage_scores,
+                          load_week_scores, sample_weights, week_region_counts,
+                          week_scores_from_argv)
+
+LINES = pd.DataFrame({
+    'year_week': ['2025-W01'] * 4 + ['2025-W02'] * 4 + ['2025-W03'],
+    'region_name': ['N', 'N', 'S', 'S', 'N', 'N', 'S', 'S', 'N'],
+})
+
+SCORES = pd.DataFrame({'year_week': ['2025-W01', '2025-W02', '2025-W03'],
+                       'coverage_score': [1.0, 0.4, 0.0]})
+
+
+def test_week_region_counts_fill_unknown_region():
+    df = pd.DataFrame({'year_week': ['2025-W01', '2025-W01', '2025-W02'],
+                       'region_name': ['N', None, 'N']})
+    counts = week_region_counts(df)
+    assert list(counts.columns) == ['N', 'Unknown']
+    assert counts.loc['2025-W01'].tolist() == [1, 1]
+    assert counts.loc['2025-W02'].tolist() == [1, 0]
+
+
+def test_partial_week_scores_below_complete_weeks():
+    week_table, region_table = coverage_scores(week_region_counts(LINES))
+    scores = dict(zip(week_table['year_week'], week_table['coverage_score']))
+    assert scores['2025-W01'] == scores['2025-W02'] == 1.0
+    assert scores['2025-W03'] == 0.25
+    assert week_table['data_completeness'].tolist() == ['complete', 'complete', 'minimal']
+    w3 = region_table[region_table['year_week'] == '2025-W03'].set_index('region_name')['region_score']
+    assert w3.to_dict() == {'N': 0.5, 'S': 0.0}
+
+
+def test_broadcast_matches_categorical_and_object_keys():
+    df = pd.DataFrame({'year_week': ['2025-W03', '2025-W09', '2025-W01']})
+    plain = broadcast(df, SCORES, 'coverage_score')
+    coded = broadcast(df.astype({'year_week': 'category'}), SCORES, 'coverage_score')
+    np.testing.assert_array_equal(plain, [0.0, np.nan, 1.0])
+    np.testing.assert_array_equal(coded, plain)
+
+
+def test_sample_weights_floor_and_unknown_weeks():
+    df = pd.DataFrame({'year_week': ['2025-W01', '2025-W02', '2025-W03', '2025-W09']})
+    np.testing.assert_allclose(sample_weights(df, SCORES), [1.0, 0.4, 0.1, 1.0])
+    assert sample_weights(df, None) is None
+
+
+def test_complete_mask_passes_weeks_without_scores():
+    df = pd.DataFrame({'year_week': ['2025-W01', '2025-W02', '2025-W09']})
+    assert complete_mask(df, SCORES).tolist() == [True, False, True]
+
+
+def test_week_scores_only_with_flag(tmp_path):
+    pd.DataFrame({'year_week': ['2025-W01', '2025-W02'],
+                  'data_completeness': ['complete', 'partial']}).to_csv(tmp_path / WEEK_TABLE_FILE, index=False)
+    assert week_scores_from_argv(tmp_path, argv=['TRAIN_V4_MODELS.py']) is None
+    scores = week_scores_from_argv(tmp_path, argv=['TRAIN_V4_MODELS.py', '--completeness-weights'])
+    # Older tables without coverage_score fall back to the label scores
+    assert scores['coverage_score'].tolist() == [1.0, 0.5]
+    assert load_week_scores(tmp_path).equals(scores)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+import CLASSIFY_DEMAND_PATTERNS as classify
+from demand_patterns import legacy_patterns, pattern_stats
+
+WEEKS = [f'2025-W{w:02d}' for w in range(1, 13)]
+SERIES = {
+    'smooth': [5, 6, 5, 4, 5, 6, 5, 5, 4, 6, 5, 5],
+    'erratic': [1, 20, 2, 30, 1, 25, 3, 1, 40, 2, 1, 30],
+    'intermittent': [0, 5, 0, 0, 5, 0, 0, 6, 0, 0, 5, 0],
+    'lumpy': [0, 1, 0, 0, 40, 0, 0, 2, 0, 0, 60, 0],
+    'dead': [0] * 12,
+}
+
+
+def weekly(series=SERIES):
+    return pd.DataFrame([{'sku': key, 'year_week': week, 'quantity': q}
+                         for key, values in series.items() for week, q in zip(WEEKS, values)])
+
+
+def test_syntetos_boylan_classes():
+    stats = pattern_stats(weekly(), 'sku', value_col='quantity').set_index('sku')
+    assert stats['sb_class'].to_dict() == {key: 'no_demand' if key == 'dead' else key for key in SERIES}
+
+
+def test_stats_start_at_the_first_demand_week():
+    stats = pattern_stats(weekly(), 'sku', value_col='quantity').set_index('sku')
+    row = stats.loc['intermittent']
+    assert row['active_weeks'] == 11
+    assert row['demand_weeks'] == 4
+    assert row['adi'] == 11 / 4
+    assert np.isclose(row['zero_ratio'], 7 / 11)
+
+
+def test_missing_weeks_count_as_zero_demand():
+    frame = weekly()
+    dense = pattern_stats(frame, 'sku', value_col='quantity')
+    sparse = pattern_stats(frame[frame['quantity'] > 0], 'sku', value_col='quantity')
+    # 'dead' has no rows left; every other series keeps its statistics
+    pd.testing.assert_frame_equal(sparse, dense[dense['sku'] != 'dead'].reset_index(drop=True))
+
+
+def test_legacy_patterns():
+    labels = legacy_patterns(weekly(), 'sku', value_col='quantity')
+    assert labels['smooth'] == 'stable'
+    assert labels['lumpy'] == 'sparse'
+    assert labels['dead'] == 'sparse'
+
+
+def test_classify_without_tables_logs_and_returns_none(tmp_path, monkeypatch):
+    monkeypatch.setattr(classify, 'FEATURES_DIR', tmp_path / 'features')
+    monkeypatch.setattr(classify, 'OUTPUT_DIR', tmp_path / 'output')
+    monkeypatch.setattr(classify, 'LOG_FILE', tmp_path / 'log.txt')
+    monkeypatch.setattr(classify.sys, 'argv', ['CLASSIFY_DEMAND_PATTERNS.py'])
+    assert classify.main() is None
+    assert 'nothing classified' in (tmp_path / 'log.txt').read_text()
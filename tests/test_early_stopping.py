@@ -0,0 +1,26 @@
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor
+
+from early_stopping import fit_early_stopped
+
+
+def frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 2))
+    return X, X[:, 0] + 0.1 * rng.normal(size=n)
+
+
+def test_short_tail_keeps_the_cap():
+    # 4-12 rows leave at most two held-out rows at the default tail fraction
+    for n in range(4, 13):
+        X, y = frame(n)
+        model = fit_early_stopped(GradientBoostingRegressor(n_estimators=50, random_state=0), X, y)
+        assert model.best_iteration_ == 50
+        assert model.n_estimators == 50
+
+
+def test_tail_picks_the_tree_count():
+    X, y = frame(60)
+    model = fit_early_stopped(GradientBoostingRegressor(n_estimators=200, random_state=0), X, y)
+    assert 1 <= model.best_iteration_ < 200
+    assert len(model.estimators_) == model.best_iteration_
@@ -0,0 +1,89 @@
+import importlib
+import linecache
+import sys
+
+import pandas as pd
+import pytest
+
+import feature_cache
+from feature_cache import FeatureCache, function_digest
+
+HELPER = '''
+def scale(values):
+    return values * {factor}
+
+
+class Scaler:
+    def apply(self, values):
+        return scale(values)
+'''
+
+ENTRY = '''
+import helper_mod
+
+SCALER = helper_mod.Scaler()
+
+
+def load(values):
+    return helper_mod.scale(values)
+
+
+def load_via_method(values):
+    return SCALER.apply(values)
+'''
+
+
+@pytest.fixture
+def scripts(tmp_path, monkeypatch):
+    """Entry and helper modules in a scripts/ directory of their own."""
+    monkeypatch.setattr(feature_cache, 'SCRIPTS_DIR', tmp_path.resolve())
+    monkeypatch.syspath_prepend(str(tmp_path))
+    (tmp_path / 'entry_mod.py').write_text(ENTRY)
+
+    def write_helper(factor):
+        (tmp_path / 'helper_mod.py').write_text(HELPER.format(factor=factor))
+        linecache.checkcache()
+        importlib.invalidate_caches()
+        for name in ('helper_mod', 'entry_mod'):
+            sys.modules.pop(name, None)
+        return importlib.import_module('entry_mod')
+
+    yield write_helper
+    for name in ('helper_mod', 'entry_mod'):
+        sys.modules.pop(name, None)
+
+
+def test_digest_follows_helper_module_calls(scripts):
+    before = scripts(2)
+    digests = [function_digest(before.load), function_digest(before.load_via_method)]
+    assert digests == [function_digest(scripts(2).load), function_digest(scripts(2).load_via_method)]
+
+    after = scripts(3)
+    assert function_digest(after.load) != digests[0]
+    assert function_digest(after.load_via_method) != digests[1]
+
+
+def test_digest_follows_closure_instances(scripts):
+    entry = scripts(2)
+    scaler = entry.helper_mod.Scaler()
+    before = function_digest(lambda values: scaler.apply(values))
+
+    entry = scripts(5)
+    scaler = entry.helper_mod.Scaler()
+    assert function_digest(lambda values: scaler.apply(values)) != before
+
+
+def test_materialise_recomputes_when_input_appears(tmp_path):
+    source = tmp_path / 'weekly.csv'
+    optional = tmp_path / 'schema_dictionaries.json'
+    pd.DataFrame({'sku': ['1', '2'], 'weekly_quantity': [3, 4]}).to_csv(source, index=False)
+    cache = FeatureCache(tmp_path / 'cache')
+
+    first = cache.materialise('weekly', [source, optional], load=lambda: pd.read_csv(source))
+    cache.materialise('weekly', [source, optional], load=lambda: pd.read_csv(source))
+    optional.write_text('{}')
+    cache.materialise('weekly', [source, optional], load=lambda: pd.read_csv(source))
+
+    assert cache.computed == ['weekly:load', 'weekly:load']
+    assert cache.hits == ['weekly:load']
+    assert len(first) == 2
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from checkpoint import Checkpoint
+from conftest import FEATURES, fit_tree
+from group_training import feature_matrix, fit_groups, group_jobs, train_per_group
+
+
+def fit_failing(X, y, sample_weight=None):
+    if len(X) < 12:
+        raise ValueError('too small')
+    return fit_tree(X, y, sample_weight)
+
+
+def test_feature_matrix_fills_missing_with_zero():
+    frame = pd.DataFrame({'lag1': [1.0, np.nan, 3.0], 'lag2': [np.nan, 5.0, 6.0]})
+    X = feature_matrix(frame, FEATURES, rows=np.array([2, 0]))
+    assert X.dtype == np.float32 and X.flags['C_CONTIGUOUS']
+    np.testing.assert_array_equal(X, [[3, 6], [1, 0]])
+
+
+def test_matches_a_model_per_group(group_frames):
+    train, test = group_frames
+    fallback = fit_tree(train[FEATURES].fillna(0), train['y'])
+    rows, models = train_per_group(train, test, 'group', FEATURES, 'y', fit_tree, min_rows=5,
+                                   fallback=fallback, required=['lag1'],
+                                   weights=lambda frame: frame['weight'].to_numpy(), workers=1)
+
+    usable = train.dropna(subset=['lag1'])
+    sizes = usable.groupby('group').size()
+    assert set(models) == set(sizes[sizes >= 5].index)
+    for group, block in rows.groupby('group', sort=False):
+        if group in models:
+            part = usable[usable['group'] == group]
+            model = fit_tree(part[FEATURES].fillna(0).astype(np.float32), part['y'], part['weight'].to_numpy())
+            expected = model.predict(block[FEATURES].fillna(0).astype(np.float32))
+            assert (block['model_type'] == 'group').all()
+        else:
+            expected = fallback.predict(block[FEATURES].fillna(0).astype(np.float32))
+            assert (block['model_type'] == 'fallback').all()
+        np.testing.assert_array_equal(block['predicted'], expected)
+    assert len(rows) == len(test)
+
+
+def test_without_fallback_drops_unmodelled_groups(group_frames):
+    train, test = group_frames
+    rows, models = train_per_group(train, test, 'group', FEATURES, 'y', fit_tree, min_rows=15, workers=1)
+    assert set(rows['group']) == set(models) & set(test['group'])
+
+
+def test_failed_fits_fall_back(group_frames):
+    train, _ = group_frames
+    models = fit_groups(group_jobs(train, 'group', FEATURES, 'y', min_rows=1), fit_failing, workers=1)
+    sizes = train.groupby('group').size()
+    assert {group for group, model in models.items() if model is None} == set(sizes[sizes < 12].index)
+
+
+def test_parallel_matches_serial(group_frames):
+    train, _ = group_frames
+    jobs = group_jobs(train, 'group', FEATURES, 'y', min_rows=1) * 5
+    jobs = [(f'{group}{i}', X, y, w) for i, (group, X, y, w) in enumerate(jobs)]
+    serial = fit_groups(jobs, fit_tree, workers=1)
+    parallel = fit_groups(jobs, fit_tree, workers=2)
+    X = train[FEATURES].fillna(0).astype(np.float32)
+    for group in serial:
+        np.testing.assert_array_equal(serial[group].predict(X), parallel[group].predict(X))
+
+
+def test_checkpointed_groups_are_not_refitted(group_frames, tmp_path):
+    train, _ = group_frames
+    jobs = group_jobs(train, 'group', FEATURES, 'y', min_rows=1)
+    first = fit_groups(jobs, fit_tree, workers=1, checkpoint=Checkpoint(tmp_path), loop='group')
+
+    resumed = Checkpoint(tmp_path, resume=True)
+    second = fit_groups(jobs, fit_failing, workers=1, checkpoint=resumed, loop='group')
+    assert resumed.resumed['group'] == len(jobs)
+    X = train[FEATURES].fillna(0).astype(np.float32)
+    for group in first:
+        np.testing.assert_array_equal(first[group].predict(X), second[group].predict(X))
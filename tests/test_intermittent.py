@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from intermittent import demand_matrix, fit_intermittent, predict_intermittent
+
+SERIES = {
+    'a': [0, 3, 0, 0, 5, 0, 2, 0, 0, 0, 4, 0],
+    'b': [2, 0, 0, 0, 0, 0, 0, 6, 0, 0, 0, 0],
+    'c': [1, 1, 0, 2, 1, 0, 1, 3, 0, 1, 0, 2],
+    'dead': [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+}
+
+
+def reference(demand, method, alpha, beta=None):
+    """Scalar Croston / SBA / TSB: (in-sample one-step MAE, final forecast)."""
+    z = level = None
+    q, errors = 1, []
+
+    def forecast():
+        if z is None:
+            return None
+        if method == 'tsb':
+            return level * z
+        return (1 - alpha / 2 if method == 'sba' else 1) * z / level
+
+    for d in demand:
+        f = forecast()
+        if f is not None:
+            errors.append(abs(d - f))
+        if z is None:
+            if d > 0:
+                z, level = d, (1 / q if method == 'tsb' else q)
+        else:
+            if d > 0:
+                z += alpha * (d - z)
+            if method == 'tsb':
+                level += beta * ((d > 0) - level)
+            elif d > 0:
+                level += alpha * (q - level)
+        q = 1 if d > 0 else q + 1
+    return (np.mean(errors) if errors else np.nan), (forecast() or 0.0)
+
+
+@pytest.fixture(scope='module')
+def weekly():
+    rows = [{'sku': sku, 'year_week': f'2025-W{week + 1:02d}', 'weekly_quantity': q}
+            for sku, values in SERIES.items() for week, q in enumerate(values) if q > 0 or sku == 'dead']
+    return pd.DataFrame(rows)
+
+
+def test_missing_weeks_are_zero_demand(weekly):
+    keys, weeks, Y = demand_matrix(weekly, 'sku')
+    assert len(weeks) == 12
+    for key, row in zip(keys, Y):
+        np.testing.assert_array_equal(row, SERIES[key])
+
+
+@pytest.mark.parametrize('method,alpha,beta', [('croston', 0.1, None), ('sba', 0.3, None), ('tsb', 0.2, 0.1)])
+def test_matches_scalar_reference(weekly, method, alpha, beta):
+    fits = fit_intermittent(weekly, 'sku', method=method, alphas=np.array([alpha]),
+                            betas=np.array([beta if beta is not None else 0.1])).set_index('sku')
+    for sku, demand in SERIES.items():
+        mae, forecast = reference(demand, method, alpha, beta)
+        assert fits.loc[sku, 'forecast'] == pytest.approx(forecast, rel=1e-12, abs=1e-12)
+        if np.isnan(mae):
+            assert np.isnan(fits.loc[sku, 'mae'])
+        else:
+            assert fits.loc[sku, 'mae'] == pytest.approx(mae, rel=1e-12)
+
+
+def test_auto_picks_lowest_mae(weekly):
+    auto = fit_intermittent(weekly, 'sku').set_index('sku')
+    for sku in ('a', 'b', 'c'):
+        best = min(fit_intermittent(weekly, 'sku', method=m).set_index('sku').loc[sku, 'mae']
+                   for m in ('croston', 'sba', 'tsb'))
+        assert auto.loc[sku, 'mae'] == pytest.approx(best)
+    assert auto.loc['dead', 'forecast'] == 0
+    assert auto.loc['c', 'adi'] == pytest.approx(12 / 8)
+
+
+def test_predict_flat_forecast_for_fitted_series(weekly):
+    fits = fit_intermittent(weekly, 'sku')
+    test = pd.DataFrame({'sku': ['a', 'a', 'zzz'], 'year_week': ['2025-W13', '2025-W14', '2025-W13'],
+                         'weekly_quantity': [1, 0, 2]})
+    rows = predict_intermittent(test, fits, 'sku')
+    assert rows['sku'].tolist() == ['a', 'a']
+    expected = fits.set_index('sku').loc['a']
+    assert rows['predicted'].tolist() == [expected['forecast']] * 2
+    assert rows['method'].tolist() == [expected['method']] * 2
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor
+
+from model_bundle import FALLBACK_KEY, CompactEnsemble, ModelBundle, write_bundle
+
+
+@pytest.fixture(scope='module')
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.random((300, 4)) * 20
+    y = X[:, 0] * 3 + np.sin(X[:, 1]) * 5 + rng.normal(size=300)
+    return X, y
+
+
+def fit(X, y, **params):
+    return GradientBoostingRegressor(n_estimators=40, max_depth=3, random_state=0, **params).fit(X, y)
+
+
+@pytest.mark.parametrize('params', [{}, {'loss': 'absolute_error', 'subsample': 0.8}, {'init': 'zero'}])
+def test_compact_ensemble_matches_sklearn(data, params):
+    X, y = data
+    model = fit(X, y, **params)
+    np.testing.assert_array_equal(CompactEnsemble.from_model(model).predict(X), model.predict(X))
+
+
+def test_bundle_round_trip(data, tmp_path):
+    X, y = data
+    models = {'10002': fit(X, y), 'ACP-7': fit(X[:100], y[:100]), 'skipped': None, FALLBACK_KEY: fit(X, y * 2)}
+    path = tmp_path / 'models.bundle'
+    assert write_bundle(path, models, meta={'features': ['a', 'b', 'c', 'd']}) == 3
+
+    with ModelBundle(path) as bundle:
+        assert len(bundle) == 3 and 'skipped' not in bundle
+        assert bundle.meta == {'features': ['a', 'b', 'c', 'd']}
+        for key in ('10002', 'ACP-7'):
+            np.testing.assert_array_equal(bundle[key].predict(X), models[key].predict(X))
+        np.testing.assert_array_equal(bundle.model_for('unknown').predict(X), models[FALLBACK_KEY].predict(X))
+
+
+def test_float32_bundle_keeps_splits(data, tmp_path):
+    X, y = data
+    model = fit(X, y)
+    path = tmp_path / 'models.bundle'
+    write_bundle(path, {'a': model}, float32=True)
+    with ModelBundle(path) as bundle:
+        np.testing.assert_allclose(bundle['a'].predict(X), model.predict(X), rtol=1e-5)
+
+
+def test_rejects_other_models(tmp_path):
+    with pytest.raises(TypeError):
+        write_bundle(tmp_path / 'models.bundle', {'a': object()})
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from price_store import PriceStore
+
+HISTORY = pd.DataFrame({
+    'sku': ['A', 'A', 'B'],
+    'year_week': ['2025-W02', '2025-W05', '2025-W03'],
+    'avg_price': [10.0, 12.0, 7.0],
+})
+
+
+def test_asof_join_takes_last_known_price():
+    store = PriceStore(HISTORY)
+    queries = pd.DataFrame({'sku': ['A', 'A', 'A', 'B', 'C'],
+                            'year_week': ['2025-W01', '2025-W04', '2025-W06', '2025-W03', '2025-W03']})
+    result = store.asof_join(queries)
+    np.testing.assert_array_equal(result['avg_price'], [np.nan, 10.0, 12.0, 7.0, np.nan])
+    assert result['asof_week'].fillna('').tolist() == ['', '2025-W02', '2025-W05', '2025-W03', '']
+
+
+def test_asof_join_strict_excludes_same_week():
+    store = PriceStore(HISTORY)
+    result = store.asof_join(pd.DataFrame({'sku': ['A'], 'year_week': ['2025-W05']}), strict=True)
+    assert result['avg_price'].tolist() == [10.0]
+
+
+def test_empty_store_returns_nan():
+    store = PriceStore(HISTORY.iloc[:0])
+    queries = pd.DataFrame({'sku': ['A', 'B'], 'year_week': ['2025-W04', '2025-W06']}, index=[3, 7])
+    result = store.asof_join(queries)
+    assert list(result.index) == [3, 7]
+    assert result['avg_price'].isna().all()
+    assert result['asof_week'].isna().all()
+    assert store.asof('A', '2025-W04') is None
+    assert store.latest_week() == ''
+
+
+def test_append_overwrites_existing_week():
+    store = PriceStore(HISTORY)
+    store.append(pd.DataFrame({'sku': ['A'], 'year_week': ['2025-W05'], 'avg_price': [13.0]}))
+    assert len(store) == 3
+    assert store.asof('A', '2025-W09') == 13.0
+
+
+def test_strict_lag_differs_from_shift_on_gaps_and_repeated_weeks():
+    frame = pd.DataFrame({'sku': ['A'] * 5,
+                          'year_week': ['2025-W01', '2025-W02', '2025-W03', '2025-W04', '2025-W04'],
+                          'price': [10.0, np.nan, 12.0, 13.0, 14.0]})
+    store = PriceStore.from_frame(frame, 'price')
+    lag = store.asof_join(frame, cols=['price'], strict=True)['price']
+    shift = frame.groupby('sku')['price'].shift(1)
+    # W03: the last known price (W01) instead of W02's NaN; the second W04 row: W03, not its twin
+    np.testing.assert_array_equal(lag, [np.nan, 10.0, 10.0, 12.0, 12.0])
+    np.testing.assert_array_equal(shift, [np.nan, 10.0, np.nan, 12.0, 13.0])
+
+
+def test_fingerprint_follows_prices():
+    store = PriceStore(HISTORY)
+    assert PriceStore(HISTORY).fingerprint() == store.fingerprint()
+    before = store.fingerprint()
+    store.append(pd.DataFrame({'sku': ['A'], 'year_week': ['2025-W05'], 'avg_price': [13.0]}))
+    assert store.fingerprint() != before
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_extraction import (build_rfm_state, create_customer_features, refresh_customer_features,
+                                rfm_features, update_rfm_state)
+
+TRANSACTIONS = pd.DataFrame({
+    'account_no': ['1', '1', '2', '1', '3', '2'],
+    'region_name': ['Gauteng'] * 6,
+    'invoice_date': pd.to_datetime(['2025-01-05', '2025-01-20', '2025-01-25',
+                                    '2025-02-03', '2025-02-10', '2025-02-14']),
+    'document_no': ['D1', 'D2', 'D3', 'D4', 'D5', 'D6'],
+    'total_amount_incl': [100.0, 300.0, 50.0, 200.0, 80.0, 70.0],
+})
+CUTOFF = pd.Timestamp('2025-02-01')
+
+
+def _split():
+    return (TRANSACTIONS[TRANSACTIONS['invoice_date'] < CUTOFF],
+            TRANSACTIONS[TRANSACTIONS['invoice_date'] >= CUTOFF])
+
+
+def test_update_matches_full_rebuild():
+    january, february = _split()
+    as_of = '2025-03-01'
+    incremental = rfm_features(update_rfm_state(build_rfm_state(january), february), as_of)
+    full = create_customer_features(TRANSACTIONS, as_of)
+    pd.testing.assert_frame_equal(incremental.sort_values('account_no').reset_index(drop=True),
+                                  full.sort_values('account_no').reset_index(drop=True),
+                                  check_dtype=False)
+    row = full.set_index('account_no').loc['1']
+    assert row['purchase_count'] == 3
+    assert row['avg_order_value'] == 200.0
+    assert row['order_value_std'] == pytest.approx(np.std([100.0, 300.0, 200.0], ddof=1))
+
+
+def test_stale_batch_is_rejected():
+    january, february = _split()
+    state = build_rfm_state(january)
+    # A batch that overlaps the stored latest purchase would double-count documents
+    overlap = pd.concat([january.tail(1), february])
+    with pytest.raises(ValueError, match='not after the stored 2025-01-25'):
+        update_rfm_state(state, overlap)
+    with pytest.raises(ValueError, match='1 transactions'):
+        update_rfm_state(state, january[january['invoice_date'] == january['invoice_date'].max()])
+
+
+def test_refresh_writes_state_back(tmp_path):
+    january, february = _split()
+    path = tmp_path / 'customer_rfm_state.csv'
+    build_rfm_state(january).to_csv(path, index=False)
+    features = refresh_customer_features(february, as_of='2025-03-01', state_path=path)
+    assert sorted(features['account_no']) == ['1', '2', '3']
+    saved = pd.read_csv(path, dtype={'account_no': str})
+    assert saved['purchase_count'].sum() == len(TRANSACTIONS)
+    # Refreshing with the same batch again is stale now
+    with pytest.raises(ValueError):
+        refresh_customer_features(february, state_path=path)
@@ -0,0 +1,54 @@
+import time
+
+import numpy as np
+import pytest
+
+from conftest import FEATURES, fit_tree
+from scheduler import BASELINE, TrainingScheduler, budget_minutes
+
+
+class Fallback:
+    def predict(self, X):
+        return np.zeros(len(X))
+
+
+@pytest.mark.parametrize('argv, minutes', [
+    ([], None),
+    (['--time-budget'], 60),
+    (['--time-budget', '--resume'], 60),
+    (['--time-budget=30'], 30),
+    (['--time-budget', '30'], 30),
+])
+def test_budget_minutes(argv, minutes):
+    assert budget_minutes(['script.py'] + argv, default=60) == minutes
+
+
+def test_budget_minutes_rejects_non_numbers():
+    with pytest.raises(ValueError):
+        budget_minutes(['script.py', '--time-budget=soon'])
+
+
+def test_clock_starts_with_training(sku_frame):
+    scheduler = TrainingScheduler(0.05, [('full', 1.0, fit_tree)])
+    time.sleep(0.1)
+    assert scheduler.remaining() == 0.05
+    _, models = scheduler.train(sku_frame, sku_frame, 'sku', FEATURES, 'weekly_quantity', Fallback(),
+                                min_rows=4)
+    assert sorted(models) == ['a', 'b', 'c']
+
+
+def test_used_budget_trains_nothing(sku_frame):
+    scheduler = TrainingScheduler(0, [('full', 1.0, fit_tree)])
+    rows, models = scheduler.train(sku_frame, sku_frame, 'sku', FEATURES, 'weekly_quantity', Fallback(),
+                                   min_rows=4)
+    assert models == {}
+    assert (rows['predicted'] == 0).all()
+
+
+def test_planned_counts_exclude_entities_under_min_rows(sku_frame):
+    scheduler = TrainingScheduler(60, [('full', 1.0, fit_tree)])
+    scheduler.train(sku_frame, sku_frame, 'sku', FEATURES, 'weekly_quantity', Fallback(), min_rows=4)
+    report = scheduler.report().set_index('tier')
+    assert report.loc['full', 'planned'] == 3
+    assert report.loc['full', 'trained'] == 3
+    assert report.loc[BASELINE, 'planned'] == 1
@@ -0,0 +1,37 @@
+import numpy as np
+
+from tuning import rung_budgets, sample_configs, successive_halving
+
+SPACE = {'max_depth': [3, 5, 8], 'learning_rate': [0.03, 0.1]}
+
+
+def quadratic(params, budget):
+    """Module-level evaluate: best at depth 5, fails for learning rate 0.03 at depth 8."""
+    if params['max_depth'] == 8 and params['learning_rate'] == 0.03:
+        raise ValueError('diverged')
+    return (params['max_depth'] - 5) ** 2 + params['learning_rate'] + 1.0 / budget
+
+
+def test_sample_configs_distinct_and_capped():
+    configs = sample_configs(SPACE, 4)
+    assert len(configs) == 4
+    assert len({tuple(c.values()) for c in configs}) == 4
+    assert sample_configs(SPACE, 4) == configs
+    assert len(sample_configs(SPACE, 50)) == 6
+
+
+def test_rung_budgets_end_on_full_budget():
+    assert rung_budgets(360, 3) == [40, 120, 360]
+    assert rung_budgets(4, 3, minimum=2) == [2, 2, 4]
+
+
+def test_successive_halving_keeps_best_and_scores_failures_inf():
+    candidates = sample_configs(SPACE, 6)
+    results = successive_halving(candidates, quadratic, budgets=[1, 3], workers=1, log=lambda msg: None)
+    first = results[results['rung'] == 0]
+    assert len(first) == 6
+    assert np.isinf(first['error']).sum() == 1
+    assert first['kept'].sum() == 2
+    last = results[results['rung'] == 1]
+    assert set(last['candidate']) == set(first.loc[first['kept'], 'candidate'])
+    assert results.iloc[0]['params'] == {'max_depth': 5, 'learning_rate': 0.03}
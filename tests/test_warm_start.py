@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+
+from conftest import FEATURES
+from warm_start import DRIFT_FLOOR, EXTRA_TREES, ModelStore, drift_threshold, model_state, plan
+
+
+def weeks(n):
+    return [f'2025-W{w:02d}' for w in range(1, n + 1)]
+
+
+def series(n_weeks, level=20.0, seed=0, skus=('a', 'b')):
+    """Stable weekly demand per SKU with its lags as features."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i, sku in enumerate(skus):
+        y = level * (i + 1) + rng.normal(0, 1, n_weeks + 2)
+        frames.append(pd.DataFrame({'sku': sku, 'year_week': weeks(n_weeks), 'lag1': y[1:-1],
+                                    'lag2': y[:-2], 'weekly_quantity': y[2:]}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def fit_gbr(X, y, sample_weight=None):
+    return GradientBoostingRegressor(n_estimators=30, max_depth=2, random_state=0).fit(X, y, sample_weight=sample_weight)
+
+
+def fit_hgb(X, y, sample_weight=None):
+    return HistGradientBoostingRegressor(max_iter=30, random_state=0).fit(X, y, sample_weight=sample_weight)
+
+
+def fitted_state(frame, fit=fit_gbr, errors=()):
+    return model_state(fit(frame[FEATURES], frame['weekly_quantity']), frame, FEATURES, errors=errors)
+
+
+def test_drift_threshold_has_a_floor():
+    assert drift_threshold([]) == DRIFT_FLOOR
+    assert drift_threshold([2.0, 4.0]) == DRIFT_FLOOR
+    assert drift_threshold([80.0, 100.0], drift_ratio=1.5) == 135.0
+
+
+def test_plan_fit_unchanged_and_feature_change():
+    frame = series(20)
+    state = fitted_state(frame)
+    assert plan(None, frame, FEATURES, 'weekly_quantity')[0] == 'fit'
+    assert plan(state, frame, FEATURES, 'weekly_quantity')[0] == 'unchanged'
+    assert plan(state, frame, FEATURES[:1], 'weekly_quantity')[0] == 'fit'
+
+
+def test_stable_series_stays_warm_after_a_fit():
+    state = fitted_state(series(20))
+    action, new, error = plan(state, series(21), FEATURES, 'weekly_quantity')
+    assert action == 'warm'
+    assert new.sum() == 2
+    assert error < DRIFT_FLOOR
+
+
+def test_drift_above_the_usual_error_refits():
+    state = fitted_state(series(20), errors=[5.0, 6.0])
+    shifted = series(21)
+    shifted.loc[shifted['year_week'] == '2025-W21', 'weekly_quantity'] *= 10
+    action, _, error = plan(state, shifted, FEATURES, 'weekly_quantity', floor=10.0)
+    assert action == 'refit'
+    assert error > 10.0
+
+
+def test_models_without_warm_start_refit():
+    state = fitted_state(series(20), fit=fit_hgb)
+    assert plan(state, series(21), FEATURES, 'weekly_quantity')[0] == 'refit'
+
+
+def test_store_warm_starts_stable_groups_across_runs(tmp_path):
+    store = ModelStore(tmp_path)
+    for n_weeks in (20, 21, 22, 22):
+        frame = series(n_weeks)
+        _, models = store.train_per_group(frame, frame, 'sku', FEATURES, 'weekly_quantity', fit_gbr,
+                                          min_rows=4, workers=1)
+    assert store.actions == {'fit': 2, 'refit': 0, 'warm': 4, 'unchanged': 2}
+    assert all(model.n_estimators == 30 + 2 * EXTRA_TREES for model in models.values())
+
+    states = store.load('sku')
+    assert all(state['trained_through'] == '2025-W22' for state in states.values())
+    assert all(len(state['errors']) == 2 for state in states.values())
+
+
+def test_store_retrain_keeps_one_model(tmp_path):
+    store = ModelStore(tmp_path)
+    store.retrain('global', series(20), FEATURES, 'weekly_quantity', fit_gbr)
+    model = store.retrain('global', series(21), FEATURES, 'weekly_quantity', fit_gbr)
+    assert model.n_estimators == 30 + EXTRA_TREES
+    assert store.summary() == "Model state: 1 fit, 0 refit, 1 warm, 0 unchanged"